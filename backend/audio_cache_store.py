@@ -0,0 +1,153 @@
+"""
+/api/tts 整句語音快取索引
+以 SQLite（WAL 模式）保存「文字雜湊 → 音檔路徑」，查詢走主鍵索引，新增只寫入一筆，
+多個 uvicorn worker 共用同一個 volume 時由 SQLite 的鎖機制保證一致
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# 載入環境變數
+load_dotenv()
+
+
+class AudioCacheStore:
+    """整句語音快取索引"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = self._open(db_path)
+        except (OSError, sqlite3.Error) as e:
+            # 目錄無法寫入（例如唯讀掛載）時服務仍要能啟動，索引只保留到行程結束
+            print(f"⚠️ 語音快取索引無法開啟，改用記憶體中的索引: {e}")
+            self._conn = self._open(":memory:")
+
+    @staticmethod
+    def _open(db_path):
+        conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS audio_cache (
+                    text_hash TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL
+                )
+            """)
+            conn.commit()
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def get(self, text_hash):
+        """查詢快取，未命中時返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, file_path, timestamp FROM audio_cache WHERE text_hash = ?", (text_hash,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"text": row[0], "file_path": row[1], "timestamp": row[2]}
+
+    def put(self, text_hash, text, file_path, timestamp=None):
+        """新增或更新一筆快取"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO audio_cache (text_hash, text, file_path, timestamp) VALUES (?, ?, ?, ?)",
+                (text_hash, text, file_path, int(timestamp or time.time()))
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def delete(self, text_hash):
+        with self._lock:
+            self._conn.execute("DELETE FROM audio_cache WHERE text_hash = ?", (text_hash,))
+            self._conn.commit()
+
+    def migrate_json(self, json_path):
+        """
+        匯入舊版的 audio_cache.json，完成後改名為 .migrated 避免重複匯入；
+        內容損壞的檔案改名為 .corrupt 並略過
+
+        Returns:
+            匯入的筆數
+        """
+        # 多個 worker 同時啟動時，檔案可能已被其他 worker 匯入並改名
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                legacy_cache = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (ValueError, OSError) as e:
+            print(f"⚠️ 舊版語音快取無法讀取，略過匯入: {json_path}: {e}")
+            self._set_aside(json_path, ".corrupt")
+            return 0
+
+        if not isinstance(legacy_cache, dict):
+            print(f"⚠️ 舊版語音快取格式不符（{type(legacy_cache).__name__}），略過匯入: {json_path}")
+            self._set_aside(json_path, ".corrupt")
+            return 0
+
+        rows = [
+            row for row in (self._legacy_row(text_hash, entry) for text_hash, entry in legacy_cache.items())
+            if row is not None
+        ]
+        with self._lock:
+            try:
+                # 已存在的鍵以資料庫為準
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO audio_cache (text_hash, text, file_path, timestamp) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # 保留原檔，下次啟動再匯入
+                print(f"⚠️ 匯入舊版語音快取失敗: {e}")
+                return 0
+        self._set_aside(json_path, ".migrated")
+        return len(rows)
+
+    @staticmethod
+    def _legacy_row(text_hash, entry):
+        """舊版的一筆快取 → 資料列；欄位缺漏或型別不符時返回 None"""
+        if not isinstance(entry, dict) or not isinstance(entry.get("file_path"), str) or not entry["file_path"]:
+            return None
+        try:
+            timestamp = int(entry.get("timestamp") or time.time())
+        except (TypeError, ValueError):
+            timestamp = int(time.time())
+        return str(text_hash), str(entry.get("text", "")), entry["file_path"], timestamp
+
+    @staticmethod
+    def _set_aside(json_path, suffix):
+        try:
+            os.replace(json_path, json_path + suffix)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ 無法將 {json_path} 改名為 {suffix}: {e}")
+
+# 全域整句語音快取實例
+audio_cache_store = AudioCacheStore(os.getenv("AUDIO_CACHE_DB", "cache/audio_cache.sqlite3"))
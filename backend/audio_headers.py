@@ -0,0 +1,198 @@
+"""
+從音檔標頭讀取長度，不需要解碼
+- WAV：解析 RIFF 的 fmt 與 data chunk，取樣數 = data 大小 / 每個取樣的位元組數
+- MP3（MPEG Layer III）：逐一走訪 frame 標頭累計取樣數，Xing/Info 資訊 frame 不計入
+  （gTTS 的輸出是多段 MP3 直接串接，只讀第一個 Xing 標頭會少算）；
+  開頭的 LAME 標籤記有編碼器補上的延遲與結尾填充，與 ffmpeg 解碼時一樣扣除
+
+用於字幕時間軸，以及合併時直接串流格式相符的 WAV PCM 資料。
+"""
+
+import collections
+import os
+import struct
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# 串流輸出的 WAV 常把 data 大小填成 0 或 0xFFFFFFFF，此時以檔案結尾為準
+_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+
+
+class WavHeader(collections.namedtuple(
+        "WavHeader", ["audio_format", "channels", "sample_rate", "sample_width", "data_offset", "data_size"])):
+    __slots__ = ()
+
+    @property
+    def frames(self):
+        return self.data_size // (self.channels * self.sample_width)
+
+    @property
+    def duration_ms(self):
+        return round(1000 * self.frames / self.sample_rate)
+
+
+def read_wav_header(path):
+    """
+    Returns:
+        WavHeader；不是可辨識的 WAV 時返回 None
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"fmt ":
+                body = f.read(size)
+                if len(body) < 16:
+                    return None
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # 實際格式記在 SubFormat GUID 的前兩個位元組
+                    audio_format = struct.unpack("<H", body[24:26])[0]
+                fmt = (audio_format, channels, sample_rate, (bits + 7) // 8)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None or not fmt[1] or not fmt[2] or not fmt[3]:
+                    return None
+                data_offset = f.tell()
+                if size in _UNKNOWN_SIZES or data_offset + size > file_size:
+                    size = file_size - data_offset
+                return WavHeader(*fmt, data_offset, size)
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+
+
+# MPEG 版本（標頭的 2 個位元）→ (位元率表 kbps, 取樣率表, 每 frame 取樣數, 長度係數)
+_MPEG_VERSIONS = {
+    3: ((0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320), (44100, 48000, 32000), 1152, 144),
+    2: ((0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160), (22050, 24000, 16000), 576, 72),
+    0: ((0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160), (11025, 12000, 8000), 576, 72),
+}
+_LAYER_III = 1
+# MP3 解碼器固有的延遲取樣數，ffmpeg 依 LAME 標籤修剪開頭時一併扣除
+_DECODER_DELAY = 529
+
+
+def _parse_frame_header(data, pos):
+    """返回 (frame 長度, 取樣率, 每 frame 取樣數, 旁資訊長度)；不是有效的 Layer III 標頭時返回 None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0x03
+    if version not in _MPEG_VERSIONS or layer != _LAYER_III or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrates, rates, samples, factor = _MPEG_VERSIONS[version]
+    sample_rate = rates[rate_index]
+    padding = (data[pos + 2] >> 1) & 0x01
+    length = factor * bitrates[bitrate_index] * 1000 // sample_rate + padding
+    mono = (data[pos + 3] >> 6) == 3
+    if version == 3:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+    return length, sample_rate, samples, side_info
+
+
+def _gapless_info(data, tag_pos):
+    """
+    讀取 Xing/Info 標頭與其後的 LAME 標籤
+
+    Returns:
+        (標頭記載的 frame 數, 編碼器延遲取樣數, 結尾填充取樣數)；沒有的欄位為 None
+    """
+    flags = int.from_bytes(data[tag_pos + 4:tag_pos + 8], "big")
+    pos = tag_pos + 8
+    frames = int.from_bytes(data[pos:pos + 4], "big") if flags & 0x1 else None
+    # frame 數、位元組數、TOC、品質四個欄位依旗標存在
+    for flag, size in ((0x1, 4), (0x2, 4), (0x4, 100), (0x8, 4)):
+        if flags & flag:
+            pos += size
+    if data[pos:pos + 4] not in (b"LAME", b"Lavc", b"Lavf") or pos + 24 > len(data):
+        return frames, None, None
+    value = int.from_bytes(data[pos + 21:pos + 24], "big")
+    return frames, value >> 12, value & 0xFFF
+
+
+def _skip_id3v2(data, pos):
+    while data[pos:pos + 3] == b"ID3" and pos + 10 <= len(data):
+        size = 0
+        for byte in data[pos + 6:pos + 10]:
+            size = (size << 7) | (byte & 0x7F)
+        footer = 10 if data[pos + 5] & 0x10 else 0
+        pos += 10 + size + footer
+    return pos
+
+
+def read_mp3_samples(path):
+    """
+    Returns:
+        (取樣率, 總取樣數)；找不到任何 frame 時返回 None
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = _skip_id3v2(data, 0)
+    sample_rate, total, frames = None, 0, 0
+    gapless = (None, None, None)
+    while pos + 4 <= len(data):
+        header = _parse_frame_header(data, pos)
+        if header is None:
+            if data[pos:pos + 3] == b"TAG":
+                break
+            if data[pos:pos + 3] == b"ID3":
+                # 串接的下一段 MP3 又帶有自己的 ID3 標頭
+                pos = _skip_id3v2(data, pos)
+                continue
+            # 失去同步時往後尋找下一個 frame
+            pos += 1
+            continue
+        length, rate, samples, side_info = header
+        tag_pos = pos + 4 + side_info
+        if data[tag_pos:tag_pos + 4] in (b"Xing", b"Info"):
+            if sample_rate is None:
+                gapless = _gapless_info(data, tag_pos)
+        else:
+            if sample_rate is None:
+                sample_rate = rate
+            total += samples
+            frames += 1
+        pos += length
+    if sample_rate is None:
+        return None
+    tagged_frames, delay, padding = gapless
+    if delay is not None:
+        if tagged_frames == frames:
+            total -= delay + padding
+        else:
+            # 串接多段 MP3 時第一個標頭的 frame 數不符，ffmpeg 只扣除開頭的延遲（含解碼器延遲）
+            total -= delay + _DECODER_DELAY
+    return sample_rate, max(0, total)
+
+
+def duration_ms(path):
+    """
+    從標頭讀出音檔長度（毫秒）
+
+    Returns:
+        長度；檔案不存在、格式不支援或標頭損壞時返回 None
+    """
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".wav":
+            header = read_wav_header(path)
+            return header.duration_ms if header is not None else None
+        if ext == ".mp3":
+            result = read_mp3_samples(path)
+            return round(1000 * result[1] / result[0]) if result is not None else None
+    except (OSError, struct.error):
+        return None
+    return None
@@ -0,0 +1,155 @@
+"""
+壓縮音檔變體
+/api/audio（MP3）與 /api/tts（WAV）可依 ?format= 或 Accept 標頭改為提供 Opus（OGG）或 AAC（M4A）。
+變體以 ffmpeg 從原始音檔轉出，存放在原檔旁（檔名含位元率），同一個變體只編碼一次；
+原始音檔重新渲染後（修改時間較新）才會重新編碼。未指定格式時維持原本的檔案與網址。
+"""
+
+import collections
+import os
+import subprocess
+import threading
+import urllib.parse
+import uuid
+
+from dotenv import load_dotenv
+
+# 載入環境變數
+load_dotenv()
+
+AudioFormat = collections.namedtuple("AudioFormat", ["muxer", "codec", "extension", "media_type", "bitrate"])
+
+# 語音為單聲道，較低的位元率即可保有清楚的人聲
+FORMATS = {
+    "mp3": AudioFormat("mp3", "libmp3lame", ".mp3", "audio/mpeg", os.getenv("AUDIO_MP3_BITRATE", "64k")),
+    "opus": AudioFormat("ogg", "libopus", ".ogg", "audio/ogg", os.getenv("AUDIO_OPUS_BITRATE", "32k")),
+    "aac": AudioFormat("ipod", "aac", ".m4a", "audio/mp4", os.getenv("AUDIO_AAC_BITRATE", "48k")),
+    "wav": AudioFormat("wav", "pcm_s16le", ".wav", "audio/wav", None),
+}
+FORMAT_ALIASES = {"ogg": "opus", "m4a": "aac", "mpeg": "mp3"}
+
+# Accept 標頭中可辨識的 MIME type
+MEDIA_TYPE_FORMATS = {
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/mp4": "aac",
+    "audio/aac": "aac",
+    "audio/x-m4a": "aac",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+}
+
+# 背景渲染完成後預先編碼的格式（逗號分隔，例如 "opus,aac"），其餘格式在第一次請求時編碼
+PREENCODE_FORMATS = [name.strip() for name in os.getenv("AUDIO_PREENCODE_FORMATS", "").split(",") if name.strip()]
+
+# 同一個變體同時只由一個執行緒編碼；以固定數量的鎖分組，避免鎖的數量無限成長
+_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def choose_format(requested=None, accept=None, default=None):
+    """
+    決定要提供的格式：?format= 優先，其次為 Accept 中 q 值最高且可辨識的 audio/* 類型
+
+    Returns:
+        FORMATS 中的格式名稱；兩者都未指定時返回 default
+
+    Raises:
+        ValueError: ?format= 的值不支援
+    """
+    if requested:
+        name = FORMAT_ALIASES.get(requested.lower(), requested.lower())
+        if name not in FORMATS:
+            raise ValueError(f"Unsupported audio format '{requested}', choose from {', '.join(FORMATS)}")
+        return name
+
+    best, best_q = default, 0.0
+    for item in (accept or "").split(","):
+        media_type, _, params = item.strip().partition(";")
+        name = MEDIA_TYPE_FORMATS.get(media_type.strip().lower())
+        if name is None:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def variant_path(src_path, name):
+    """變體的檔案路徑；原始檔已是該格式時返回原路徑"""
+    audio_format = FORMATS[name]
+    root, ext = os.path.splitext(src_path)
+    if ext.lower() == audio_format.extension:
+        return src_path
+    if audio_format.bitrate:
+        return f"{root}.{audio_format.bitrate}{audio_format.extension}"
+    return f"{root}{audio_format.extension}"
+
+
+def _is_fresh(path, src_path):
+    try:
+        return os.path.getsize(path) > 0 and os.path.getmtime(path) >= os.path.getmtime(src_path)
+    except OSError:
+        return False
+
+
+def _encode(src_path, out_path, audio_format, low_priority=False):
+    from pydub import AudioSegment
+
+    tmp_path = f"{out_path}.{uuid.uuid4().hex[:8]}.part"
+    command = [AudioSegment.converter, "-y", "-loglevel", "error", "-i", src_path, "-vn", "-c:a", audio_format.codec]
+    if audio_format.bitrate:
+        command += ["-b:a", audio_format.bitrate]
+    if audio_format.muxer == "ipod":
+        # moov 放在檔頭，瀏覽器可邊下載邊播放
+        command += ["-movflags", "+faststart"]
+    command += ["-f", audio_format.muxer, tmp_path]
+    preexec_fn = (lambda: os.nice(10)) if low_priority and hasattr(os, "nice") else None
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, preexec_fn=preexec_fn)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"ffmpeg 轉檔失敗 ({result.returncode}): {result.stderr.decode('utf-8', 'ignore')}")
+    os.replace(tmp_path, out_path)
+
+
+def ensure_variant(src_path, name, low_priority=False):
+    """
+    取得（必要時編碼）src_path 的 name 格式變體
+
+    Returns:
+        變體的檔案路徑
+    """
+    out_path = variant_path(src_path, name)
+    if out_path == src_path or _is_fresh(out_path, src_path):
+        return out_path
+    with _LOCKS[hash(out_path) % len(_LOCKS)]:
+        # 等待鎖期間可能已由其他請求編碼完成
+        if not _is_fresh(out_path, src_path):
+            _encode(src_path, out_path, FORMATS[name], low_priority)
+            print(f"🎚️ 已編碼音檔變體：{out_path}")
+    return out_path
+
+
+def variant_url(audio_url, name):
+    """將靜態檔案網址（例如 /output/xxx.mp3）換成 name 格式變體的網址"""
+    src_path = urllib.parse.unquote(audio_url).lstrip("/")
+    return "/" + urllib.parse.quote(ensure_variant(src_path, name))
+
+
+def preencode(src_path, low_priority=False):
+    """預先編碼 AUDIO_PREENCODE_FORMATS 中的格式，失敗只記錄不拋出"""
+    for name in PREENCODE_FORMATS:
+        try:
+            ensure_variant(src_path, name, low_priority)
+        except Exception as e:
+            print(f"⚠️ 預先編碼 {name} 失敗 ({src_path}): {e}")
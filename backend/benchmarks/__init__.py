@@ -0,0 +1 @@
+"""離線基準測試"""
@@ -0,0 +1,89 @@
+"""
+新聞音訊合併的基準測試
+
+用法（於 backend 目錄下，需要 ffmpeg）：
+    python -m benchmarks.bench_audio_assembly [--segments 10 50 200]
+
+以合成的正弦波片段模擬 TTS 輸出，比較舊的 AudioSegment 累加 (+=) 合併方式與
+news_audio.assemble_news_audio 的單次串流合併，輸出耗時與 Python 端的峰值記憶體。
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+import news_audio
+
+# 每個段落的片段數，模擬一般新聞段落被切成數個語音片段
+SEGMENTS_PER_PARAGRAPH = 5
+SEGMENT_MS = 1500
+# Hakka TTS 輸出的 WAV 取樣率
+SOURCE_FRAME_RATE = 22050
+
+
+def make_article(directory, segment_count):
+    """產生合成片段檔，返回 (段落文字列表, 每段落的片段路徑列表)"""
+    template = Sine(440, sample_rate=SOURCE_FRAME_RATE).to_audio_segment(duration=SEGMENT_MS)
+    news_content, all_seg_paths = [], []
+    for seg in range(segment_count):
+        idx = seg // SEGMENTS_PER_PARAGRAPH
+        if idx == len(news_content):
+            news_content.append(f"第 {idx + 1} 段")
+            all_seg_paths.append([])
+        path = os.path.join(directory, f"segment_{idx}_{seg % SEGMENTS_PER_PARAGRAPH}.wav")
+        template.export(path, format="wav")
+        all_seg_paths[idx].append(path)
+    return news_content, all_seg_paths
+
+
+def legacy_assemble(news_content, all_seg_paths, out_path):
+    """重寫前 get_audio 的合併方式"""
+    final_audio = AudioSegment.empty()
+    pause = AudioSegment.silent(duration=news_audio.PARAGRAPH_PAUSE_MS)
+    for idx, _ in enumerate(news_content):
+        para_audio = AudioSegment.empty()
+        for path in all_seg_paths[idx]:
+            para_audio += AudioSegment.from_file(path)
+        final_audio += para_audio + pause
+    final_audio.export(out_path, format="mp3")
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, nargs="+", default=[10, 50, 200], help="每篇文章的片段數")
+    args = parser.parse_args(argv)
+
+    print(f"{'片段數':>6}{'累加 (s)':>12}{'累加峰值 (MB)':>16}{'串流 (s)':>12}{'串流峰值 (MB)':>16}")
+    for count in args.segments:
+        with tempfile.TemporaryDirectory() as directory:
+            news_content, all_seg_paths = make_article(directory, count)
+            legacy_time, legacy_peak = measure(
+                legacy_assemble, news_content, all_seg_paths, os.path.join(directory, "legacy.mp3"))
+            stream_time, stream_peak = measure(
+                news_audio.assemble_news_audio, news_content, all_seg_paths, os.path.join(directory, "stream.mp3"))
+        print(f"{count:>6}{legacy_time:>12.2f}{legacy_peak / 2**20:>16.1f}"
+              f"{stream_time:>12.2f}{stream_peak / 2**20:>16.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
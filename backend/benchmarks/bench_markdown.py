@@ -0,0 +1,96 @@
+"""
+Markdown 保護／恢復引擎的黃金比對與微基準
+
+用法（於 backend 目錄下）：
+    python -m benchmarks.bench_markdown [--repeat 5]
+
+先確認新實作在黃金語料上的輸出與重寫前逐條 re.sub 的版本逐位元組相同，
+再比較兩者在長篇課程章節上的耗時。不需要網路連線。
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import hakka_trans_module
+from benchmarks import reference_markdown
+from benchmarks.corpus import course_chapters, damaged_translations
+
+
+def build_corpus():
+    chapters = course_chapters()
+    segments = []
+    for chapter in chapters:
+        segments.extend(reference_markdown.extract_text_segments(chapter)[0])
+    protected = [reference_markdown.protect_markdown_symbols(segment) for segment in segments]
+    damaged = damaged_translations(protected)
+    return chapters, segments, damaged
+
+
+def check_golden(chapters, segments, damaged):
+    """返回不一致的筆數"""
+    mismatches = 0
+    cases = [
+        ("extract_text_segments", reference_markdown.extract_text_segments,
+         hakka_trans_module.extract_text_segments, chapters),
+        ("protect_markdown_symbols", reference_markdown.protect_markdown_symbols,
+         hakka_trans_module.protect_markdown_symbols, segments),
+        ("restore_markdown_symbols", reference_markdown.restore_markdown_symbols,
+         hakka_trans_module.restore_markdown_symbols, damaged),
+    ]
+    for name, reference, current, inputs in cases:
+        for text in inputs:
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = reference(text)
+                actual = current(text)
+            if expected != actual:
+                mismatches += 1
+                print(f"❌ {name} 輸出不一致：{text[:60]!r}")
+        print(f"✅ {name}: {len(inputs)} 筆比對完成")
+    return mismatches
+
+
+def time_function(func, inputs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for text in inputs:
+                func(text)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="每個函式重複量測的次數（取最佳值）")
+    args = parser.parse_args(argv)
+
+    chapters, segments, damaged = build_corpus()
+    total_chars = sum(len(chapter) for chapter in chapters)
+    print(f"語料：{len(chapters)} 章（共 {total_chars} 字元）、{len(segments)} 個段落")
+
+    if check_golden(chapters, segments, damaged):
+        print("黃金比對失敗，停止基準測試")
+        return 1
+
+    print(f"\n{'函式':<28}{'重寫前 (ms)':>14}{'目前 (ms)':>14}{'加速':>10}")
+    cases = [
+        ("extract_text_segments", reference_markdown.extract_text_segments,
+         hakka_trans_module.extract_text_segments, chapters),
+        ("protect_markdown_symbols", reference_markdown.protect_markdown_symbols,
+         hakka_trans_module.protect_markdown_symbols, segments),
+        ("restore_markdown_symbols", reference_markdown.restore_markdown_symbols,
+         hakka_trans_module.restore_markdown_symbols, damaged),
+    ]
+    for name, reference, current, inputs in cases:
+        before = time_function(reference, inputs, args.repeat)
+        after = time_function(current, inputs, args.repeat)
+        print(f"{name:<28}{before * 1000:>14.2f}{after * 1000:>14.2f}{before / after:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+新聞列表與文章解析的基準測試
+
+用法（於 backend 目錄下）：
+    python -m benchmarks.bench_news_parse [--repeat 20]
+
+以 benchmarks/fixtures 中保存的 ETtoday 頁面離線執行：先確認 news_scraper 的解析結果
+與改寫前（html.parser 解析完整頁面）完全相同，再比較兩者的解析耗時。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import news_scraper
+from benchmarks import reference_news
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def time_function(func, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="每個函式重複量測的次數（取最佳值）")
+    args = parser.parse_args(argv)
+
+    cases = [
+        ("parse_news_links", "news_list.html", reference_news.parse_news_links, news_scraper.parse_news_links),
+        ("parse_article", "news_article.html", reference_news.parse_article, news_scraper.parse_article),
+    ]
+    print(f"解析器：{news_scraper.HTML_PARSER}")
+
+    mismatches = 0
+    for name, fixture, reference, current in cases:
+        html = load_fixture(fixture)
+        if reference(html) != current(html):
+            mismatches += 1
+            print(f"❌ {name} 輸出與改寫前不一致（{fixture}）")
+        else:
+            print(f"✅ {name}: {fixture}（{len(html.encode('utf-8')) // 1024} KB）比對一致")
+    if mismatches:
+        print("黃金比對失敗，停止基準測試")
+        return 1
+
+    print(f"\n{'函式':<20}{'改寫前 (ms)':>14}{'目前 (ms)':>14}{'加速':>10}")
+    for name, fixture, reference, current in cases:
+        html = load_fixture(fixture)
+        before = time_function(reference, html, args.repeat)
+        after = time_function(current, html, args.repeat)
+        print(f"{name:<20}{before * 1000:>14.2f}{after * 1000:>14.2f}{before / after:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
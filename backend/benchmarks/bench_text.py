@@ -0,0 +1,168 @@
+"""
+文字處理熱路徑的微基準
+
+用法（於 backend 目錄下）：
+    python -m benchmarks.bench_text                    # 量測並與已儲存的基準比較
+    python -m benchmarks.bench_text --save-baseline    # 量測並覆寫基準檔
+    python -m benchmarks.bench_text --only restore_markdown_symbols
+
+量測每次翻譯與語音渲染都會經過的文字處理函式：
+    split_smart_segments、plan_segments、extract_text_segments、
+    protect_markdown_symbols、restore_markdown_symbols、reconstruct_markdown
+語料為長篇新聞（含保存的文章頁）與含代碼塊、表格、巢狀列表的課程 Markdown，不需要網路連線。
+
+每個函式回報吞吐量（每秒處理的輸入 KB 與呼叫次數）與配置量（tracemalloc 的峰值與
+留存的記憶體區塊數）。吞吐量與機器有關，基準檔請在同一台機器上更新與比較。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import hakka_trans_module
+import hakka_tts_module
+import segment_planner
+from benchmarks.corpus import course_chapters, damaged_translations, fixture_article, news_articles
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "bench_text.json")
+
+
+def build_cases():
+    """
+    Returns:
+        [(名稱, 函式, 參數 tuple 列表, 輸入位元組數), ...]
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        articles = news_articles() + [fixture_article()]
+        news_paragraphs = [paragraph for article in articles for paragraph in article]
+
+        chapters = course_chapters()
+        extracted = [hakka_trans_module.extract_text_segments(chapter) for chapter in chapters]
+        segments = [segment for chapter_segments, _ in extracted for segment in chapter_segments]
+        protected = [hakka_trans_module.protect_markdown_symbols(segment) for segment in segments]
+        damaged = damaged_translations(protected)
+        # 以原文段落代替翻譯結果，重組出的文件長度與實際情況相近
+        reconstruct_inputs = [(template, chapter_segments) for chapter_segments, template in extracted]
+        # 課程章節轉語音時也會經過片段切分
+        speech_lines = news_paragraphs + [line for chapter in chapters for line in chapter.split("\n") if line.strip()]
+
+    def size(texts):
+        return sum(len(text.encode("utf-8")) for text in texts)
+
+    return [
+        ("split_smart_segments", hakka_tts_module.split_smart_segments,
+         [(text,) for text in speech_lines], size(speech_lines)),
+        ("plan_segments", segment_planner.plan_segments,
+         [(text,) for text in speech_lines], size(speech_lines)),
+        ("extract_text_segments", hakka_trans_module.extract_text_segments,
+         [(chapter,) for chapter in chapters], size(chapters)),
+        ("protect_markdown_symbols", hakka_trans_module.protect_markdown_symbols,
+         [(segment,) for segment in segments], size(segments)),
+        ("restore_markdown_symbols", hakka_trans_module.restore_markdown_symbols,
+         [(text,) for text in damaged], size(damaged)),
+        ("reconstruct_markdown", hakka_trans_module.reconstruct_markdown,
+         reconstruct_inputs, size(template for template, _ in reconstruct_inputs)),
+    ]
+
+
+def run_pass(func, inputs):
+    for args in inputs:
+        func(*args)
+
+
+def measure(func, inputs, input_bytes, repeat):
+    """返回單一函式的量測結果字典"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_pass(func, inputs)  # 預熱（編譯正規表示式、填入快取）
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run_pass(func, inputs)
+            best = min(best, time.perf_counter() - start)
+
+        # 配置量另外量測一次，避免 tracemalloc 的額外成本影響計時
+        tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.reset_peak()
+        run_pass(func, inputs)
+        _, peak = tracemalloc.get_traced_memory()
+        retained_blocks = sys.getallocatedblocks() - blocks_before
+        tracemalloc.stop()
+
+    return {
+        "calls": len(inputs),
+        "input_kb": round(input_bytes / 1024, 1),
+        "seconds": best,
+        "kb_per_sec": round(input_bytes / 1024 / best, 1),
+        "calls_per_sec": round(len(inputs) / best, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "retained_blocks": retained_blocks,
+    }
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def compare(name, result, baseline, tolerance):
+    """返回 (說明文字, 是否退步)"""
+    previous = baseline.get(name)
+    if not previous:
+        return "（無基準）", False
+    speed = result["kb_per_sec"] / previous["kb_per_sec"] - 1
+    memory = result["peak_kb"] / previous["peak_kb"] - 1 if previous["peak_kb"] else 0.0
+    regressed = speed < -tolerance or memory > tolerance
+    note = f"速度 {speed:+.0%}，峰值 {memory:+.0%}"
+    return ("❌ " if regressed else "✅ ") + note, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="每個函式重複量測的次數（取最佳值）")
+    parser.add_argument("--only", nargs="*", help="只量測指定的函式")
+    parser.add_argument("--save-baseline", action="store_true", help="將本次結果寫入基準檔")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="吞吐量下降或峰值記憶體上升超過此比例即視為退步")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline()
+    results = {}
+    regressions = []
+
+    print(f"{'函式':<26}{'呼叫數':>8}{'輸入 KB':>10}{'KB/s':>12}{'呼叫/s':>12}{'峰值 KB':>10}{'留存區塊':>10}  與基準比較")
+    for name, func, inputs, input_bytes in build_cases():
+        if args.only and name not in args.only:
+            continue
+        result = measure(func, inputs, input_bytes, args.repeat)
+        results[name] = result
+        note, regressed = compare(name, result, baseline, args.tolerance)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<26}{result['calls']:>8}{result['input_kb']:>10}{result['kb_per_sec']:>12}"
+              f"{result['calls_per_sec']:>12}{result['peak_kb']:>10}{result['retained_blocks']:>10}  {note}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({**baseline, **results}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n已更新基準檔：{BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\n⚠️ 相較基準退步：{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
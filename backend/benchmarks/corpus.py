@@ -0,0 +1,142 @@
+"""
+離線基準測試用語料
+以課程生成器的模擬資料為基礎，組出包含代碼塊、表格、巢狀列表的長篇課程章節，
+並模擬翻譯服務對保護符號造成的各種破壞，作為黃金比對語料；
+另外以固定亂數種子產生中英混雜的長篇新聞段落
+"""
+
+import os
+import random
+
+from course_generator import CourseGenerator, CourseRequest
+
+TOPICS = ["客家文化", "Python 程式設計", "台灣歷史", "機器學習", "客家美食"]
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+
+_EXTRA_SECTION = """
+## 範例程式
+
+以下是一段 `print()` 的範例，請注意 **縮排** 與 _變數命名_：
+
+```python
+def greet(name):
+    # __CODE_BLOCK_0__ 只是字串，不應被翻譯
+    return f"Hello, {name}!"
+```
+
+## 重點整理
+
+| 項目 | 說明 | 備註 |
+|------|------|------|
+| 變數 | 儲存資料的名稱 | *必讀* |
+| 函式 | 可重複使用的程式碼 | __重要__ |
+
+1. 第一步：安裝環境
+   - 下載 **Python 3.13**
+   - 設定 `PATH`
+     * 確認 *版本* 正確
+2. 第二步：撰寫程式
+   + 使用 __編輯器__ 開啟檔案
+3. 第三步：執行並觀察結果
+
+> 學習是一個持續的過程，**堅持** 才能看見成果。
+
+---
+
+客家話講「**食飽吂**」係打招呼个意思，*毋係* 真个問你食飯吂。
+這段文字包含 English words 與數字 2025，也有 _底線斜體_ 和 ***粗斜體***。
+"""
+
+
+def course_chapters(chapters_per_topic=3, repeat_sections=4):
+    """
+    產生長篇課程章節 Markdown 列表
+
+    Args:
+        chapters_per_topic: 每個主題取用的模擬章節數
+        repeat_sections: 每章額外附加的範例區塊數，用來放大章節長度
+    """
+    generator = CourseGenerator()
+    chapters = []
+    for topic in TOPICS:
+        for difficulty in DIFFICULTIES:
+            request = CourseRequest(topic=topic, difficulty=difficulty, includeQuiz=True)
+            for item in generator._generate_mock_course_data(request)[:chapters_per_topic]:
+                chapters.append(item["text"] + _EXTRA_SECTION * repeat_sections)
+    return chapters
+
+
+# 翻譯服務常見的保護符號破壞方式
+_DAMAGES = [
+    lambda s: s,
+    lambda s: s.replace("♥BOLD_START♥", "♥ BOLD_START ♥").replace("♥BOLD_END♥", "♥ BOLD END♥"),
+    lambda s: s.replace("♥BOLD_START♥", "♥B OLD_START♥"),
+    lambda s: s.replace("♦UNDER_BOLD_START♦", "♦ UNDER BOLD START ♦").replace("♦UNDER_BOLD_END♦", "♦ UNDER_BOLD_END ♦"),
+    lambda s: s.replace("♣ITALIC_START♣", "♣ ITALIC START ♣").replace("♣ITALIC_END♣", "♣I TALIC_END♣"),
+    lambda s: s.replace("♠UNDER_ITALIC_START♠", "♠ UNDER ITALIC START ♠").replace("♠UNDER_ITALIC_END♠", "♠ UNDER_ITALIC_END ♠"),
+    lambda s: s.replace("❤CODE_BLOCK_0❤", "❤CODE BLOCK_0 ❤").replace("❤CODE_BLOCK_1❤", "❤C ODE_BLOCK_1❤"),
+    lambda s: s.replace("❤CODE_BLOCK_1❤", "❤CODE BLOCK_二 ❤").replace("❤CODE_BLOCK_3❤", "❤CODE _BLOCK_四 ❤"),
+    lambda s: s.replace("❤CODE_BLOCK_2❤", "CODE_BLOCK_三").replace("❤CODE_BLOCK_0❤", "____CODE_BLOCK_0____"),
+    lambda s: s.replace("❤TRANSLATE_PLACEHOLDER_", "❤ TRANSLATE PLACEHOLDER "),
+    lambda s: s.replace("♥BOLD_END♥", "♥BOLD_END") + " ** 多餘 空格 ** 與 _ 斜體 _",
+]
+
+
+def damaged_translations(segments, seed=2025):
+    """
+    將段落加上保護符號後，隨機套用一種翻譯服務可能造成的破壞
+
+    Args:
+        segments: 已經過 protect_markdown_symbols 的段落
+        seed: 亂數種子，確保每次產生相同語料
+    """
+    rng = random.Random(seed)
+    return [rng.choice(_DAMAGES)(segment) for segment in segments]
+
+
+_NEWS_SUBJECTS = ["行政院", "台北市政府", "客家委員會", "中央氣象署", "台積電", "立法院", "交通部", "衛福部"]
+_NEWS_FOREIGN = ["Apple", "Google", "OpenAI", "NVIDIA", "Microsoft", "Tesla", "Krathon", "Netflix"]
+_NEWS_ACRONYMS = ["AI", "5G", "VR", "GDP", "CEO", "ETF", "APP", "USB"]
+_NEWS_CLAUSES = [
+    "今天上午召開記者會說明最新進度",
+    "預計明年第一季正式上路",
+    "民眾反應相當熱烈",
+    "專家指出仍有不少隱憂",
+    "相關單位表示將持續關注後續發展",
+    "「這是很重要的一步」，負責人受訪時強調",
+    "截至目前為止已有超過 {n} 人參與",
+    "（詳見附表）",
+]
+
+
+def news_articles(count=20, paragraphs=15, seed=2025):
+    """
+    產生中英混雜的長篇新聞段落（含英文專有名詞、縮寫、數字與全形標點）
+
+    Returns:
+        文章列表，每篇為 [標題, 時間, 段落1, ...]，格式與 /api/news 相同
+    """
+    rng = random.Random(seed)
+    articles = []
+    for i in range(count):
+        article = [f"{rng.choice(_NEWS_SUBJECTS)}宣布 {rng.choice(_NEWS_ACRONYMS)} 新政策", f"2025年10月{i % 28 + 1}日 {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"]
+        for _ in range(paragraphs):
+            sentences = []
+            for _ in range(rng.randint(2, 5)):
+                clause = rng.choice(_NEWS_CLAUSES).format(n=rng.randint(100, 99999))
+                sentences.append(
+                    f"{rng.choice(_NEWS_SUBJECTS)}與 {rng.choice(_NEWS_FOREIGN)} 合作推動 "
+                    f"{rng.choice(_NEWS_ACRONYMS)} 應用，{clause}"
+                )
+            article.append("，".join(sentences) + "。")
+        articles.append(article)
+    return articles
+
+
+def fixture_article():
+    """benchmarks/fixtures 中保存的 ETtoday 文章頁解析結果"""
+    import news_scraper
+
+    path = os.path.join(os.path.dirname(__file__), "fixtures", "news_article.html")
+    with open(path, "r", encoding="utf-8") as f:
+        return news_scraper.parse_article(f.read())
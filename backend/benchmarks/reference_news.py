@@ -0,0 +1,31 @@
+"""
+改寫前的新聞解析實作（html.parser 解析完整頁面）
+僅供基準測試與黃金比對使用，請勿在服務程式碼中引用
+"""
+
+from bs4 import BeautifulSoup
+
+
+def parse_news_links(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return [a['href'] for a in soup.select('div.part_list_2 a') if '/news/' in a.get('href', '') and a['href'].startswith('https://')]
+
+
+def parse_article(html):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    title = soup.find('h1', class_='title').text.strip()
+    time = soup.find('time').text.strip()
+    content_div = soup.find('div', class_='story')
+    paragraphs = content_div.find_all('p')
+
+    news_content = [title, time]
+    for p in paragraphs:
+        for strong in p.find_all('strong'):
+            strong.extract()
+        for a in p.find_all('a'):
+            a.extract()
+        text = p.get_text(strip=True)
+        if text:
+            news_content.append(text)
+    return news_content
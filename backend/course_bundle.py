@@ -0,0 +1,211 @@
+"""
+課程套件工作
+一次完成課程生成、逐章翻譯與語音合成：翻譯依章節順序進行，完成的章節立即交給
+語音合成階段，第 N 章的合成與第 N+1 章的翻譯同時進行。
+用戶端可輪詢工作狀態或訂閱進度，已完成的章節不必等待整門課程結束即可取用。
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import time
+import urllib.parse
+import uuid
+
+from dotenv import load_dotenv
+
+import hakka_trans_module
+import news_audio
+import workspace
+from course_generator import CourseRequest, course_generator
+
+# 載入環境變數
+load_dotenv()
+
+COURSE_BUNDLE_ROOT = "output/courses"
+# 同時進行語音合成的章節數
+COURSE_BUNDLE_TTS_WORKERS = int(os.getenv("COURSE_BUNDLE_TTS_WORKERS", "2"))
+# 記憶體中保留的工作數上限，超過時刪除最舊的工作與其音檔
+COURSE_BUNDLE_KEEP_LIMIT = int(os.getenv("COURSE_BUNDLE_KEEP_LIMIT", "50"))
+
+_CODE_FENCE_RE = re.compile(r'```.*?```', re.DOTALL)
+_LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+_LINE_PREFIX_RE = re.compile(r'^\s*(?:#{1,6}\s+|[-*+]\s+|\d+\.\s+|>\s*)')
+_EMPHASIS_RE = re.compile(r'[*_`~]+')
+
+
+def speech_paragraphs(markdown_text):
+    """將 Markdown 章節轉為要朗讀的段落（去除程式碼區塊、連結網址與格式符號）"""
+    text = _CODE_FENCE_RE.sub('', markdown_text)
+    text = _LINK_RE.sub(r'\1', text)
+    paragraphs = []
+    for line in text.split('\n'):
+        line = _EMPHASIS_RE.sub('', _LINE_PREFIX_RE.sub('', line)).strip()
+        if line and not re.fullmatch(r'[-=|:\s]+', line):
+            paragraphs.append(line)
+    return paragraphs
+
+
+class CourseBundleJob:
+    """一個課程套件工作的狀態"""
+
+    def __init__(self, request: CourseRequest):
+        self.job_id = uuid.uuid4().hex
+        self.request = request
+        self.status = "generating"
+        self.error = None
+        self.chapters = []
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.directory = os.path.join(COURSE_BUNDLE_ROOT, self.job_id)
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _touch(self):
+        """狀態有變化時喚醒所有訂閱者"""
+        self.updated_at = time.time()
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def change_event(self):
+        """下一次狀態變化時會被設定的 Event"""
+        return self._changed
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "topic": self.request.topic,
+            "difficulty": self.request.difficulty,
+            "completed": sum(1 for chapter in self.chapters if chapter["status"] in ("done", "failed")),
+            "total": len(self.chapters),
+            "chapters": self.chapters,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    async def run(self):
+        try:
+            course_data = await course_generator.generate_course(self.request)
+            self.chapters = [
+                {
+                    "index": index,
+                    "status": "pending",
+                    "text": chapter.get("text", ""),
+                    "output": chapter.get("output"),
+                    "translatedText": None,
+                    "audio_url": None,
+                    "subtitles": None,
+                    "error": None,
+                }
+                for index, chapter in enumerate(course_data)
+            ]
+            self.status = "processing"
+            self._touch()
+
+            os.makedirs(self.directory, exist_ok=True)
+            queue = asyncio.Queue()
+            workers = [
+                asyncio.create_task(self._synthesis_worker(queue))
+                for _ in range(max(1, COURSE_BUNDLE_TTS_WORKERS))
+            ]
+            for chapter in self.chapters:
+                if await self._translate(chapter):
+                    await queue.put(chapter)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+            self.status = "done"
+            print(f"✅ 課程套件完成 ({self.job_id})：{len(self.chapters)} 章")
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            print(f"❌ 課程套件失敗 ({self.job_id}): {e}")
+        finally:
+            self._touch()
+
+    async def _translate(self, chapter):
+        chapter["status"] = "translating"
+        self._touch()
+        try:
+            result = await hakka_trans_module.hakka_translate_async(
+                chapter["text"], f"bundle_{self.job_id[:8]}_{chapter['index']}"
+            )
+            translated_text = result.get("translatedText") or result.get("output") or result.get("translated_text")
+            if not translated_text:
+                raise RuntimeError("翻譯結果為空")
+            chapter["translatedText"] = translated_text
+            chapter["status"] = "translated"
+            return True
+        except Exception as e:
+            chapter["status"] = "failed"
+            chapter["error"] = f"翻譯失敗: {e}"
+            print(f"❌ 課程套件第 {chapter['index'] + 1} 章翻譯失敗: {e}")
+            return False
+        finally:
+            self._touch()
+
+    async def _synthesis_worker(self, queue):
+        while True:
+            chapter = await queue.get()
+            if chapter is None:
+                return
+            await self._synthesize(chapter)
+
+    async def _synthesize(self, chapter):
+        chapter["status"] = "synthesizing"
+        self._touch()
+        mp3_name = f"chapter_{chapter['index']}.mp3"
+        try:
+            paragraphs = speech_paragraphs(chapter["translatedText"])
+            if paragraphs:
+                with workspace.job_workspace("course") as workdir:
+                    subtitles, has_audio = await news_audio.render_news_audio(
+                        paragraphs, workdir, os.path.join(self.directory, mp3_name)
+                    )
+                chapter["subtitles"] = subtitles
+                if has_audio:
+                    chapter["audio_url"] = f"/{self.directory}/{urllib.parse.quote(mp3_name)}"
+            if chapter["audio_url"] is None:
+                chapter["error"] = "語音檔為空"
+        except Exception as e:
+            chapter["error"] = f"語音合成失敗: {e}"
+            print(f"❌ 課程套件第 {chapter['index'] + 1} 章語音合成失敗: {e}")
+        finally:
+            # 翻譯已完成，語音失敗時章節仍可閱讀
+            chapter["status"] = "done"
+            self._touch()
+
+
+_jobs = {}
+
+
+def _prune():
+    finished = sorted((job for job in _jobs.values() if job.finished), key=lambda job: job.updated_at)
+    for job in finished[:max(0, len(_jobs) - COURSE_BUNDLE_KEEP_LIMIT)]:
+        _jobs.pop(job.job_id, None)
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+
+def start_job(request: CourseRequest):
+    """建立並在背景啟動一個課程套件工作"""
+    _prune()
+    job = CourseBundleJob(request)
+    _jobs[job.job_id] = job
+    job.task = asyncio.create_task(job.run())
+    return job
+
+
+def get_job(job_id):
+    """
+    Raises:
+        KeyError: 找不到工作（可能已被清除）
+    """
+    return _jobs[job_id]
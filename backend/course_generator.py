@@ -6,11 +6,16 @@
 import os
 import aiohttp
 import asyncio
+import copy
 import json
+import time
+from collections import OrderedDict
 from typing import Dict, Any, List
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+import metrics
+
 # 載入環境變數
 load_dotenv()
 
@@ -19,18 +24,92 @@ class CourseRequest(BaseModel):
     topic: str
     difficulty: str
     includeQuiz: bool
+    # 為 True 時略過快取，重新生成課程（結果仍會寫回快取）
+    refresh: bool = False
 
 class CourseGenerator:
     """課程生成器類"""
     
     def __init__(self):
         self.webhook_url = os.getenv("COURSE_WEBHOOK_URL", "")
+        # 讀取逾時：webhook 需等待 LLM 工作流程完成才會回應，因此較長
         self.timeout = int(os.getenv("WEBHOOK_TIMEOUT", "30"))
+        # 連線逾時：只計算 TCP/TLS 交握（不含等待連線池空位），無法建立連線時應盡快退回模擬資料
+        self.connect_timeout = int(os.getenv("WEBHOOK_CONNECT_TIMEOUT", "10"))
+        # 整體逾時：讀取逾時只限制兩次收到資料的間隔，持續緩慢送出資料的回應仍需要上限
+        self.total_timeout = int(os.getenv("WEBHOOK_TOTAL_TIMEOUT", str(self.timeout * 3)))
+        # 連線池大小與閒置連線保留秒數
+        self.pool_size = int(os.getenv("WEBHOOK_POOL_SIZE", "10"))
+        self.keepalive_timeout = int(os.getenv("WEBHOOK_KEEPALIVE_TIMEOUT", "60"))
+        self._session: aiohttp.ClientSession = None
+        # 課程結果快取：(主題, 難度, 練習題) → (過期時間, 課程數據)
+        self.cache_ttl = int(os.getenv("COURSE_CACHE_TTL", "86400"))
+        self.cache_max_entries = int(os.getenv("COURSE_CACHE_MAX_ENTRIES", "100"))
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # 進行中的生成：相同請求共用同一次 webhook 呼叫
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+    
+    async def start(self):
+        """建立長駐的 webhook 連線池（於應用程式啟動時呼叫）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.total_timeout,
+                sock_connect=self.connect_timeout,
+                sock_read=self.timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    
+    async def close(self):
+        """關閉連線池（於應用程式關閉時呼叫）"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    @staticmethod
+    def _cache_key(request: CourseRequest) -> tuple:
+        return (request.topic.strip(), request.difficulty, request.includeQuiz)
+    
+    def _cache_get(self, key: tuple):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, course_data = entry
+        if time.time() >= expires_at:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return course_data
+    
+    def _cache_put(self, key: tuple, course_data: List[Dict[str, Any]]):
+        self._cache[key] = (time.time() + self.cache_ttl, course_data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._cache),
+            "inflight": len(self._inflight),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "coalesced": self.coalesced,
+        }
     
     async def generate_course(self, request: CourseRequest) -> List[Dict[str, Any]]:
         """
         生成課程內容
         
+        相同的 (主題, 難度, 練習題) 在 COURSE_CACHE_TTL 秒內直接返回快取結果；
+        同時進行的相同請求只會呼叫一次 webhook。request.refresh 為 True 時略過快取。
+        
         Args:
             request: 課程生成請求
             
@@ -40,6 +119,41 @@ class CourseGenerator:
         Raises:
             Exception: 當課程生成失敗時
         """
+        key = self._cache_key(request)
+        if not request.refresh:
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                print(f"課程快取命中: {key}")
+                return copy.deepcopy(cached)
+        self.cache_misses += 1
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate_and_cache(key, request))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            print(f"相同的課程正在生成中，等待同一結果: {key}")
+        # 等待者被取消時不影響共用的生成
+        course_data = await asyncio.shield(task)
+        return copy.deepcopy(course_data)
+    
+    async def _generate_and_cache(self, key: tuple, request: CourseRequest) -> List[Dict[str, Any]]:
+        course_data, from_webhook = await self._generate(request)
+        # 只快取 webhook 的真實結果，模擬資料下次仍會重試
+        if from_webhook:
+            self._cache_put(key, course_data)
+        return course_data
+    
+    async def _generate(self, request: CourseRequest):
+        """
+        呼叫 webhook 生成課程，失敗時退回模擬資料
+        
+        Returns:
+            (課程數據列表, 是否來自 webhook)
+        """
         try:
             # 將英文難度轉換為中文
             difficulty_map = {
@@ -61,7 +175,7 @@ class CourseGenerator:
             # 檢查是否設定了 webhook URL
             if not self.webhook_url:
                 print("警告：未設定 COURSE_WEBHOOK_URL，使用模擬課程資料")
-                return self._generate_mock_course_data(request)
+                return self._generate_mock_course_data(request), False
             
             # 調用 webhook
             response = await self._call_webhook(webhook_data)
@@ -69,17 +183,17 @@ class CourseGenerator:
             # 驗證回應格式
             if not self._validate_response(response):
                 print("Webhook 回應格式不正確，使用模擬課程資料")
-                return self._generate_mock_course_data(request)
+                return self._generate_mock_course_data(request), False
             
             print("課程生成成功")
-            return response
+            return response, True
             
-        except aiohttp.ClientTimeout:
+        except asyncio.TimeoutError:
             print("Webhook 調用超時，使用模擬課程資料")
-            return self._generate_mock_course_data(request)
+            return self._generate_mock_course_data(request), False
         except Exception as e:
             print(f"課程生成過程中發生錯誤: {e}，使用模擬課程資料")
-            return self._generate_mock_course_data(request)
+            return self._generate_mock_course_data(request), False
     
     async def _call_webhook(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -99,14 +213,17 @@ class CourseGenerator:
         
         print(f"正在調用 webhook: {self.webhook_url}")
         
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        # 未經 startup 直接使用時（例如離線腳本）才在此建立連線池
+        if self._session is None or self._session.closed:
+            await self.start()
         
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(
+        with metrics.track_upstream("course_webhook", "generate") as call:
+            async with self._session.post(
                 self.webhook_url,
                 json=data,
                 headers=headers
             ) as response:
+                call.status = response.status
                 response.raise_for_status()
                 
                 print(f"Webhook 回應成功，狀態碼: {response.status}")
@@ -1,11 +1,224 @@
+import asyncio
+import functools
 import requests
 import json
 from dotenv import load_dotenv
 import os
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import metrics
+import request_profiler
+import upstream_client
+from translation_memory import translation_memory
 
 load_dotenv()
 
+# 所有翻譯工作合計同時送往翻譯服務的段落數上限（共用段落執行緒池的大小）
+TRANSLATE_MAX_CONCURRENCY = int(os.getenv("HAKKA_TRANS_MAX_CONCURRENCY", "4"))
+# async 端點同時執行的翻譯工作數上限（各工作的段落共用同一個段落執行緒池）
+TRANSLATE_MAX_JOBS = int(os.getenv("HAKKA_TRANS_MAX_JOBS", "4"))
+
+class HakkaTranslateClient(upstream_client.TokenSession):
+    """
+    客語翻譯服務客戶端
+    共用連線池與 token 快取，所有翻譯端點與啟動預熱使用同一個實例
+    """
+
+    upstream = "hakka_translate"
+    operation = "translate"
+
+    def __init__(self, url, transUrl, username, password):
+        super().__init__(
+            token_ttl=int(os.getenv("HAKKA_TRANS_TOKEN_TTL", "3000")),
+            pool_size=int(os.getenv("HAKKA_TRANS_POOL_SIZE", "10")),
+            timeout=int(os.getenv("HAKKA_TRANS_TIMEOUT", "60")),
+        )
+        self.url = url
+        self.transUrl = transUrl
+        self.username = username
+        self.password = password
+
+    def _login(self):
+        payload = json.dumps({
+            "username": self.username,
+            "password": self.password,
+            "rememberMe": 0
+        })
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        response = self.session.post(self.url, headers=headers, data=payload, timeout=self.timeout, verify=self.verify)
+        response.raise_for_status()
+        return response.json().get('token')
+
+    def translate(self, protected_segment):
+        """送出單段翻譯請求，返回原始 response"""
+        payload = json.dumps({
+            "input": protected_segment
+        })
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        return self.authorized_request("POST", self.transUrl, headers=headers, data=payload)
+
+_translate_client = None
+_translate_client_lock = threading.Lock()
+
+def get_translate_client():
+    """
+    取得全域共用的翻譯客戶端
+    環境變數缺少時拋出 ValueError
+    """
+    global _translate_client
+    if _translate_client is not None:
+        return _translate_client
+
+    # Validate environment variables
+    url = os.getenv("HAKKA_TRANS_URL_BASE")
+    transUrl = os.getenv("HAKKA_TRANS_URL_TRANS")
+    username = os.getenv("HAKKA_TRANS_USERNAME")
+    password = os.getenv("HAKKA_TRANS_PASSWORD")
+
+    if not url or not transUrl or not username or not password:
+        raise ValueError("Missing one or more required environment variables: HAKKA_TRANS_URL_BASE, HAKKA_TRANS_URL_TRANS, HAKKA_TRANS_USERNAME, HAKKA_TRANS_PASSWORD")
+
+    with _translate_client_lock:
+        if _translate_client is None:
+            _translate_client = HakkaTranslateClient(url, transUrl, username, password)
+    return _translate_client
+
+# --- Markdown 保護／恢復規則表 ---
+# 所有規則在載入模組時編譯一次。每個階段另外編譯一個「聯集」pattern，
+# 先用一次掃描判斷該階段是否有任何規則可能命中，沒有命中就整段跳過；
+# 命中時仍依原本順序逐條套用，確保輸出與逐條 re.sub 完全相同。
+
+def _compile_stage(rules):
+    """將 (pattern, replacement) 列表編譯成 (聯集 gate, 已編譯規則)"""
+    gate = re.compile('|'.join(f'(?:{pattern})' for pattern, _ in rules))
+    return gate, [(re.compile(pattern), replacement) for pattern, replacement in rules]
+
+def _apply_stage(text, stage):
+    gate, rules = stage
+    if gate.search(text) is None:
+        return text
+    for pattern, replacement in rules:
+        text = pattern.sub(replacement, text)
+    return text
+
+# 中文數字對應表（保留原本的迭代順序：「十」在「十一」、「十二」之前）
+_CHINESE_NUMBERS = {
+    '一': '1', '二': '2', '三': '3', '四': '4', '五': '5',
+    '六': '6', '七': '7', '八': '8', '九': '9', '十': '10',
+    '十一': '11', '十二': '12'
+}
+
+# 第1步：保護代碼塊佔位符（最高優先級）
+_PROTECT_CODE_BLOCK_RE = re.compile(r'__CODE_BLOCK_(\d+)__')
+_PROTECT_PLACEHOLDER_RE = re.compile(r'__TRANSLATE_PLACEHOLDER_(\d+)__')
+# 第2步：保護粗體格式 **text**
+_PROTECT_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+# 第3步：保護底線粗體 __text__（避免與代碼塊佔位符衝突）
+_PROTECT_UNDER_BOLD_RE = re.compile(r'(?<!\w)__(.+?)__(?!\w)')
+# 第4步：保護斜體格式 *text* 和 _text_
+_PROTECT_ITALIC_RE = re.compile(r'(?<!♥)(?<!\*)\*([^*♥\s][^*♥]*?[^*♥\s])\*(?!\*)(?!♥)')
+_PROTECT_UNDER_ITALIC_RE = re.compile(r'(?<!♦)(?<!♠)(?<!\w)_([^_♦♠\s][^_♦♠]*?[^_♦♠\s])_(?!\w)(?!♦)(?!♠)')
+
+# 第1階段：恢復完整的符號組合
+_RESTORE_EXACT = _compile_stage([
+    (r'❤CODE_BLOCK_(\d+)❤', r'__CODE_BLOCK_\1__'),
+    (r'❤TRANSLATE_PLACEHOLDER_(\d+)❤', r'__TRANSLATE_PLACEHOLDER_\1__'),
+    (r'♥BOLD_START♥(.+?)♥BOLD_END♥', r'**\1**'),
+    (r'♦UNDER_BOLD_START♦(.+?)♦UNDER_BOLD_END♦', r'__\1__'),
+    (r'♣ITALIC_START♣(.+?)♣ITALIC_END♣', r'*\1*'),
+    (r'♠UNDER_ITALIC_START♠(.+?)♠UNDER_ITALIC_END♠', r'_\1_'),
+])
+
+# 第2階段：修復被空格分離的符號
+_RESTORE_SPACED = _compile_stage([
+    (r'♥\s*BOLD\s*_?\s*START\s*♥', '**'),
+    (r'♥\s*BOLD\s*_?\s*END\s*♥', '**'),
+    (r'♦\s+UNDER\s*_?\s*BOLD\s*_?\s*START\s+♦', '__'),
+    (r'♦\s+UNDER\s*_?\s*BOLD\s*_?\s*END\s+♦', '__'),
+    (r'♣\s+ITALIC\s*_?\s*START\s+♣', '*'),
+    (r'♣\s+ITALIC\s*_?\s*END\s+♣', '*'),
+    (r'♠\s+UNDER\s*_?\s*ITALIC\s*_?\s*START\s+♠', '_'),
+    (r'♠\s+UNDER\s*_?\s*ITALIC\s*_?\s*END\s+♠', '_'),
+    (r'❤\s*CODE\s*_?\s*BLOCK\s*_?\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__'),
+    (r'❤\s*CODE\s+BLOCK\s*_?\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__'),
+    (r'❤\s*TRANSLATE\s*_?\s*PLACEHOLDER\s*_?\s*(\d+)\s*❤', r'__TRANSLATE_PLACEHOLDER_\1__'),
+])
+
+# 第3階段：修復被部分破壞的符號（字母被分離，例如 "B OLD"、"C ODE"、"I TALIC"）
+_RESTORE_SPLIT_LETTERS = _compile_stage([
+    (r'♥\s*B\s+OLD\s*_?\s*START\s*♥', '**'),
+    (r'♥\s*B\s+OLD\s*_?\s*END\s*♥', '**'),
+    (r'❤\s*C\s+ODE\s*_?\s*BLOCK\s*_?\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__'),
+    (r'♣\s*I\s+TALIC\s*_?\s*START\s*♣', '*'),
+    (r'♣\s*I\s+TALIC\s*_?\s*END\s*♣', '*'),
+])
+
+# 第4階段：清理普通的 Markdown 格式破壞（被分離的星號、底線、代碼塊標記）
+_RESTORE_SEPARATED = _compile_stage([
+    (r'\*\s+\*', '**'),
+    (r'_\s+_', '__'),
+    (r'_\s+_\s*CODE\s*_\s*BLOCK\s*_\s*(\d+)\s*_\s+_', r'__CODE_BLOCK_\1__'),
+])
+
+# 第5階段：中文數字代碼塊，依原本的兩輪迴圈順序展開
+_RESTORE_CHINESE_CODE_BLOCK = _compile_stage(
+    # 1. ❤CODE BLOCK_二 ❤ -> __CODE_BLOCK_2__
+    [rule for chinese, arabic in _CHINESE_NUMBERS.items() for rule in (
+        (r'❤\s*CODE\s+BLOCK\s*_?\s*' + chinese + r'\s*❤', f'__CODE_BLOCK_{arabic}__'),
+        (r'❤\s*CODE\s*_?\s*BLOCK\s*_?\s*' + chinese + r'\s*❤', f'__CODE_BLOCK_{arabic}__'),
+    )] +
+    # 2. ❤CODE _BLOCK_四 ❤ -> __CODE_BLOCK_4__
+    [rule for chinese, arabic in _CHINESE_NUMBERS.items() for rule in (
+        (r'❤\s*CODE\s+_\s*BLOCK\s*_?\s*' + chinese + r'\s*❤', f'__CODE_BLOCK_{arabic}__'),
+        (r'❤\s*CODE\s*_\s*BLOCK\s*_?\s*' + chinese + r'\s*❤', f'__CODE_BLOCK_{arabic}__'),
+    )]
+)
+
+# 3./4. 其他破壞格式與不完整的代碼塊格式：CODE_BLOCK_n -> __CODE_BLOCK_n__
+_RESTORE_DIGIT_CODE_BLOCK = _compile_stage([
+    (r'❤\s*CODE\s*BLOCK\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__'),
+    (r'❤\s*CODE\s+BLOCK\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__'),
+    (r'CODE_BLOCK_(\d+)', r'__CODE_BLOCK_\1__'),
+])
+
+# 5. 中文數字的不完整格式：CODE_BLOCK_中文數字 -> __CODE_BLOCK_n__
+# 原本逐個數字 re.sub；各數字的匹配互不重疊，且「十」先於「十一」「十二」處理，
+# 因此等同於對單一字元做一次分派替換
+_RESTORE_CHINESE_BARE_RE = re.compile(
+    'CODE_BLOCK_([' + ''.join(chinese for chinese in _CHINESE_NUMBERS if len(chinese) == 1) + '])'
+)
+
+def _replace_chinese_bare(match):
+    return f'__CODE_BLOCK_{_CHINESE_NUMBERS[match.group(1)]}__'
+
+# 6. 多重底線：____CODE_BLOCK_n____ -> __CODE_BLOCK_n__
+# （中文數字的多重底線在第 5 步之後已不可能出現，不需再處理）
+_RESTORE_MULTI_UNDERSCORE_RE = re.compile(r'_{3,}CODE_BLOCK_(\d+)_{3,}')
+
+# 第6階段：最終的 Markdown 格式清理（粗體、底線粗體、斜體、底線斜體中的多餘空格）
+_RESTORE_SPACING = _compile_stage([
+    (r'\*\*\s+(.+?)\s+\*\*', r'**\1**'),
+    (r'\*\*\s+(.+?)\*\*', r'**\1**'),
+    (r'\*\*(.+?)\s+\*\*', r'**\1**'),
+    (r'__\s+(.+?)\s+__', r'__\1__'),
+    (r'__\s+(.+?)__', r'__\1__'),
+    (r'__(.+?)\s+__', r'__\1__'),
+    (r'(?<!\*)\*\s+(.+?)\s+\*(?!\*)', r'*\1*'),
+    (r'(?<!\*)\*\s+(.+?)\*(?!\*)', r'*\1*'),
+    (r'(?<!\*)\*(.+?)\s+\*(?!\*)', r'*\1*'),
+    (r'(?<!_)_\s+(.+?)\s+_(?!_)', r'_\1_'),
+    (r'(?<!_)_\s+(.+?)_(?!_)', r'_\1_'),
+    (r'(?<!_)_(.+?)\s+_(?!_)', r'_\1_'),
+])
+
+_PROTECTION_SYMBOLS = ('❤', '♥', '♦', '♣', '♠')
+
 def protect_markdown_symbols(text):
     """
     保護 Markdown 格式符號，避免翻譯時被破墮
@@ -13,20 +226,21 @@ def protect_markdown_symbols(text):
     """
     protected_text = text
     
-    # 第1步：保護代碼塊佔位符（最高優先級）
-    protected_text = re.sub(r'__CODE_BLOCK_(\d+)__', r'❤CODE_BLOCK_\1❤', protected_text)
-    protected_text = re.sub(r'__TRANSLATE_PLACEHOLDER_(\d+)__', r'❤TRANSLATE_PLACEHOLDER_\1❤', protected_text)
+    # 每一步都先用字串檢查跳過不可能命中的規則
+    if '__' in protected_text:
+        protected_text = _PROTECT_CODE_BLOCK_RE.sub(r'❤CODE_BLOCK_\1❤', protected_text)
+        protected_text = _PROTECT_PLACEHOLDER_RE.sub(r'❤TRANSLATE_PLACEHOLDER_\1❤', protected_text)
     
-    # 第2步：保護粗體格式 **text**
-    protected_text = re.sub(r'\*\*(.+?)\*\*', r'♥BOLD_START♥\1♥BOLD_END♥', protected_text)
+    if '*' in protected_text:
+        protected_text = _PROTECT_BOLD_RE.sub(r'♥BOLD_START♥\1♥BOLD_END♥', protected_text)
     
-    # 第3步：保護底線粗體 __text__（避免與代碼塊佔位符衝突）
-    protected_text = re.sub(r'(?<!\w)__(.+?)__(?!\w)', r'♦UNDER_BOLD_START♦\1♦UNDER_BOLD_END♦', protected_text)
+    if '__' in protected_text:
+        protected_text = _PROTECT_UNDER_BOLD_RE.sub(r'♦UNDER_BOLD_START♦\1♦UNDER_BOLD_END♦', protected_text)
     
-    # 第4步：保護斜體格式 *text* 和 _text_
-    # 更精確的斜體匹配，避免與已處理的粗體衝突
-    protected_text = re.sub(r'(?<!♥)(?<!\*)\*([^*♥\s][^*♥]*?[^*♥\s])\*(?!\*)(?!♥)', r'♣ITALIC_START♣\1♣ITALIC_END♣', protected_text)
-    protected_text = re.sub(r'(?<!♦)(?<!♠)(?<!\w)_([^_♦♠\s][^_♦♠]*?[^_♦♠\s])_(?!\w)(?!♦)(?!♠)', r'♠UNDER_ITALIC_START♠\1♠UNDER_ITALIC_END♠', protected_text)
+    if '*' in protected_text:
+        protected_text = _PROTECT_ITALIC_RE.sub(r'♣ITALIC_START♣\1♣ITALIC_END♣', protected_text)
+    if '_' in protected_text:
+        protected_text = _PROTECT_UNDER_ITALIC_RE.sub(r'♠UNDER_ITALIC_START♠\1♠UNDER_ITALIC_END♠', protected_text)
     
     return protected_text
 
@@ -37,133 +251,44 @@ def restore_markdown_symbols(text):
     """
     restored_text = text
     
-    # 第1階段：嘗試恢復完整的符號組合
-    # 恢復代碼塊佔位符（最高優先級）
-    restored_text = re.sub(r'❤CODE_BLOCK_(\d+)❤', r'__CODE_BLOCK_\1__', restored_text)
-    restored_text = re.sub(r'❤TRANSLATE_PLACEHOLDER_(\d+)❤', r'__TRANSLATE_PLACEHOLDER_\1__', restored_text)
-    
-    # 恢復粗體格式
-    restored_text = re.sub(r'♥BOLD_START♥(.+?)♥BOLD_END♥', r'**\1**', restored_text)
-    
-    # 恢復底線粗體
-    restored_text = re.sub(r'♦UNDER_BOLD_START♦(.+?)♦UNDER_BOLD_END♦', r'__\1__', restored_text)
-    
-    # 恢復斜體格式
-    restored_text = re.sub(r'♣ITALIC_START♣(.+?)♣ITALIC_END♣', r'*\1*', restored_text)
-    restored_text = re.sub(r'♠UNDER_ITALIC_START♠(.+?)♠UNDER_ITALIC_END♠', r'_\1_', restored_text)
-    
-    # 第2階段：修復被空格分離的符號
-    # 修復被空格分離的粗體符號（包括插入底線的情況）
-    restored_text = re.sub(r'♥\s*BOLD\s*_?\s*START\s*♥', '**', restored_text)
-    restored_text = re.sub(r'♥\s*BOLD\s*_?\s*END\s*♥', '**', restored_text)
-    
-    # 修復被空格分離的底線粗體符號
-    restored_text = re.sub(r'♦\s+UNDER\s*_?\s*BOLD\s*_?\s*START\s+♦', '__', restored_text)
-    restored_text = re.sub(r'♦\s+UNDER\s*_?\s*BOLD\s*_?\s*END\s+♦', '__', restored_text)
-    
-    # 修復被空格分離的斜體符號
-    restored_text = re.sub(r'♣\s+ITALIC\s*_?\s*START\s+♣', '*', restored_text)
-    restored_text = re.sub(r'♣\s+ITALIC\s*_?\s*END\s+♣', '*', restored_text)
-    
-    # 修復被空格分離的底線斜體符號
-    restored_text = re.sub(r'♠\s+UNDER\s*_?\s*ITALIC\s*_?\s*START\s+♠', '_', restored_text)
-    restored_text = re.sub(r'♠\s+UNDER\s*_?\s*ITALIC\s*_?\s*END\s+♠', '_', restored_text)
-    
-    # 修復被空格分離的代碼塊符號（包括各種破壞情況）
-    restored_text = re.sub(r'❤\s*CODE\s*_?\s*BLOCK\s*_?\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__', restored_text)
-    restored_text = re.sub(r'❤\s*CODE\s+BLOCK\s*_?\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__', restored_text)
-    restored_text = re.sub(r'❤\s*TRANSLATE\s*_?\s*PLACEHOLDER\s*_?\s*(\d+)\s*❤', r'__TRANSLATE_PLACEHOLDER_\1__', restored_text)
-    
-    # 第3階段：修復被部分破壞的符號（字母被分離）
-    # 修復 "B OLD" -> "BOLD" 等情況
-    restored_text = re.sub(r'♥\s*B\s+OLD\s*_?\s*START\s*♥', '**', restored_text)
-    restored_text = re.sub(r'♥\s*B\s+OLD\s*_?\s*END\s*♥', '**', restored_text)
-    
-    # 修復 "C ODE" -> "CODE" 等情況
-    restored_text = re.sub(r'❤\s*C\s+ODE\s*_?\s*BLOCK\s*_?\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__', restored_text)
-    
-    # 修復 "I TALIC" -> "ITALIC" 等情況
-    restored_text = re.sub(r'♣\s*I\s+TALIC\s*_?\s*START\s*♣', '*', restored_text)
-    restored_text = re.sub(r'♣\s*I\s+TALIC\s*_?\s*END\s*♣', '*', restored_text)
-    
-    # 第4階段：清理普通的Markdown格式破壞
-    # 修復被分離的星號
-    restored_text = re.sub(r'\*\s+\*', '**', restored_text)
-    # 修復被分離的底線
-    restored_text = re.sub(r'_\s+_', '__', restored_text)
-    # 修復被分離的代碼塊標記
-    restored_text = re.sub(r'_\s+_\s*CODE\s*_\s*BLOCK\s*_\s*(\d+)\s*_\s+_', r'__CODE_BLOCK_\1__', restored_text)
+    # 第1～4階段：完整符號、空格分離、字母分離、普通格式破壞
+    restored_text = _apply_stage(restored_text, _RESTORE_EXACT)
+    restored_text = _apply_stage(restored_text, _RESTORE_SPACED)
+    restored_text = _apply_stage(restored_text, _RESTORE_SPLIT_LETTERS)
+    restored_text = _apply_stage(restored_text, _RESTORE_SEPARATED)
     
     # 第5階段：特殊的中文數字轉換和代碼塊修復
-    # 先創建中文數字對應表
-    chinese_numbers = {
-        '一': '1', '二': '2', '三': '3', '四': '4', '五': '5',
-        '六': '6', '七': '7', '八': '8', '九': '9', '十': '10',
-        '十一': '11', '十二': '12'
-    }
-    
-    # 處理各種被破壞的代碼塊格式
-    # 1. 處理中文數字的代碼塊：❤CODE BLOCK_二 ❤ -> __CODE_BLOCK_2__
-    for chinese, arabic in chinese_numbers.items():
-        restored_text = re.sub(f'❤\s*CODE\s+BLOCK\s*_?\s*{chinese}\s*❤', f'__CODE_BLOCK_{arabic}__', restored_text)
-        restored_text = re.sub(f'❤\s*CODE\s*_?\s*BLOCK\s*_?\s*{chinese}\s*❤', f'__CODE_BLOCK_{arabic}__', restored_text)
-    
-    # 2. 處理被破壞的特殊格式：❤CODE _BLOCK_四 ❤
-    for chinese, arabic in chinese_numbers.items():
-        restored_text = re.sub(f'❤\s*CODE\s+_\s*BLOCK\s*_?\s*{chinese}\s*❤', f'__CODE_BLOCK_{arabic}__', restored_text)
-        restored_text = re.sub(f'❤\s*CODE\s*_\s*BLOCK\s*_?\s*{chinese}\s*❤', f'__CODE_BLOCK_{arabic}__', restored_text)
-    
-    # 3. 處理其他破墮格式
-    restored_text = re.sub(r'❤\s*CODE\s*BLOCK\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__', restored_text)
-    restored_text = re.sub(r'❤\s*CODE\s+BLOCK\s*(\d+)\s*❤', r'__CODE_BLOCK_\1__', restored_text)
-    
-    # 4. 處理不完整的代碼塊格式：CODE_BLOCK_n -> __CODE_BLOCK_n__
-    restored_text = re.sub(r'CODE_BLOCK_(\d+)', r'__CODE_BLOCK_\1__', restored_text)
-    
-    # 5. 處理中文數字的不完整格式：CODE_BLOCK_中文數字 -> __CODE_BLOCK_n__
-    for chinese, arabic in chinese_numbers.items():
-        restored_text = re.sub(f'CODE_BLOCK_{chinese}', f'__CODE_BLOCK_{arabic}__', restored_text)
-    
-    # 6. 處理多重底線的情況：____CODE_BLOCK_n____ -> __CODE_BLOCK_n__
-    restored_text = re.sub(r'_{3,}CODE_BLOCK_(\d+)_{3,}', r'__CODE_BLOCK_\1__', restored_text)
-    
-    # 7. 處理中文數字的多重底線情況
-    for chinese, arabic in chinese_numbers.items():
-        restored_text = re.sub(f'_{3,}CODE_BLOCK_{chinese}_{3,}', f'__CODE_BLOCK_{arabic}__', restored_text)
+    restored_text = _apply_stage(restored_text, _RESTORE_CHINESE_CODE_BLOCK)
+    restored_text = _apply_stage(restored_text, _RESTORE_DIGIT_CODE_BLOCK)
+    if 'CODE_BLOCK_' in restored_text:
+        restored_text = _RESTORE_CHINESE_BARE_RE.sub(_replace_chinese_bare, restored_text)
+        restored_text = _RESTORE_MULTI_UNDERSCORE_RE.sub(r'__CODE_BLOCK_\1__', restored_text)
     
     # 最後的清理，移除任何殘留的保護符號
-    unicode_symbols = ['❤', '♥', '♦', '♣', '♠']
-    for symbol in unicode_symbols:
+    for symbol in _PROTECTION_SYMBOLS:
         if symbol in restored_text:
             # 記錄警告但不中斷處理
             print(f"⚠️  警告：發現未處理的保護符號 {symbol}")
     
     # 第6階段：最終的 Markdown 格式清理
-    # 修復粗體格式中的多餘空格（包括不對稱空格）
-    # 1. 兩邊都有空格：** 文字 ** -> **文字**
-    restored_text = re.sub(r'\*\*\s+(.+?)\s+\*\*', r'**\1**', restored_text)
-    # 2. 左邊有空格：** 文字** -> **文字**
-    restored_text = re.sub(r'\*\*\s+(.+?)\*\*', r'**\1**', restored_text)
-    # 3. 右邊有空格：**文字 ** -> **文字**
-    restored_text = re.sub(r'\*\*(.+?)\s+\*\*', r'**\1**', restored_text)
-    
-    # 修復底線粗體格式中的多餘空格（包括不對稱空格）
-    restored_text = re.sub(r'__\s+(.+?)\s+__', r'__\1__', restored_text)
-    restored_text = re.sub(r'__\s+(.+?)__', r'__\1__', restored_text)
-    restored_text = re.sub(r'__(.+?)\s+__', r'__\1__', restored_text)
-    
-    # 修復斜體格式中的多餘空格（但不包括粗體 **）
-    restored_text = re.sub(r'(?<!\*)\*\s+(.+?)\s+\*(?!\*)', r'*\1*', restored_text)
-    restored_text = re.sub(r'(?<!\*)\*\s+(.+?)\*(?!\*)', r'*\1*', restored_text)
-    restored_text = re.sub(r'(?<!\*)\*(.+?)\s+\*(?!\*)', r'*\1*', restored_text)
-    
-    # 修復底線斜體格式中的多餘空格（但不包括底線粗體 __）
-    restored_text = re.sub(r'(?<!_)_\s+(.+?)\s+_(?!_)', r'_\1_', restored_text)
-    restored_text = re.sub(r'(?<!_)_\s+(.+?)_(?!_)', r'_\1_', restored_text)
-    restored_text = re.sub(r'(?<!_)_(.+?)\s+_(?!_)', r'_\1_', restored_text)
+    restored_text = _apply_stage(restored_text, _RESTORE_SPACING)
     
     return restored_text
 
+# --- extract_text_segments 使用的 pattern ---
+_CODE_FENCE_RE = re.compile(r'```[\s\S]*?```')
+_INLINE_CODE_RE = re.compile(r'`[^`\n]+`')
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+)$', re.MULTILINE)
+_UNORDERED_ITEM_RE = re.compile(r'^(\s*[-*+•]\s+)(.+)$', re.MULTILINE)
+_ORDERED_ITEM_RE = re.compile(r'^(\s*\d+\.\s+)(.+)$', re.MULTILINE)
+_QUOTE_RE = re.compile(r'^(>\s*)(.+)$', re.MULTILINE)
+_UNORDERED_PREFIX_RE = re.compile(r'^\s*[-*+•]\s+')
+_ORDERED_PREFIX_RE = re.compile(r'^\s*\d+\.\s+')
+_RULE_LINE_RE = re.compile(r'^[-=]+$')
+_BLANK_LINE_RE = re.compile(r'^\s*$')
+_SYMBOLS_ONLY_RE = re.compile(r'^[\s\*\-\+=|>]*$')
+_SKIP_PREFIXES = ('__TRANSLATE_PLACEHOLDER_', '__CODE_BLOCK_')
+
 def extract_text_segments(markdown_text):
     """
     從 Markdown 文本中提取需要翻譯的文字段落，完整保留格式結構和換行
@@ -187,9 +312,9 @@ def extract_text_segments(markdown_text):
         return placeholder
     
     # 保護代碼塊（三個反引號）
-    result = re.sub(r'```[\s\S]*?```', preserve_code_blocks, result)
+    result = _CODE_FENCE_RE.sub(preserve_code_blocks, result)
     # 保護內嵌代碼（單個反引號）
-    result = re.sub(r'`[^`\n]+`', preserve_code_blocks, result)
+    result = _INLINE_CODE_RE.sub(preserve_code_blocks, result)
     
     # 處理標題
     def replace_heading(match):
@@ -204,14 +329,14 @@ def extract_text_segments(markdown_text):
         return match.group(0)
     
     # 處理標題 (# ## ###)
-    result = re.sub(r'^(#{1,6})\s+(.+)$', replace_heading, result, flags=re.MULTILINE)
+    result = _HEADING_RE.sub(replace_heading, result)
     
     # 處理列表項目
     def replace_list_item(match):
         nonlocal placeholder_counter
         list_marker = match.group(1)  # - * + • 或 1. 2. 等
         list_text = match.group(2).strip()
-        if list_text and not list_text.startswith(('__TRANSLATE_PLACEHOLDER_', '__CODE_BLOCK_')):
+        if list_text and not list_text.startswith(_SKIP_PREFIXES):
             placeholder = f"__TRANSLATE_PLACEHOLDER_{placeholder_counter}__"
             segments.append(list_text)
             placeholder_counter += 1
@@ -219,16 +344,16 @@ def extract_text_segments(markdown_text):
         return match.group(0)
     
     # 處理無序列表 (支持 -, *, +, • 等符號)
-    result = re.sub(r'^(\s*[-*+•]\s+)(.+)$', replace_list_item, result, flags=re.MULTILINE)
+    result = _UNORDERED_ITEM_RE.sub(replace_list_item, result)
     # 處理有序列表
-    result = re.sub(r'^(\s*\d+\.\s+)(.+)$', replace_list_item, result, flags=re.MULTILINE)
+    result = _ORDERED_ITEM_RE.sub(replace_list_item, result)
     
     # 處理引用文字
     def replace_quote(match):
         nonlocal placeholder_counter
         quote_marker = match.group(1)  # >
         quote_text = match.group(2).strip()
-        if quote_text and not quote_text.startswith(('__TRANSLATE_PLACEHOLDER_', '__CODE_BLOCK_')):
+        if quote_text and not quote_text.startswith(_SKIP_PREFIXES):
             placeholder = f"__TRANSLATE_PLACEHOLDER_{placeholder_counter}__"
             segments.append(quote_text)
             placeholder_counter += 1
@@ -236,7 +361,7 @@ def extract_text_segments(markdown_text):
         return match.group(0)
     
     # 處理引用塊
-    result = re.sub(r'^(>\s*)(.+)$', replace_quote, result, flags=re.MULTILINE)
+    result = _QUOTE_RE.sub(replace_quote, result)
     
     # 處理一般段落文字（不在以上格式中的文字）
     # 使用按行處理方式，完整保留原始的換行和空行
@@ -247,23 +372,23 @@ def extract_text_segments(markdown_text):
         line = original_line.strip()
         
         # 完整保留空行和已處理的行
-        if not line or line.startswith(('__TRANSLATE_PLACEHOLDER_', '__CODE_BLOCK_')):
+        if not line or line.startswith(_SKIP_PREFIXES):
             processed_lines.append(original_line)  # 保留原始行，包括空行
             continue
             
         # 跳過已處理的標題、列表、引用、表格等
         if (line.startswith('#') or 
-            re.match(r'^\s*[-*+•]\s+', line) or  # 支持更多列表符號
-            re.match(r'^\s*\d+\.\s+', line) or 
+            _UNORDERED_PREFIX_RE.match(line) or  # 支持更多列表符號
+            _ORDERED_PREFIX_RE.match(line) or 
             line.startswith('>') or 
             line.startswith('|') or
-            re.match(r'^[-=]+$', line) or  # 標題底線
-            re.match(r'^\s*$', line)):  # 空行
+            _RULE_LINE_RE.match(line) or  # 標題底線
+            _BLANK_LINE_RE.match(line)):  # 空行
             processed_lines.append(original_line)  # 保留原始行
             continue
         
         # 處理一般段落文字
-        if line and not re.match(r'^[\s\*\-\+=|>]*$', line):  # 不是只有格式符號的行
+        if line and not _SYMBOLS_ONLY_RE.match(line):  # 不是只有格式符號的行
             placeholder = f"__TRANSLATE_PLACEHOLDER_{placeholder_counter}__"
             segments.append(line)  # 儲存去除空格的文字內容
             placeholder_counter += 1
@@ -292,18 +417,123 @@ def reconstruct_markdown(template, translated_segments):
         result = result.replace(placeholder, translated_text.strip())
     return result
 
-def hakka_translate(text, index):
+def _translate_segment(client, segment, i, total):
     """
-    翻譯 Markdown 文檔，保留格式結構
+    翻譯單一段落，任何錯誤都退回原文
+
+    Returns:
+        翻譯後（已恢復 Markdown 符號）的文字，失敗時為原文
     """
-    # Validate environment variables
-    url = os.getenv("HAKKA_TRANS_URL_BASE")
-    transUrl = os.getenv("HAKKA_TRANS_URL_TRANS")
-    username = os.getenv("HAKKA_TRANS_USERNAME")
-    password = os.getenv("HAKKA_TRANS_PASSWORD")
+    try:
+        print(f"\n🔄 翻譯段落 {i+1}/{total}: '{segment[:50]}{'...' if len(segment) > 50 else ''}' ")
+        
+        # 在翻譯前保護 Markdown 格式符號
+        protected_segment = protect_markdown_symbols(segment)
+        print(f"🛡️  保護後: '{protected_segment[:50]}{'...' if len(protected_segment) > 50 else ''}'")
+        
+        # 先查詢翻譯記憶，命中則不再呼叫翻譯服務
+        remembered = translation_memory.get(protected_segment)
+        if remembered is not None:
+            print(f"💾 翻譯記憶命中: '{remembered[:50]}{'...' if len(remembered) > 50 else ''}'")
+            return remembered
+        
+        response = client.translate(protected_segment)
+        response.raise_for_status()
+        
+        translation_result = response.json()
+        print(f"📥 原始翻譯 API 響應: {translation_result}")
+        
+        # 嘗試從不同字段中提取翻譯結果
+        translated_text = None
+        
+        if 'output' in translation_result:
+            translated_text = translation_result['output']
+            print(f"✅ 從 'output' 字段提取: '{translated_text}'")
+        elif 'result' in translation_result:
+            translated_text = translation_result['result']
+            print(f"✅ 從 'result' 字段提取: '{translated_text}'")
+        elif 'translation' in translation_result:
+            translated_text = translation_result['translation']
+            print(f"✅ 從 'translation' 字段提取: '{translated_text}'")
+        else:
+            # 嘗試直接使用返回的字符串
+            translated_text = str(translation_result).strip('"\'')
+            print(f"⚠️  使用字符串轉換: '{translated_text}'")
+        
+        # 檢查翻譯結果是否為空或無效
+        if not translated_text or translated_text.strip() == "" or translated_text.strip() == "null" or translated_text.strip() == "None":
+            print(f"❌ 翻譯結果為空或無效 ('{translated_text}')！保留原文: '{segment}'")
+            metrics.translation_fallbacks.inc(reason="empty")
+            translated_text = segment
+        elif len(translated_text.strip()) < 3:  # 翻譯結果太短，可能是錯誤
+            print(f"⚠️  翻譯結果太短 ('{translated_text}')，可能有誤！保留原文: '{segment}'")
+            metrics.translation_fallbacks.inc(reason="too_short")
+            translated_text = segment
+        elif translated_text.strip() == segment.strip():
+            print(f"⚠️  翻譯結果與原文相同，可能翻譯失敗")
+            metrics.translation_fallbacks.inc(reason="unchanged")
+            # 即使翻譯失敗，也要恢復格式符號
+            translated_text = restore_markdown_symbols(translated_text)
+        else:
+            print(f"✅ 翻譯成功: '{segment[:30]}...' → '{translated_text[:30]}...'")
+            # 恢復 Markdown 格式符號
+            translated_text = restore_markdown_symbols(translated_text)
+            print(f"🔧 恢復格式後: '{translated_text[:50]}{'...' if len(translated_text) > 50 else ''}'")
+            # 只記錄成功的翻譯，退回原文的結果下次仍會重試
+            translation_memory.put(protected_segment, translated_text)
+        
+        return translated_text
+        
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 網絡請求失敗 - 段落 {i}: {e}")
+        print(f"   保留原文: '{segment}'")
+        metrics.translation_fallbacks.inc(reason="request_error")
+        return segment
+    except json.JSONDecodeError as e:
+        print(f"❌ JSON 解析失敗 - 段落 {i}: {e}")
+        print(f"   保留原文: '{segment}'")
+        metrics.translation_fallbacks.inc(reason="invalid_json")
+        return segment
+    except Exception as e:
+        print(f"❌ 未知錯誤 - 段落 {i}: {type(e).__name__}: {e}")
+        print(f"   保留原文: '{segment}'")
+        metrics.translation_fallbacks.inc(reason="error")
+        return segment
 
-    if not url or not transUrl or not username or not password:
-        raise ValueError("Missing one or more required environment variables: HAKKA_TRANS_URL_BASE, HAKKA_TRANS_URL_TRANS, HAKKA_TRANS_USERNAME, HAKKA_TRANS_PASSWORD")
+# 所有翻譯共用的段落執行緒池：不論同時有幾個翻譯工作，送往翻譯服務的段落數合計
+# 不超過 TRANSLATE_MAX_CONCURRENCY，也不必每次請求重新建立執行緒
+_translate_segment_executor = ThreadPoolExecutor(
+    max_workers=max(1, TRANSLATE_MAX_CONCURRENCY), thread_name_prefix="hakka-trans"
+)
+
+def _map_segments(func, items, limit):
+    """
+    在共用的段落執行緒池中對每個項目執行 func，同一次翻譯最多同時提交 limit 個
+
+    Returns:
+        依輸入順序排列的結果
+    """
+    futures = []
+    running = set()
+    for item in items:
+        if len(running) >= limit:
+            _, running = wait(running, return_when=FIRST_COMPLETED)
+        future = _translate_segment_executor.submit(func, item)
+        futures.append(future)
+        running.add(future)
+    return [future.result() for future in futures]
+
+def hakka_translate(text, index, max_concurrency=None):
+    """
+    翻譯 Markdown 文檔，保留格式結構
+
+    Args:
+        text: Markdown 原文
+        index: 此次翻譯的識別碼（只用於記錄）
+        max_concurrency: 此次翻譯同時占用的段落執行緒數上限，預設讀取 HAKKA_TRANS_MAX_CONCURRENCY
+            （所有翻譯合計仍不超過共用段落執行緒池的大小）
+    """
+    client = get_translate_client()
 
     try:
         # 1. 提取需要翻譯的文字段落
@@ -322,103 +552,27 @@ def hakka_translate(text, index):
         for i, segment in enumerate(segments_to_translate):
             print(f"  Segment {i}: {segment[:50]}...")
         
-        # Authenticate and get token
-        payload = json.dumps({
-            "username": username,
-            "password": password,
-            "rememberMe": 0
-        })
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("POST", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
-        token = response.json().get('token')
-        if not token:
-            raise ValueError("Authentication failed: No token received")
-        print(f"Authentication successful, token: {token[:20]}...")
-
-        # 2. 逐段翻譯文字內容
-        translated_segments = []
-        translation_headers = {
-            'Authorization': 'Bearer ' + token,
-            'Content-Type': 'application/json'
-        }
-        
-        for i, segment in enumerate(segments_to_translate):
-            try:
-                print(f"\n🔄 翻譯段落 {i+1}/{len(segments_to_translate)}: '{segment[:50]}{'...' if len(segment) > 50 else ''}' ")
-                
-                # 在翻譯前保護 Markdown 格式符號
-                protected_segment = protect_markdown_symbols(segment)
-                print(f"🛡️  保護後: '{protected_segment[:50]}{'...' if len(protected_segment) > 50 else ''}'")
-                
-                payload = json.dumps({
-                    "input": protected_segment
-                })
-                response = requests.request("POST", transUrl, headers=translation_headers, data=payload, verify=False)
-                response.raise_for_status()
-                
-                translation_result = response.json()
-                print(f"📥 原始翻譯 API 響應: {translation_result}")
-                
-                # 嘗試從不同字段中提取翻譯結果
-                translated_text = None
-                
-                if 'output' in translation_result:
-                    translated_text = translation_result['output']
-                    print(f"✅ 從 'output' 字段提取: '{translated_text}'")
-                elif 'result' in translation_result:
-                    translated_text = translation_result['result']
-                    print(f"✅ 從 'result' 字段提取: '{translated_text}'")
-                elif 'translation' in translation_result:
-                    translated_text = translation_result['translation']
-                    print(f"✅ 從 'translation' 字段提取: '{translated_text}'")
-                else:
-                    # 嘗試直接使用返回的字符串
-                    translated_text = str(translation_result).strip('"\'')
-                    print(f"⚠️  使用字符串轉換: '{translated_text}'")
-                
-                # 檢查翻譯結果是否為空或無效
-                if not translated_text or translated_text.strip() == "" or translated_text.strip() == "null" or translated_text.strip() == "None":
-                    print(f"❌ 翻譯結果為空或無效 ('{translated_text}')！保留原文: '{segment}'")
-                    translated_text = segment
-                elif len(translated_text.strip()) < 3:  # 翻譯結果太短，可能是錯誤
-                    print(f"⚠️  翻譯結果太短 ('{translated_text}')，可能有誤！保留原文: '{segment}'")
-                    translated_text = segment
-                elif translated_text.strip() == segment.strip():
-                    print(f"⚠️  翻譯結果與原文相同，可能翻譯失敗")
-                    # 即使翻譯失敗，也要恢復格式符號
-                    translated_text = restore_markdown_symbols(translated_text)
-                else:
-                    print(f"✅ 翻譯成功: '{segment[:30]}...' → '{translated_text[:30]}...'")
-                    # 恢復 Markdown 格式符號
-                    translated_text = restore_markdown_symbols(translated_text)
-                    print(f"🔧 恢復格式後: '{translated_text[:50]}{'...' if len(translated_text) > 50 else ''}'")
-                
-                translated_segments.append(translated_text)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"❌ 網絡請求失敗 - 段落 {i}: {e}")
-                print(f"   保留原文: '{segment}'")
-                translated_segments.append(segment)
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON 解析失敗 - 段落 {i}: {e}")
-                print(f"   保留原文: '{segment}'")
-                translated_segments.append(segment)
-            except Exception as e:
-                print(f"❌ 未知錯誤 - 段落 {i}: {type(e).__name__}: {e}")
-                print(f"   保留原文: '{segment}'")
-                translated_segments.append(segment)
+        # 取得（或重用快取的）token，登入失敗時整體請求失敗
+        token = client.get_token()
+        print(f"Authentication ready, token: {token[:20]}...")
+
+        # 2. 並行翻譯各段落，依原順序重組；單段失敗時保留原文
+        if max_concurrency is None:
+            max_concurrency = TRANSLATE_MAX_CONCURRENCY
+        total = len(segments_to_translate)
+        workers = max(1, min(max_concurrency, total))
+        print(f"▶️ 並行翻譯 {total} 個段落 (並行上限: {workers})")
+
+        translated_segments = _map_segments(
+            request_profiler.bound(lambda item: _translate_segment(client, item[1], item[0], total)),
+            list(enumerate(segments_to_translate)),
+            workers
+        )
         
         # 3. 重新組合 Markdown 文檔
         final_translated_text = reconstruct_markdown(markdown_template, translated_segments)
         
-        # Save translation result for debugging
-        output_dir = 'temp_trans'
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 保存詳細的翻譯結果
+        # 詳細的翻譯結果隨回應返回，不寫入共用目錄（同一個 index 的並行工作會互相覆寫）
         detailed_result = {
             "success": True,
             "original_text": text,
@@ -427,12 +581,8 @@ def hakka_translate(text, index):
             "translated_segments": translated_segments,
             "markdown_template": markdown_template
         }
-        
-        output_path = os.path.join(output_dir, f'translation_{index}.json')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(detailed_result, f, ensure_ascii=False, indent=4)
-        
-        print(f"Translation completed successfully. Saved to {output_path}")
+
+        print(f"Translation completed successfully ({index})")
         
         # 返回翻譯結果（與前端期望格式匹配）
         return {
@@ -440,7 +590,8 @@ def hakka_translate(text, index):
             "translatedText": final_translated_text,  # 前端期望的字段名
             "output": final_translated_text,  # 保留向後兼容性
             "original_segments": segments_to_translate,
-            "translated_segments": translated_segments
+            "translated_segments": translated_segments,
+            "details": detailed_result,
         }
 
     except requests.exceptions.RequestException as e:
@@ -449,3 +600,23 @@ def hakka_translate(text, index):
         raise RuntimeError(f"Error: {e}")
     except Exception as e:
         raise RuntimeError(f"Unexpected error during translation: {e}")
+
+
+# 專用的翻譯執行緒池：阻塞的 HTTP 與檔案 I/O 在這裡執行，不占用事件迴圈，
+# 也不與 FastAPI 預設執行緒池（同步端點與靜態檔案）搶資源
+_translate_job_executor = ThreadPoolExecutor(max_workers=TRANSLATE_MAX_JOBS, thread_name_prefix="hakka-trans-job")
+
+def _run_translate_job(submitted, text, index, max_concurrency):
+    started = time.perf_counter()
+    metrics.queue_wait_seconds.observe(started - submitted, queue="translate_jobs")
+    request_profiler.record_span("queue_wait", "translate_jobs", submitted, started)
+    return hakka_translate(text, index, max_concurrency)
+
+async def hakka_translate_async(text, index, max_concurrency=None):
+    """在專用執行緒池中執行 hakka_translate，供 async 端點 await"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _translate_job_executor,
+        functools.partial(request_profiler.bound(_run_translate_job), time.perf_counter(), text, index, max_concurrency)
+    )
+
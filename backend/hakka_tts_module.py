@@ -1,82 +1,206 @@
 import requests
-from bs4 import BeautifulSoup
 import re
 import os
-from gtts import gTTS
-from pydub import AudioSegment
 import urllib.parse
+import threading
+import json
 from dotenv import load_dotenv # <-- 新增這一行
-from datetime import timedelta
+import metrics
+import upstream_client
+from segment_cache import segment_cache
 
 # 在應用程式啟動時載入環境變數
 load_dotenv() # <-- 新增這一行，通常放在應用程式的頂部
 
 # --- Helper Functions from hakka_news_reading-main ---
 
-# Note: This is a placeholder for the Hakka TTS module.
-# The credentials are not provided, so this part will fail gracefully.
-class tts:
-    def getToken(self, url, username, password):
-        login_headers = {"Content-Type": "application/json; charset=utf-8"}
-        login_account_data = {"username": username, "password": password}
-        response = requests.post(f"{url}/api/v1/login", headers=login_headers, json=login_account_data, verify=False)
-        response.raise_for_status()
-        return "Bearer " + response.json()['token']
-
-    def getTTSVideo(self, ttsUrl, token, scriptText):
-        headers = {'Content-Type': 'application/json', 'Authorization': token}
-        payload = {
-            "input": {"text": scriptText, "type": "common"},
-            "voice": {"languageCode": "hak-xi-TW", "name": "hak-xi-TW-vs2-F01"},
-            "audioConfig": {"speakingRate": 1}
+# 客語 TTS 的聲音設定，同時作為語音片段快取鍵的一部分
+HAKKA_LANGUAGE_CODE = "hak-xi-TW"
+HAKKA_VOICE_NAME = "hak-xi-TW-vs2-F01"
+HAKKA_SPEAKING_RATE = 1
+
+class _HakkaTTSProtocol:
+    """
+    客語 TTS 的請求內容與回應處理，同步與非同步客戶端共用，兩者只差在傳輸方式
+    （requests 或 aiohttp）；登入與合成失敗時一律拋出 ConnectionError，
+    上游忙碌（429、5xx）時拋出 OverloadedError 讓 AdaptiveLimiter 降低並行數
+    """
+
+    upstream = "hakka_tts"
+    operation = "synthesize"
+
+    def __init__(self, url, username, password, ttsUrl):
+        super().__init__(
+            token_ttl=int(os.getenv("HAKKA_TTS_TOKEN_TTL", "3000")),
+            pool_size=int(os.getenv("HAKKA_TTS_POOL_SIZE", "10")),
+            timeout=int(os.getenv("HAKKA_TTS_TIMEOUT", "60")),
+        )
+        self.url = url
+        self.username = username
+        self.password = password
+        self.ttsUrl = ttsUrl
+
+    def _login_request(self):
+        """返回 (網址, 請求參數)"""
+        return f"{self.url}/api/v1/login", {
+            "headers": {"Content-Type": "application/json; charset=utf-8"},
+            "json": {"username": self.username, "password": self.password},
         }
-        return requests.post(f"{ttsUrl}/api/v1/tts/synthesize", headers=headers, json=payload, verify=False)
 
-    def saveWaveFile(self, result, filename):
-        with open(filename, 'wb') as f:
-            f.write(result.content)
+    @staticmethod
+    def _read_token(status_code, content):
+        upstream_client.raise_for_overload(status_code)
+        if status_code != 200:
+            raise ConnectionError(f"Hakka TTS login failed with status {status_code}")
+        return json.loads(content)['token']
+
+    def _synthesize_request(self, scriptText):
+        """返回 (網址, 請求參數)"""
+        return f"{self.ttsUrl}/api/v1/tts/synthesize", {
+            "headers": {'Content-Type': 'application/json'},
+            "json": {
+                "input": {"text": scriptText, "type": "common"},
+                "voice": {"languageCode": HAKKA_LANGUAGE_CODE, "name": HAKKA_VOICE_NAME},
+                "audioConfig": {"speakingRate": HAKKA_SPEAKING_RATE}
+            },
+        }
 
-    def __init__(self, url, username, password, ttsUrl, filename, scriptText):
-        # This will likely fail because credentials are empty.
-        token = self.getToken(url, username, password)
-        result = self.getTTSVideo(ttsUrl, token, scriptText)
+    @staticmethod
+    def _save_audio(result, filename):
         if result.status_code == 200:
-            self.saveWaveFile(result, filename)
+            # 先寫入暫存檔再換名：目標檔可能是快取檔的硬連結，不能直接覆寫內容
+            tmp_filename = f"{filename}.tmp"
+            with open(tmp_filename, 'wb') as f:
+                f.write(result.content)
+            os.replace(tmp_filename, filename)
             print(f"🟢 客語 TTS 成功 ({filename})")
         else:
             print(f"❌ 客語 TTS 失敗 ({filename}): {result.status_code}")
+            upstream_client.raise_for_overload(result.status_code)
             raise ConnectionError(f"Hakka TTS failed with status {result.status_code}")
 
-def generate_hakka_wav(text, index):
-    # 從環境變數中讀取憑證
-    url = os.getenv("HAKKA_TTS_URL_BASE", "")
-    ttsUrl = os.getenv("HAKKA_TTS_URL_TTS", "")
-    username = os.getenv("HAKKA_TTS_USERNAME", "")
-    password = os.getenv("HAKKA_TTS_PASSWORD", "")
-    out_path = f"temp_audio/segment_{index}.wav"
-    
-    # 檢查憑證是否已設定
-    if not all([url, ttsUrl, username, password]):
-        print("警告：客語 TTS 憑證未設定，將跳過客語語音生成。")
-        raise ValueError("Hakka TTS credentials are not set.") # 拋出錯誤讓外層捕獲
 
-    tts(url, username, password, ttsUrl, out_path, text)
+# 客語 TTS 客戶端：長駐的連線池與 token 快取，所有片段共用同一次登入
+class HakkaTTSClient(_HakkaTTSProtocol, upstream_client.TokenSession):
 
+    def _login(self):
+        url, kwargs = self._login_request()
+        response = self.session.post(url, timeout=self.timeout, verify=self.verify, **kwargs)
+        return self._read_token(response.status_code, response.content)
 
-def generate_hakka_wav2(text, index):
-    # 從環境變數中讀取憑證
+    def getTTSVideo(self, scriptText):
+        url, kwargs = self._synthesize_request(scriptText)
+        return self.authorized_request("POST", url, **kwargs)
+
+    def synthesize_to_file(self, scriptText, filename):
+        self._save_audio(self.getTTSVideo(scriptText), filename)
+
+
+# 非同步版本：/api/audio 與 HLS 渲染直接在事件迴圈上呼叫，不佔用執行緒
+class AsyncHakkaTTSClient(_HakkaTTSProtocol, upstream_client.AsyncTokenSession):
+
+    async def _login(self):
+        url, kwargs = self._login_request()
+        response = await self.request("POST", url, **kwargs)
+        return self._read_token(response.status_code, response.content)
+
+    async def synthesize_to_file(self, scriptText, filename):
+        url, kwargs = self._synthesize_request(scriptText)
+        self._save_audio(await self.authorized_request("POST", url, **kwargs), filename)
+
+
+def _tts_credentials():
+    """從環境變數讀取 (url, username, password, ttsUrl)，憑證未設定時拋出 ValueError"""
     url = os.getenv("HAKKA_TTS_URL_BASE", "")
     ttsUrl = os.getenv("HAKKA_TTS_URL_TTS", "")
     username = os.getenv("HAKKA_TTS_USERNAME", "")
     password = os.getenv("HAKKA_TTS_PASSWORD", "")
-    out_path = f"tts_audio/{index}.wav"
-    
+
     # 檢查憑證是否已設定
     if not all([url, ttsUrl, username, password]):
         print("警告：客語 TTS 憑證未設定，將跳過客語語音生成。")
         raise ValueError("Hakka TTS credentials are not set.") # 拋出錯誤讓外層捕獲
+    return url, username, password, ttsUrl
+
+
+_tts_client = None
+_tts_client_lock = threading.Lock()
+
+def get_tts_client():
+    """取得全域共用的客語 TTS 客戶端，憑證未設定時拋出 ValueError"""
+    global _tts_client
+    if _tts_client is not None:
+        return _tts_client
+
+    credentials = _tts_credentials()
+    with _tts_client_lock:
+        if _tts_client is None:
+            _tts_client = HakkaTTSClient(*credentials)
+    return _tts_client
+
+
+_async_tts_client = None
+
+def get_async_tts_client():
+    """取得全域共用的非同步客語 TTS 客戶端，憑證未設定時拋出 ValueError"""
+    global _async_tts_client
+    if _async_tts_client is None:
+        _async_tts_client = AsyncHakkaTTSClient(*_tts_credentials())
+    return _async_tts_client
+
+async def close_async_tts_client():
+    if _async_tts_client is not None:
+        await _async_tts_client.close()
+
+# 客語 TTS 的自適應並行上限，取代固定的並行數
+hakka_tts_limiter = upstream_client.AdaptiveLimiter(
+    "hakka_tts",
+    initial=int(os.getenv("HAKKA_TTS_INITIAL_CONCURRENCY", "3")),
+    min_limit=int(os.getenv("HAKKA_TTS_MIN_CONCURRENCY", "1")),
+    max_limit=int(os.getenv("HAKKA_TTS_MAX_CONCURRENCY", "12")),
+    latency_target=float(os.getenv("HAKKA_TTS_LATENCY_TARGET", "10")),
+)
+
+def synthesize_cached(text, out_path):
+    """先查詢語音片段快取，未命中才呼叫客語 TTS 並將結果存入快取"""
+    key = segment_cache.make_key(text, "hakka", HAKKA_VOICE_NAME, HAKKA_SPEAKING_RATE)
+    if segment_cache.fetch(key, out_path):
+        print(f"💾 客語 TTS 快取命中 ({out_path})")
+        return
+    get_tts_client().synthesize_to_file(text, out_path)
+    segment_cache.store(key, out_path)
+
+async def synthesize_cached_async(text, out_path):
+    """synthesize_cached 的非同步版本，只有實際呼叫上游時才占用並行名額"""
+    key = segment_cache.make_key(text, "hakka", HAKKA_VOICE_NAME, HAKKA_SPEAKING_RATE)
+    if segment_cache.fetch(key, out_path):
+        print(f"💾 客語 TTS 快取命中 ({out_path})")
+        return
+    client = get_async_tts_client()
+    try:
+        async with hakka_tts_limiter.slot():
+            await client.synthesize_to_file(text, out_path)
+    except Exception:
+        metrics.tts_failures.inc(engine="hakka")
+        raise
+    segment_cache.store(key, out_path)
+
+def generate_hakka_wav(text, index, out_path=None):
+    if out_path is None:
+        out_path = f"temp_audio/segment_{index}.wav"
+    synthesize_cached(text, out_path)
+
+
+async def generate_hakka_wav_async(text, index, out_path=None):
+    """generate_hakka_wav 的非同步版本（/api/audio 與 HLS 渲染使用）"""
+    if out_path is None:
+        out_path = f"temp_audio/segment_{index}.wav"
+    await synthesize_cached_async(text, out_path)
+
 
-    tts(url, username, password, ttsUrl, out_path, text)
+def generate_hakka_wav2(text, index):
+    out_path = f"tts_audio/{index}.wav"
+    synthesize_cached(text, out_path)
 
 
 def clear_folder(folder_path):
@@ -86,25 +210,28 @@ def clear_folder(folder_path):
             if os.path.isfile(file_path):
                 os.remove(file_path)
 
+# split_smart_segments 的字元分類表：英文字母 → 'E'，標點與數字 → 'P'，其他字元保持原樣（視為客語）。
+# 字母 E、P 本身也會被映射為 'E'，因此轉換後只有 'E'、'P' 兩個值具有分類意義。
+_ENGLISH_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ"
+_PUNCTUATION_CHARS = " ，。'\",()0123456789:!?.（）、&「」"
+_SEGMENT_CLASS_TABLE = str.maketrans({
+    **{c: 'P' for c in _PUNCTUATION_CHARS},
+    **{c: 'E' for c in _ENGLISH_CHARS},
+})
+# 標點跟隨前一段；英文段以英文字母開頭，其餘（含開頭的標點）為客語段
+_SEGMENT_RUN_RE = re.compile(r'E[EP]*|[^E]+')
+
 def split_smart_segments(text):
-    def is_english_char(c): return c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ"
-    def is_punctuation(c): return c in " ，。'\",()0123456789:!?.（）、&「」"
-    segments = []
-    if not text: return segments
-    current = text[0]
-    is_eng = is_english_char(current)
-    for c in text[1:]:
-        if is_punctuation(c) or is_english_char(c) == is_eng:
-            current += c
-        else:
-            segments.append(current)
-            current = c
-            is_eng = is_english_char(c)
-    segments.append(current)
+    """依英文／非英文切分文字，標點與數字併入目前的片段"""
+    classes = text.translate(_SEGMENT_CLASS_TABLE)
+    segments = [text[m.start():m.end()] for m in _SEGMENT_RUN_RE.finditer(classes)]
     return [seg for seg in segments if seg.strip()]
 
-def to_srt_time(ms):
-    t = timedelta(milliseconds=ms)
-    return str(t)[:-3].replace('.', ',').rjust(12, '0')
+def to_srt_time(ms, separator=','):
+    """毫秒轉為 SRT 時間格式 HH:MM:SS,mmm（WebVTT 以 '.' 分隔毫秒）"""
+    seconds, millis = divmod(int(round(ms)), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{millis:03d}"
 
 # --- API Endpoints ---
\ No newline at end of file
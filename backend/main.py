@@ -1,24 +1,37 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import requests
-from bs4 import BeautifulSoup
 import re
 import os
 import random
-from gtts import gTTS
-from pydub import AudioSegment
 import urllib.parse
 from dotenv import load_dotenv
 from datetime import timedelta
 from course_generator import CourseRequest, course_generator
+import audio_variants
+import course_bundle
 import hakka_tts_module
 import hakka_trans_module
+import metrics
+import news_audio
+import news_scraper
+from news_prefetch import news_prefetcher
+import request_profiler
+import segment_planner
+import upstream_client
+import workspace
+from audio_cache_store import audio_cache_store
+from segment_cache import segment_cache
+from translation_memory import translation_memory
+from warmup import service_warmup
 import json
 import hashlib
 import time
 import asyncio
+import mimetypes
 
 # Load environment variables at application startup
 load_dotenv()
@@ -34,6 +47,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- On-demand request profiling ---
+# 只有設定 PROFILE_ADMIN_TOKEN 時才安裝，並只分析帶有正確 token 的請求
+PROFILED_PATHS = ["/api/audio", "/api/translate/course", "/api/generate_course"]
+if request_profiler.PROFILE_ADMIN_TOKEN:
+    app.add_middleware(request_profiler.ProfilingMiddleware, paths=PROFILED_PATHS)
+
 # --- Static File Serving ---
 # Create directories if they don't exist
 os.makedirs("output", exist_ok=True)
@@ -41,33 +60,21 @@ os.makedirs("temp_audio", exist_ok=True)
 os.makedirs("temp_trans", exist_ok=True)
 os.makedirs("tts_audio", exist_ok=True)
 
+# HLS 片段需要正確的 MIME type（.ts 預設會被判斷成其他格式）
+mimetypes.add_type("video/mp2t", ".ts")
+# 字幕檔（精簡映像檔可能沒有 /etc/mime.types）
+mimetypes.add_type("text/vtt", ".vtt")
+mimetypes.add_type("application/x-subrip", ".srt")
+
 # Mount directories to be accessible from URL paths
 app.mount("/output", StaticFiles(directory="output"), name="output")
 app.mount("/temp_audio", StaticFiles(directory="temp_audio"), name="temp_audio")
 app.mount("/tts_audio", StaticFiles(directory="tts_audio"), name="tts_audio")
 
 # --- Audio Cache Management ---
-audio_cache = {}
+# 整句語音快取索引存放在 SQLite（見 audio_cache_store），舊版 JSON 檔會在啟動時匯入
 AUDIO_CACHE_FILE = "tts_audio/audio_cache.json"
 
-def load_audio_cache():
-    """Load audio cache from file"""
-    global audio_cache
-    try:
-        if os.path.exists(AUDIO_CACHE_FILE):
-            with open(AUDIO_CACHE_FILE, 'r', encoding='utf-8') as f:
-                audio_cache = json.load(f)
-    except Exception as e:
-        print(f"Error loading audio cache: {e}")
-
-def save_audio_cache():
-    """Save audio cache to file"""
-    try:
-        with open(AUDIO_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(audio_cache, f, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving audio cache: {e}")
-
 def get_text_hash(text: str) -> str:
     """Generate a hash for the given text"""
     return hashlib.md5(text.encode('utf-8')).hexdigest()
@@ -76,29 +83,55 @@ def get_text_hash(text: str) -> str:
 @app.on_event("startup")
 async def startup_event():
     """Initialize directories and check service readiness"""
+    # Each step has its own try so one failure does not skip the steps after it
     try:
         # Ensure all directories exist
         for directory in ["output", "temp_audio", "temp_trans", "tts_audio"]:
             os.makedirs(directory, exist_ok=True)
-        
-        # Load audio cache
-        load_audio_cache()
-        
-        # Check translation service health
-        required_vars = ["HAKKA_TRANS_URL_BASE", "HAKKA_TRANS_URL_TRANS", "HAKKA_TRANS_USERNAME", "HAKKA_TRANS_PASSWORD"]
-        missing_vars = [var for var in required_vars if not os.getenv(var)]
-        if missing_vars:
-            print(f"Warning: Missing environment variables: {', '.join(missing_vars)}")
-        
-        # Warm up translation service (optional: add a test translation)
-        try:
-            hakka_trans_module.hakka_translate("測試", "test_init")
-            print("Translation service warmed up successfully")
-        except Exception as e:
-            print(f"Translation service warmup failed: {e}")
-            
     except Exception as e:
-        print(f"Startup error: {e}")
+        print(f"Startup error (directories): {e}")
+
+    try:
+        # Migrate the legacy JSON audio cache into the SQLite index
+        migrated = audio_cache_store.migrate_json(AUDIO_CACHE_FILE)
+        if migrated:
+            print(f"Migrated {migrated} audio cache entries from {AUDIO_CACHE_FILE}")
+    except Exception as e:
+        print(f"Startup error (audio cache migration): {e}")
+
+    # Check translation service health
+    required_vars = ["HAKKA_TRANS_URL_BASE", "HAKKA_TRANS_URL_TRANS", "HAKKA_TRANS_USERNAME", "HAKKA_TRANS_PASSWORD"]
+    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    if missing_vars:
+        print(f"Warning: Missing environment variables: {', '.join(missing_vars)}")
+
+    try:
+        # Warm up upstream logins and deferred imports in the background;
+        # /readyz reports when it has finished
+        service_warmup.start()
+    except Exception as e:
+        print(f"Startup error (warmup): {e}")
+
+    try:
+        # Open the persistent course webhook connection pool
+        await course_generator.start()
+    except Exception as e:
+        print(f"Startup error (course webhook session): {e}")
+
+    try:
+        # Start the background news prefetch / pre-render worker
+        news_prefetcher.start()
+    except Exception as e:
+        print(f"Startup error (news prefetch): {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and close the persistent upstream connection pools"""
+    await service_warmup.stop()
+    await news_prefetcher.stop()
+    await hakka_tts_module.close_async_tts_client()
+    await course_generator.close()
+    translation_memory.flush()
 
 # --- Pydantic Models for API Request/Response ---
 class TranslationRequest(BaseModel):
@@ -130,194 +163,90 @@ class TTSResponse(BaseModel):
     audio_url: str = None
     error_message: str = None
     file_path: str = None
+    format: str = None
+
+def audio_variant(audio_url: str, audio_format: str, original_format: str):
+    """
+    將靜態音檔網址換成指定格式的變體（第一次請求時編碼並快取）
+
+    Returns:
+        (網址, 實際提供的格式)；編碼失敗時退回原始檔
+    """
+    if audio_format == original_format:
+        return audio_url, original_format
+    try:
+        return audio_variants.variant_url(audio_url, audio_format), audio_format
+    except Exception as e:
+        print(f"Audio variant encoding failed ({audio_format}), serving {original_format}: {e}")
+        return audio_url, original_format
 
 @app.get("/api/news")
 def get_news_and_audio():
     try:
-        hakka_tts_module.clear_folder("temp_audio")
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        list_url = 'https://www.ettoday.net/news/news-list.htm'
-        res = requests.get(list_url, headers=headers, timeout=10, verify=False)
-        res.raise_for_status()
-        soup = BeautifulSoup(res.text, 'html.parser')
-        
-        all_news_links = [a['href'] for a in soup.select('div.part_list_2 a') if '/news/' in a.get('href', '') and a['href'].startswith('https://')]
+        all_news_links = news_scraper.fetch_news_links()
         
         if not all_news_links:
             raise HTTPException(status_code=404, detail="No news links found")
 
-        news_url = random.choice(all_news_links[:10])
-        res = requests.get(news_url, headers=headers, timeout=10, verify=False)
-        res.raise_for_status()
-        soup = BeautifulSoup(res.text, 'html.parser')
-        
-        title = soup.find('h1', class_='title').text.strip()
-        time = soup.find('time').text.strip()
-        content_div = soup.find('div', class_='story')
-        paragraphs = content_div.find_all('p')
+        # 從前 10 篇隨機挑選，並偏向背景預取已渲染好的文章（/api/audio 即可直接命中）
+        news_url, ready_id = news_prefetcher.choose(all_news_links[:10])
+        news_content = None
+        if ready_id:
+            try:
+                news_content = workspace.news_store.load(ready_id)
+            except FileNotFoundError:
+                pass
+        if news_content is None:
+            news_content = news_scraper.fetch_article(news_url)
         
-        news_content = [title, time]
-        for p in paragraphs:
-            for strong in p.find_all('strong'):
-                strong.extract()
-            for a in p.find_all('a'):
-                a.extract()
-            text = p.get_text(strip=True)
-            if text:
-                news_content.append(text)
-        
-        with open("temp_audio/news.json", "w", encoding="utf-8") as f:
-            json.dump(news_content, f, ensure_ascii=False)
+        # 每篇文章獨立保存，/api/audio 以 news_id 取用，不同使用者不會互相覆蓋
+        news_id = workspace.news_store.save(news_content)
 
-        return {"news": news_content}
+        return {"news": news_content, "news_id": news_id}
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Error fetching news: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-def generate_english_mp3(text, out_path):
-    """Wrapper for gTTS to run it in a thread."""
-    try:
-        gTTS(text=text, lang='en').save(out_path)
-        print(f"🟢 gTTS 成功 ({os.path.basename(out_path)})")
-    except Exception as e:
-        print(f"❌ gTTS 失敗 ({os.path.basename(out_path)}): {e}")
-        # In case of failure, create a silent file so the concatenation doesn't fail.
-        AudioSegment.silent(duration=100).export(out_path, format="mp3")
+@app.get("/api/news/prefetch")
+def get_news_prefetch_status():
+    """背景預取的設定與最近一輪的結果"""
+    return news_prefetcher.status()
 
 @app.get("/api/audio")
-async def get_audio():
+async def get_audio(news_id: str = None, stream: bool = False, format: str = None, accept: str = Header(None)):
+    """
+    將新聞轉為語音
+
+    news_id 為 /api/news 返回的文章識別碼，未提供時使用最近一次抓取的文章。
+    stream=true 時改為逐段渲染 HLS：第一個片段完成即返回播放清單網址，
+    後續段落完成後陸續加入播放清單與字幕檔（HLS 固定為 AAC 片段）。
+    format（mp3/opus/aac/wav）或 Accept 中的 audio/* 類型決定 audio_url 的格式，預設為 MP3
+    """
     try:
-        with open("temp_audio/news.json", "r", encoding="utf-8") as f:
-            news_content = json.load(f)
-
-        safe_title = re.sub(r'[\/*?:"<>|]', "", news_content[0])
-        output_mp3name = f"{safe_title[:50]}.mp3"
-        output_jsonname = f"{safe_title[:50]}.json"
-        audio_url = f"output/{urllib.parse.quote(output_mp3name)}"
-        json_url = f"output/{output_jsonname}"
-        
-        if os.path.exists(f"output/{output_mp3name}") and os.path.exists(json_url):
-            print("memory")
-            with open(json_url, "r", encoding="utf-8") as f:
-                subtitle_blocks = json.load(f)
-            audio_url = f"/output/{urllib.parse.quote(output_mp3name)}"
-            return {
-                "status": "memory",
-                "audio_url": audio_url,
-                "subtitles": subtitle_blocks
-            }
-
-        # --- Step 1: Setup Concurrency Control ---
-        # Create a semaphore to limit concurrent Hakka TTS requests to avoid rate-limiting.
-        CONCURRENT_LIMIT = 3
-        semaphore = asyncio.Semaphore(CONCURRENT_LIMIT)
-
-        # --- Helper function to process each segment with semaphore control ---
-        async def process_segment(segment_func, *args):
-            # This wrapper acquires the semaphore before running the blocking I/O task in a thread.
-            async with semaphore:
-                # Using asyncio.to_thread to run the blocking function without blocking the event loop.
-                return await asyncio.to_thread(segment_func, *args)
-
-        # --- Step 2: Create all TTS generation tasks ---
-        tasks = []
-        all_seg_paths = [] # To maintain order for later audio combination
-        total_segments = sum(len(hakka_tts_module.split_smart_segments(p)) for p in news_content)
-        print(f"總共要處理 {total_segments} 個語音片段...")
-
-        for idx, paragraph in enumerate(news_content):
-            subsegments = hakka_tts_module.split_smart_segments(paragraph)
-            para_seg_paths = []
-            all_seg_paths.append(para_seg_paths)
-
-            for sub_idx, segment in enumerate(subsegments):
-                seg_index = f"{idx}_{sub_idx}"
-                task = None
-                try:
-                    # English segments (gTTS) are less likely to have strict rate limits,
-                    # but we can run them through the semaphore as well for consistency.
-                    if re.search(r'[a-zA-Z]', segment):
-                        out_path = f"temp_audio/segment_{seg_index}.mp3"
-                        # We use the same semaphore for gTTS to keep things simple.
-                        task = process_segment(generate_english_mp3, segment, out_path)
-                    # Hakka segments are the main reason for the semaphore.
-                    else:
-                        out_path = f"temp_audio/segment_{seg_index}.wav"
-                        task = process_segment(hakka_tts_module.generate_hakka_wav, segment, seg_index)
-
-                    para_seg_paths.append(out_path)
-                    if task:
-                        tasks.append(task)
-                except Exception as e:
-                    print(f"❌ 準備任務時發生錯誤 [{seg_index}]：{e}")
-
-        # --- Step 3: Run all tasks concurrently (respecting the semaphore limit) ---
-        print(f"▶️ 開始並行處理 {len(tasks)} 個語音生成任務 (並行上限: {CONCURRENT_LIMIT})...")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Check for errors during execution
-        failed_tasks = 0
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                # Log the exception from the task
-                print(f"❌ 任務 {i} 執行失敗: {result}")
-                failed_tasks += 1
-        
-        if failed_tasks > 0:
-            print(f"⚠️ {failed_tasks}/{len(tasks)} 個語音生成任務失敗。")
-        else:
-            print("✅ 所有語音生成任務已完成。")
-
-        # --- Step 4: Combine audio segments and create subtitles ---
-        final_audio = AudioSegment.empty()
-        pause = AudioSegment.silent(duration=500)
-        current_time = 0
-        subtitle_blocks = []
-
-        for idx, paragraph in enumerate(news_content):
-            para_audio = AudioSegment.empty()
-            seg_paths = all_seg_paths[idx]
-
-            for path in seg_paths:
-                try:
-                    if os.path.exists(path) and os.path.getsize(path) > 0:
-                        para_audio += AudioSegment.from_file(path)
-                    else:
-                        print(f"⚠️ 找不到或檔案為空，跳過: {path}")
-                except Exception as e:
-                    print(f"❌ 合併音檔失敗 {path}: {e}")
-
-            start_ms = current_time
-            end_ms = current_time + len(para_audio)
-            subtitle_blocks.append({
-                "index": idx + 1,
-                "start": start_ms,
-                "end": end_ms,
-                "text": paragraph
-            })
-            
-            final_audio += para_audio + pause
-            current_time = end_ms + len(pause)
+        audio_format = audio_variants.choose_format(format, accept, default="mp3")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # --- Step 4: Export final audio and subtitle data ---
-        with open(json_url, "w", encoding="utf-8") as f:
-            json.dump(subtitle_blocks, f, ensure_ascii=False)
+    try:
+        news_content = workspace.news_store.load(news_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="News not found, please call /api/news first")
 
-        if len(final_audio) > 0:
-            final_audio.export(f"output/{output_mp3name}", format="mp3")
-            print(f"✅ 已輸出語音：output/{output_mp3name}")
-            audio_url = f"/output/{urllib.parse.quote(output_mp3name)}"
-        else:
-            audio_url = None
-            print("⚠️ 最終音檔為空，不進行匯出。")
-        
-        return {
-            "status": "done",
-            "audio_url": audio_url,
-            "subtitles": subtitle_blocks
-        }
+    try:
+        if stream:
+            return await news_audio.start_hls_render(news_content)
+
+        # 已被背景預取渲染過的文章直接返回（status 為 "memory"）
+        result = await news_audio.render_to_output(news_content)
+        # 同一篇文章的等待者共用同一個結果字典，需複製後再修改
+        result = {**result, "format": "mp3"}
+        if result["audio_url"]:
+            result["audio_url"], result["format"] = await asyncio.to_thread(
+                audio_variant, result["audio_url"], audio_format, "mp3"
+            )
+        return result
 
     except Exception as e:
         # Log the full error for debugging
@@ -331,7 +260,7 @@ async def translate_course_text(request: CourseTranslateRequest):
     """專為Course3.vue設計的翻譯API端點"""
     try:
         # 調用翻譯模組（新版本支持 Markdown 格式保留）
-        translation_result = hakka_trans_module.hakka_translate(request.text, str(request.index))
+        translation_result = await hakka_trans_module.hakka_translate_async(request.text, str(request.index))
         
         if translation_result and translation_result.get('success', False):
             # 提取翻譯後的文字（優先使用 translatedText，向後兼容 output）
@@ -368,18 +297,14 @@ async def translate_course_text(request: CourseTranslateRequest):
 @app.post("/api/translate", response_model=TranslationResponse)
 async def translate_text(request: TranslationRequest):
     try:
-        hakka_tts_module.clear_folder("temp_trans")
-        hakka_trans_module.hakka_translate(request.text, request.index)
-        translation_file = f"temp_trans/translation_{request.index}.json"
+        result = await hakka_trans_module.hakka_translate_async(request.text, request.index)
+        translation_result = result.get("details")
         
-        if os.path.exists(translation_file):
-            with open(translation_file, 'r', encoding='utf-8') as f:
-                translation_result = json.load(f)
+        if translation_result:
             return TranslationResponse(
                 success=True,
                 original_text=request.text,
-                translation_result=translation_result,
-                file_path=translation_file
+                translation_result=translation_result
             )
         else:
             return TranslationResponse(
@@ -401,49 +326,75 @@ async def translate_text(request: TranslationRequest):
             error_message=f"Unexpected error: {str(e)}"
         )
 
+# 批次翻譯失敗時的重試設定：指數退避加上隨機抖動，避免所有請求同時重試
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_TRANSLATE_MAX_RETRIES", "3"))
+BATCH_RETRY_BASE_DELAY = float(os.getenv("BATCH_TRANSLATE_RETRY_BASE_DELAY", "1"))
+BATCH_RETRY_MAX_DELAY = float(os.getenv("BATCH_TRANSLATE_RETRY_MAX_DELAY", "8"))
+
+async def translate_with_retry(text: str, index: str) -> dict:
+    """翻譯單一文字並在失敗時重試，返回不含 index 的結果欄位"""
+    # 設定為 0 或負數時仍至少嘗試一次
+    attempts = max(1, BATCH_MAX_RETRIES)
+    error_message = "Translation was not attempted"
+    for attempt in range(attempts):
+        try:
+            result = await hakka_trans_module.hakka_translate_async(text, index)
+            translation_result = result.get("details")
+            if translation_result:
+                return {"success": True, "original_text": text, "translation_result": translation_result}
+            return {"success": False, "original_text": text, "error_message": "Translation file not found"}
+        except Exception as e:
+            error_message = str(e)
+            if attempt < attempts - 1:
+                delay = random.uniform(0, min(BATCH_RETRY_MAX_DELAY, BATCH_RETRY_BASE_DELAY * 2 ** attempt))
+                print(f"Retrying translation for text {index} in {delay:.2f}s (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(delay)
+    return {"success": False, "original_text": text, "error_message": error_message}
+
 @app.post("/api/translate/batch")
-async def translate_batch_texts(texts: list[str]):
-    results = []
+async def translate_batch_texts(texts: list[str], stream: bool = False):
+    """
+    批次翻譯：相同的文字只翻譯一次，不同文字在翻譯執行緒池中並行處理。
+    stream=true 時以 NDJSON 逐筆回傳（完成順序），最後一行為統計；預設回傳彙整結果（輸入順序）。
+    """
+    # 相同文字共用一次翻譯，結果套用到所有出現的位置
+    positions = {}
+    for idx, text in enumerate(texts):
+        positions.setdefault(text, []).append(idx)
+    print(f"Batch translation: {len(texts)} texts, {len(positions)} unique")
+
+    def records_for(text, outcome):
+        return [{**outcome, "index": f"batch_{idx}"} for idx in positions[text]]
+
+    async def run_unique(text):
+        outcome = await translate_with_retry(text, f"batch_{positions[text][0]}")
+        return text, outcome
+
+    if stream:
+        async def ndjson_results():
+            tasks = [asyncio.create_task(run_unique(text)) for text in positions]
+            successful = failed = 0
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    text, outcome = await finished
+                    for record in records_for(text, outcome):
+                        if record["success"]:
+                            successful += 1
+                        else:
+                            failed += 1
+                        yield json.dumps(record, ensure_ascii=False) + "\n"
+                summary = {"done": True, "total": len(texts), "successful": successful, "failed": failed}
+                yield json.dumps(summary) + "\n"
+            finally:
+                # 用戶端中途斷線時，不再等待尚未開始的翻譯
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+
     try:
-        hakka_tts_module.clear_folder("temp_trans")
-        for idx, text in enumerate(texts):
-            index = f"batch_{idx}"
-            max_retries = 3
-            retry_delay = 1  # seconds
-            
-            for attempt in range(max_retries):
-                try:
-                    hakka_trans_module.hakka_translate(text, index)
-                    translation_file = f"temp_trans/translation_{index}.json"
-                    if os.path.exists(translation_file):
-                        with open(translation_file, 'r', encoding='utf-8') as f:
-                            translation_result = json.load(f)
-                        results.append({
-                            "success": True,
-                            "original_text": text,
-                            "translation_result": translation_result,
-                            "index": index
-                        })
-                        break
-                    else:
-                        results.append({
-                            "success": False,
-                            "original_text": text,
-                            "error_message": "Translation file not found",
-                            "index": index
-                        })
-                        break
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        print(f"Retrying translation for text {index} (attempt {attempt + 1}): {e}")
-                        await asyncio.sleep(retry_delay)
-                        continue
-                    results.append({
-                        "success": False,
-                        "original_text": text,
-                        "error_message": str(e),
-                        "index": index
-                    })
+        outcomes = dict(await asyncio.gather(*(run_unique(text) for text in positions)))
+        results = [{**outcomes[text], "index": f"batch_{idx}"} for idx, text in enumerate(texts)]
         
         return {
             "total": len(texts),
@@ -456,9 +407,16 @@ async def translate_batch_texts(texts: list[str]):
         raise HTTPException(status_code=500, detail=f"Batch translation error: {str(e)}")
 
 @app.post("/api/tts", response_model=TTSResponse)
-def generate_tts(request: TTSRequest):
+def generate_tts(request: TTSRequest, format: str = None, accept: str = Header(None)):
+    """
+    format（wav/opus/aac/mp3）或 Accept 中的 audio/* 類型決定 audio_url 的格式，預設為 WAV
+    """
     try:
-        hakka_tts_module.clear_folder("temp_audio")
+        try:
+            audio_format = audio_variants.choose_format(format, accept, default="wav")
+        except ValueError as e:
+            return TTSResponse(success=False, error_message=str(e))
+
         if not request.text.strip():
             return TTSResponse(
                 success=False,
@@ -473,14 +431,17 @@ def generate_tts(request: TTSRequest):
         
         text_hash = get_text_hash(request.text.strip())
         
-        if text_hash in audio_cache:
-            cached_audio = audio_cache[text_hash]
+        cached_audio = audio_cache_store.get(text_hash)
+        if cached_audio:
             if os.path.exists(cached_audio["file_path"]):
-                audio_url = f"/tts_audio/{os.path.basename(cached_audio['file_path'])}"
+                audio_url, served_format = audio_variant(
+                    f"/tts_audio/{os.path.basename(cached_audio['file_path'])}", audio_format, "wav"
+                )
                 return TTSResponse(
                     success=True,
                     audio_url=audio_url,
-                    file_path=cached_audio["file_path"]
+                    file_path=cached_audio["file_path"],
+                    format=served_format
                 )
         
         safe_text = re.sub(r'[^\w\s-]', '', request.text.strip())
@@ -495,18 +456,14 @@ def generate_tts(request: TTSRequest):
             
             if os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
                 os.rename(temp_path, output_path)
-                audio_cache[text_hash] = {
-                    "text": request.text.strip(),
-                    "file_path": output_path,
-                    "timestamp": int(time.time())
-                }
-                save_audio_cache()
+                audio_cache_store.put(text_hash, request.text.strip(), output_path, int(time.time()))
                 
-                audio_url = f"/tts_audio/{filename}.wav"
+                audio_url, served_format = audio_variant(f"/tts_audio/{filename}.wav", audio_format, "wav")
                 return TTSResponse(
                     success=True,
                     audio_url=audio_url,
-                    file_path=output_path
+                    file_path=output_path,
+                    format=served_format
                 )
             else:
                 return TTSResponse(
@@ -531,6 +488,7 @@ def generate_tts(request: TTSRequest):
             error_message=f"TTS generation failed: {str(e)}"
         )
 
+# 翻譯不再寫入 temp_trans/（詳細結果在回應的 details 中），以下端點只處理舊版留下的檔案
 @app.get("/api/translate/files/{index}")
 def get_translation_file(index: str):
     try:
@@ -584,6 +542,158 @@ async def generate_course(request: CourseRequest):
             detail=f"課程生成失敗: {str(e)}"
         )
 
+@app.post("/api/course_bundle")
+async def create_course_bundle(request: CourseRequest):
+    """
+    建立課程套件工作：生成課程後逐章翻譯並合成語音，立即返回工作識別碼
+
+    以 GET /api/course_bundle/{job_id} 輪詢狀態，或訂閱 /api/course_bundle/{job_id}/events
+    """
+    job = course_bundle.start_job(request)
+    return {
+        "job_id": job.job_id,
+        "status_url": f"/api/course_bundle/{job.job_id}",
+        "events_url": f"/api/course_bundle/{job.job_id}/events"
+    }
+
+@app.get("/api/course_bundle/{job_id}")
+def get_course_bundle(job_id: str):
+    """課程套件目前的狀態，已完成的章節含翻譯、音檔網址與字幕"""
+    try:
+        return course_bundle.get_job(job_id).snapshot()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Course bundle job not found")
+
+@app.get("/api/course_bundle/{job_id}/events")
+async def stream_course_bundle(job_id: str):
+    """以 Server-Sent Events 推送課程套件的進度，每次狀態變化送出一次完整狀態"""
+    try:
+        job = course_bundle.get_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Course bundle job not found")
+
+    async def events():
+        while True:
+            # 先取得等待點再送出狀態，避免遺漏兩者之間的變化
+            changed = job.change_event()
+            yield f"data: {json.dumps(job.snapshot(), ensure_ascii=False)}\n\n"
+            if job.finished:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/api/upstream/limits")
+def get_upstream_limits():
+    """各上游服務目前與歷史最高的自適應並行上限"""
+    return upstream_client.limiter_stats()
+
+# --- Prometheus metrics ---
+# 快取與並行上限的數值在抓取時直接讀取各模組的 stats()，不另外計數
+
+def _cache_lookups():
+    """各快取的查詢次數：快取名稱 → {結果: 次數}"""
+    segment = segment_cache.stats()
+    memory = translation_memory.stats()
+    tts = audio_cache_store.stats()
+    course = course_generator.cache_stats()
+    lookups = {
+        "segment_audio": {"hit": segment["hits"], "miss": segment["misses"]},
+        "translation_memory": {"hit": memory["memory_hits"] + memory["disk_hits"], "miss": memory["misses"]},
+        "tts_audio": {"hit": tts["hits"], "miss": tts["misses"]},
+        # 相同課程生成中時加入等待的請求也算在 miss 中
+        "course": {"hit": course["hits"], "miss": course["misses"]},
+    }
+    for fetcher in (news_scraper.list_fetcher, news_scraper.article_fetcher):
+        stats = fetcher.stats()
+        # 304 沿用上次的解析結果，視為命中
+        lookups[f"news_{fetcher.name}"] = {"hit": stats["hits"] + stats["not_modified"], "miss": stats["misses"]}
+    return lookups
+
+def _cache_requests():
+    return {
+        (cache, result): count
+        for cache, results in _cache_lookups().items()
+        for result, count in results.items()
+    }
+
+def _cache_hit_ratios():
+    ratios = {}
+    for cache, results in _cache_lookups().items():
+        total = results["hit"] + results["miss"]
+        ratios[(cache,)] = results["hit"] / total if total else 0.0
+    return ratios
+
+def _limiter_values(field):
+    return lambda: {(name,): stats[field] for name, stats in upstream_client.limiter_stats().items()}
+
+def _planned_segments():
+    stats = segment_planner.planner_stats.snapshot()
+    return {("naive",): stats["naive_calls"], ("planned",): stats["planned_calls"]}
+
+metrics.CallbackMetric("hakka_cache_requests_total", "Cache lookups by cache and result.", "counter",
+                       _cache_requests, ("cache", "result"))
+metrics.CallbackMetric("hakka_cache_hit_ratio", "Cache hit ratio since process start.", "gauge",
+                       _cache_hit_ratios, ("cache",))
+metrics.CallbackMetric("hakka_upstream_concurrency_limit", "Current adaptive concurrency limit per upstream.", "gauge",
+                       _limiter_values("limit"), ("limiter",))
+metrics.CallbackMetric("hakka_upstream_in_flight", "Upstream calls currently holding a concurrency slot.", "gauge",
+                       _limiter_values("in_flight"), ("limiter",))
+metrics.CallbackMetric("hakka_upstream_waiting", "Callers queued for an upstream concurrency slot.", "gauge",
+                       _limiter_values("waiting"), ("limiter",))
+metrics.CallbackMetric("hakka_upstream_congestion_events_total", "Times the adaptive limiter backed off.", "counter",
+                       _limiter_values("congestion_events"), ("limiter",))
+metrics.CallbackMetric("hakka_tts_segments_total", "TTS segments before (naive) and after (planned) segment planning.",
+                       "counter", _planned_segments, ("plan",))
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 文字格式的監控指標"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _require_profile_admin(request: Request):
+    token = request.headers.get(request_profiler.PROFILE_HEADER) or request.query_params.get(request_profiler.PROFILE_QUERY_PARAM)
+    if not request_profiler.authorized(token):
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the admin token is invalid")
+
+@app.get("/api/profiles")
+def list_profiles(request: Request):
+    """最近的請求分析報告摘要（需要管理員 token）"""
+    _require_profile_admin(request)
+    return request_profiler.list_reports()
+
+@app.get("/api/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request, format: str = "json"):
+    """
+    取得一份請求分析報告（需要管理員 token）
+
+    format=folded 時以純文字返回 folded stacks，可直接交給 flamegraph.pl 或 speedscope
+    """
+    _require_profile_admin(request)
+    try:
+        report = request_profiler.load_report(profile_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile report not found")
+    if format == "folded":
+        return PlainTextResponse("\n".join(report["folded"]) + "\n")
+    return report
+
+@app.get("/healthz")
+def healthz():
+    """存活檢查：行程能回應即為正常，不檢查上游"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """就緒檢查：背景預熱結束前返回 503，內容為各預熱步驟的結果"""
+    status = service_warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 @app.get("/")
 def read_root():
     return {"Hello": "World", "translation_api": "available", "tts_api": "available (Hakka only)"}
\ No newline at end of file
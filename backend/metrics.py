@@ -0,0 +1,260 @@
+"""
+Prometheus 格式的監控指標
+只實作本服務需要的 Counter 與 Histogram，另外支援在抓取 /metrics 時才讀取的回呼指標，
+讓各模組既有的 stats()（快取命中、並行上限等）不必重複計數。
+計時點同時是 request_profiler 的時間軸來源，請求啟用分析時會記錄每一筆。
+
+用法：
+    with metrics.track_upstream("hakka_tts", "synthesize") as call:
+        response = session.post(...)
+        call.status = response.status_code
+
+    with metrics.render_stage_seconds.time(stage="assemble"):
+        ...
+"""
+
+import asyncio
+import bisect
+import math
+import threading
+import time
+
+import aiohttp
+import requests
+
+import request_profiler
+
+# 上游呼叫與渲染階段共用的延遲分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 依登記順序輸出的所有指標
+REGISTRY = []
+
+# 記為 status="timeout" 的例外：requests 與 aiohttp 的逾時都不是內建 TimeoutError 的子類別
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError, requests.exceptions.Timeout, aiohttp.ServerTimeoutError)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """返回 [(後綴, [(標籤名, 值), ...], 數值), ...]"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", list(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class _HistogramTimer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        self.histogram.observe(ended - self.started, **self.labels)
+        if self.histogram.span_kind is not None:
+            request_profiler.record_span(
+                self.histogram.span_kind, ",".join(str(v) for v in self.labels.values()), self.started, ended
+            )
+        return False
+
+
+class Histogram(_Metric):
+    """累積分桶的延遲分布"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, span_kind=None):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 設定時 time() 區塊也會記錄到請求分析的時間軸
+        self.span_kind = span_kind
+        # 標籤 → [各分桶的（非累積）次數..., 總和, 總次數]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        """以 with 區塊計時（同步與 async 函式內皆可使用）"""
+        self._key(labels)
+        return _HistogramTimer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        result = []
+        for key, state in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                result.append(("_bucket", labels + [("le", _format_value(float(bound)))], cumulative))
+            result.append(("_sum", labels, state[-2]))
+            result.append(("_count", labels, state[-1]))
+        return result
+
+
+class CallbackMetric(_Metric):
+    """
+    抓取時才呼叫 func 讀取數值的指標
+
+    func 沒有標籤時返回單一數值，有標籤時返回 {標籤值 tuple: 數值}
+    """
+
+    def __init__(self, name, help, kind, func, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.func = func
+
+    def samples(self):
+        value = self.func()
+        if not self.labelnames:
+            return [("", [], value)]
+        return [
+            ("", list(zip(self.labelnames, (str(v) for v in key))), number)
+            for key, number in sorted(value.items())
+        ]
+
+
+def render():
+    """以 Prometheus 文字格式輸出所有指標"""
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # 單一回呼失敗不影響其他指標
+            print(f"⚠️ 讀取監控指標失敗 ({metric.name}): {e}")
+    return "\n".join(lines) + "\n"
+
+
+# --- 服務共用的指標 ---
+
+upstream_request_seconds = Histogram(
+    "hakka_upstream_request_duration_seconds",
+    "Latency of upstream calls by service and operation.",
+    ("upstream", "operation"),
+)
+upstream_requests = Counter(
+    "hakka_upstream_requests_total",
+    "Upstream calls by service, operation and HTTP status (or error/timeout).",
+    ("upstream", "operation", "status"),
+)
+render_stage_seconds = Histogram(
+    "hakka_render_stage_duration_seconds",
+    "Time spent in each stage of news/course audio rendering.",
+    ("stage",),
+    span_kind="stage",
+)
+queue_wait_seconds = Histogram(
+    "hakka_queue_wait_seconds",
+    "Time spent waiting for a concurrency slot before running.",
+    ("queue",),
+    span_kind="queue_wait",
+)
+translation_fallbacks = Counter(
+    "hakka_translation_fallbacks_total",
+    "Translated segments that fell back to the original text, by reason.",
+    ("reason",),
+)
+tts_failures = Counter(
+    "hakka_tts_failures_total",
+    "Speech segments that could not be synthesized (gTTS failures are replaced by silence).",
+    ("engine",),
+)
+
+
+class _UpstreamCall:
+    def __init__(self, upstream, operation):
+        self.upstream = upstream
+        self.operation = operation
+        self.status = None
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        upstream_request_seconds.observe(ended - self.started, upstream=self.upstream, operation=self.operation)
+        if exc_type is not None:
+            status = "timeout" if issubclass(exc_type, TIMEOUT_ERRORS) else "error"
+        else:
+            status = self.status if self.status is not None else "ok"
+        upstream_requests.inc(upstream=self.upstream, operation=self.operation, status=status)
+        request_profiler.record_span("upstream", f"{self.upstream}.{self.operation}", self.started, ended, str(status))
+        return False
+
+
+def track_upstream(upstream, operation):
+    """記錄一次上游呼叫的延遲與結果；在區塊內設定 call.status 以記錄 HTTP 狀態碼"""
+    return _UpstreamCall(upstream, operation)
@@ -0,0 +1,802 @@
+"""
+新聞語音生成流程
+負責將新聞段落切成語音片段、並行呼叫 TTS，並提供逐段發布的 HLS 串流輸出
+（gtts 與 pydub 在第一次使用時才載入，不拖慢服務啟動）
+"""
+
+import asyncio
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+import urllib.parse
+import uuid
+
+import audio_headers
+import audio_variants
+import hakka_tts_module
+import metrics
+import request_profiler
+import segment_planner
+import subtitles
+import upstream_client
+import workspace
+from segment_cache import segment_cache
+
+# 段落之間的停頓（毫秒）
+PARAGRAPH_PAUSE_MS = 500
+
+# 合併輸出時統一使用的 PCM 格式（單聲道 16-bit）；取樣率 0 表示沿用第一個片段的取樣率
+ASSEMBLY_FRAME_RATE = int(os.getenv("AUDIO_ASSEMBLY_FRAME_RATE", "0"))
+DEFAULT_FRAME_RATE = 24000
+ASSEMBLY_SAMPLE_WIDTH = 2
+
+# HLS 相關設定
+HLS_ROOT = "output/hls"
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+HLS_AUDIO_BITRATE = os.getenv("HLS_AUDIO_BITRATE", "96k")
+PLAYLIST_NAME = "playlist.m3u8"
+SUBTITLES_NAME = "subtitles.json"
+
+
+# gTTS 沒有逾時設定，整段合成超過此秒數即視為逾時（背景執行緒會在連線結束後自行退出）
+GTTS_TIMEOUT = float(os.getenv("GTTS_TIMEOUT", "30"))
+
+
+def _write_gtts_mp3(text, tmp_path, lang):
+    from gtts import gTTS
+
+    with open(tmp_path, "wb") as f:
+        gTTS(text=text, lang=lang).write_to_fp(f)
+
+
+def _discard_gtts_result(task, tmp_path):
+    """放棄的合成（逾時或失敗）結束後刪除其暫存檔"""
+    if not task.cancelled():
+        # 例外已由 synthesize_english 處理，取出以免出現未取得例外的警告
+        task.exception()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+async def synthesize_english(text, out_path, lang='en'):
+    """
+    以 gTTS 的公開 API 合成英文片段（阻塞的 HTTP 請求在執行緒中進行）
+
+    執行緒只寫入自己的暫存檔，等待成功後才換名到 out_path（也避免覆寫到快取檔的硬連結）。
+    逾時無法中止執行緒，但它稍後完成時只會寫到已被放棄的暫存檔，
+    不會覆蓋 out_path 上的靜音替代檔或快取項目。
+
+    Raises:
+        upstream_client.OverloadedError: Google 回應 429 或 5xx，交由 AdaptiveLimiter 降低並行數
+        asyncio.TimeoutError: 超過 GTTS_TIMEOUT
+    """
+    from gtts import gTTSError
+
+    tmp_path = f"{out_path}.{uuid.uuid4().hex[:8]}.tmp"
+    task = asyncio.ensure_future(
+        asyncio.to_thread(request_profiler.bound(_write_gtts_mp3), text, tmp_path, lang)
+    )
+    with metrics.track_upstream("gtts", "synthesize") as call:
+        try:
+            # shield：逾時時不取消 task，讓 _discard_gtts_result 在執行緒真正結束後才清除暫存檔
+            await asyncio.wait_for(asyncio.shield(task), timeout=GTTS_TIMEOUT)
+        except BaseException as e:
+            task.add_done_callback(lambda done: _discard_gtts_result(done, tmp_path))
+            if isinstance(e, gTTSError):
+                status_code = getattr(e.rsp, "status_code", None)
+                if status_code is not None:
+                    call.status = status_code
+                    upstream_client.raise_for_overload(status_code)
+            raise
+        os.replace(tmp_path, out_path)
+        call.status = 200
+
+
+# gTTS 的自適應並行上限
+gtts_limiter = upstream_client.AdaptiveLimiter(
+    "gtts",
+    initial=int(os.getenv("GTTS_INITIAL_CONCURRENCY", "3")),
+    min_limit=int(os.getenv("GTTS_MIN_CONCURRENCY", "1")),
+    max_limit=int(os.getenv("GTTS_MAX_CONCURRENCY", "8")),
+    latency_target=float(os.getenv("GTTS_LATENCY_TARGET", "5")),
+)
+
+
+async def generate_english_mp3(text, out_path):
+    """以 gTTS 生成英文片段，失敗時輸出短靜音檔讓合併流程繼續"""
+    key = segment_cache.make_key(text, "gtts", "en", 1)
+    if segment_cache.fetch(key, out_path):
+        print(f"💾 gTTS 快取命中 ({os.path.basename(out_path)})")
+        return
+    try:
+        async with gtts_limiter.slot():
+            await synthesize_english(text, out_path)
+        print(f"🟢 gTTS 成功 ({os.path.basename(out_path)})")
+        # 只快取成功的結果，失敗時的靜音檔不寫入快取
+        segment_cache.store(key, out_path)
+    except Exception as e:
+        print(f"❌ gTTS 失敗 ({os.path.basename(out_path)}): {e}")
+        metrics.tts_failures.inc(engine="gtts")
+        # In case of failure, create a silent file so the concatenation doesn't fail.
+        from pydub import AudioSegment
+        await asyncio.to_thread(AudioSegment.silent(duration=100).export, out_path, format="mp3")
+
+
+def plan_paragraph(paragraph, idx, workdir):
+    """
+    將一個段落切成語音片段並決定每個片段使用的 TTS
+
+    Args:
+        paragraph: 段落文字
+        idx: 段落序號
+        workdir: 此工作專用的暫存目錄（見 workspace.job_workspace）
+
+    Returns:
+        ([(out_path, coroutine_func, args), ...], 未規劃時的片段數)，jobs 的順序即播放順序
+    """
+    jobs = []
+    # 規劃器合併相鄰片段並把短縮寫留在客語片段中，盡量減少上游呼叫
+    plan = segment_planner.plan_segments(paragraph)
+    for sub_idx, (segment, engine) in enumerate(plan):
+        seg_index = f"{idx}_{sub_idx}"
+        if engine == segment_planner.ENGINE_GTTS:
+            out_path = os.path.join(workdir, f"segment_{seg_index}.mp3")
+            jobs.append((out_path, generate_english_mp3, (segment, out_path)))
+        else:
+            out_path = os.path.join(workdir, f"segment_{seg_index}.wav")
+            jobs.append((out_path, hakka_tts_module.generate_hakka_wav_async, (segment, seg_index, out_path)))
+    return jobs, plan.naive_calls
+
+
+def _read_pcm_wav(path, frame_rate):
+    """格式相符的 WAV 直接返回 (data chunk 的 PCM 位元組, 取樣率)，否則返回 None"""
+    if not path.lower().endswith(".wav"):
+        return None
+    header = audio_headers.read_wav_header(path)
+    if (header is None or header.audio_format != audio_headers.WAVE_FORMAT_PCM or header.channels != 1
+            or header.sample_width != ASSEMBLY_SAMPLE_WIDTH or frame_rate not in (0, header.sample_rate)):
+        return None
+    with open(path, "rb") as f:
+        f.seek(header.data_offset)
+        pcm = f.read(header.data_size)
+    return pcm[:len(pcm) - len(pcm) % ASSEMBLY_SAMPLE_WIDTH], header.sample_rate
+
+
+def read_segment_pcm(path, frame_rate=0):
+    """
+    讀取一個片段檔並轉成合併用的 PCM（單聲道 16-bit），缺少或損壞的檔案會被略過
+
+    已是單聲道 16-bit 且取樣率相同的 WAV 片段（客語 TTS 的輸出）直接讀出 data chunk，不經 pydub 解碼。
+
+    Args:
+        frame_rate: 目標取樣率；0 表示沿用片段本身的取樣率
+
+    Returns:
+        (PCM 位元組, 取樣率)；略過時 PCM 為 None，取樣率維持 frame_rate
+    """
+    from pydub import AudioSegment
+
+    try:
+        if not (os.path.exists(path) and os.path.getsize(path) > 0):
+            print(f"⚠️ 找不到或檔案為空，跳過: {path}")
+            return None, frame_rate
+        result = _read_pcm_wav(path, frame_rate)
+        if result is not None:
+            return result
+        segment = AudioSegment.from_file(path)
+        frame_rate = frame_rate or segment.frame_rate
+        pcm = (segment.set_frame_rate(frame_rate)
+               .set_channels(1)
+               .set_sample_width(ASSEMBLY_SAMPLE_WIDTH)).raw_data
+        return pcm, frame_rate
+    except Exception as e:
+        print(f"❌ 合併音檔失敗 {path}: {e}")
+        return None, frame_rate
+
+
+class PCMAssembler:
+    """
+    單次串流的音訊合併器
+
+    每個片段只解碼一次並轉成統一的 PCM 格式，依序直接寫入同一個 ffmpeg 編碼程序，
+    停頓以靜音位元組寫入，時間軸由已寫入的取樣數計算（片段的讀取見 read_segment_pcm）。
+    記憶體中同時最多只有一個片段的 PCM 資料。
+
+    用法：
+        with PCMAssembler("output/news.mp3") as assembler:
+            assembler.append_file("temp_audio/segment_0_0.wav")
+            assembler.append_silence(500)
+    """
+
+    def __init__(self, out_path, format="mp3", bitrate=None, frame_rate=ASSEMBLY_FRAME_RATE, low_priority=False,
+                 codec=None, output_args=()):
+        self.out_path = out_path
+        self.format = format
+        self.bitrate = bitrate
+        # 選用的編碼器與其他輸出參數（例如 HLS 片段的 "aac" 與 -output_ts_offset）
+        self.codec = codec
+        self.output_args = list(output_args)
+        # 背景工作以較低的 CPU 優先權編碼，不與互動請求搶 CPU
+        self.low_priority = low_priority
+        # frame_rate 為 0 時沿用第一個片段的取樣率，省去重新取樣
+        self.frame_rate = frame_rate
+        self.frames_written = 0
+        # 解碼片段與寫入 ffmpeg（含等待編碼完成）各自累計的秒數
+        self.decode_seconds = 0.0
+        self.encode_seconds = 0.0
+        # 同一篇文章可能同時被多個請求渲染，暫存檔名需各自獨立
+        self._tmp_path = f"{out_path}.{uuid.uuid4().hex[:8]}.part"
+        self._process = None
+        self._stderr = None
+
+    @property
+    def position_ms(self):
+        """目前已寫入的長度（毫秒）"""
+        if not self.frame_rate:
+            return 0
+        return round(1000 * self.frames_written / self.frame_rate)
+
+    def __enter__(self):
+        return self
+
+    def _start(self):
+        from pydub import AudioSegment
+
+        command = [
+            AudioSegment.converter, "-y", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(self.frame_rate), "-ac", "1", "-i", "pipe:0",
+        ]
+        if self.codec:
+            command += ["-c:a", self.codec]
+        if self.bitrate:
+            command += ["-b:a", self.bitrate]
+        command += self.output_args
+        command += ["-f", self.format, self._tmp_path]
+        preexec_fn = None
+        if self.low_priority and hasattr(os, "nice"):
+            preexec_fn = lambda: os.nice(10)
+        # stderr 寫入暫存檔而不是管線：ffmpeg 輸出較多訊息時填滿管線緩衝區，
+        # 會與這裡對 stdin 的寫入互相等待而卡住
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr, preexec_fn=preexec_fn)
+
+    def _write(self, pcm):
+        started = time.perf_counter()
+        if self._process is None:
+            self._start()
+        self._process.stdin.write(pcm)
+        self.encode_seconds += time.perf_counter() - started
+        self.frames_written += len(pcm) // ASSEMBLY_SAMPLE_WIDTH
+
+    def append_file(self, path):
+        """
+        解碼並寫入一個片段檔，缺少或損壞的檔案會被略過
+
+        Returns:
+            寫入的長度（毫秒）
+        """
+        started = time.perf_counter()
+        try:
+            pcm, self.frame_rate = read_segment_pcm(path, self.frame_rate)
+        finally:
+            self.decode_seconds += time.perf_counter() - started
+        if pcm is None:
+            return 0
+        return self.append_pcm(pcm)
+
+    def append_pcm(self, pcm):
+        """
+        寫入已是合併格式的 PCM 位元組（取樣率為 self.frame_rate）
+
+        Returns:
+            寫入的長度（毫秒）
+        """
+        before = self.frames_written
+        self._write(pcm)
+        return round(1000 * (self.frames_written - before) / self.frame_rate)
+
+    def _stderr_tail(self, limit=4096):
+        """讀出 ffmpeg 錯誤訊息的最後 limit 個位元組並關閉暫存檔"""
+        with self._stderr:
+            size = self._stderr.seek(0, os.SEEK_END)
+            self._stderr.seek(max(0, size - limit))
+            return self._stderr.read().decode("utf-8", "ignore")
+
+    def append_silence(self, duration_ms):
+        if not self.frame_rate:
+            self.frame_rate = DEFAULT_FRAME_RATE
+        frames = int(self.frame_rate * duration_ms / 1000)
+        self._write(b"\x00" * (frames * ASSEMBLY_SAMPLE_WIDTH))
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._process is None:
+            return False
+        started = time.perf_counter()
+        self._process.stdin.close()
+        returncode = self._process.wait()
+        self.encode_seconds += time.perf_counter() - started
+        stderr = self._stderr_tail()
+        if exc_type is not None or self.frames_written == 0:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+            return False
+        if returncode != 0:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+            raise RuntimeError(f"ffmpeg 編碼失敗 ({returncode}): {stderr}")
+        os.replace(self._tmp_path, self.out_path)
+        return False
+
+
+def assemble_news_audio(news_content, all_seg_paths, out_path, low_priority=False, all_seg_texts=None):
+    """
+    將各段落的片段依序合併成單一音檔並計算字幕時間
+
+    Args:
+        news_content: 段落文字列表
+        all_seg_paths: 每個段落對應的片段檔路徑列表
+        out_path: 輸出音檔路徑
+        low_priority: 以較低的 CPU 優先權執行 ffmpeg（背景預渲染使用）
+        all_seg_texts: 每個段落對應的片段文字列表（選用），提供時字幕區塊包含句子時間
+
+    Returns:
+        (字幕區塊列表, 是否有輸出音檔)
+    """
+    subtitle_blocks = []
+    with PCMAssembler(out_path, low_priority=low_priority) as assembler:
+        for idx, paragraph in enumerate(news_content):
+            start_ms = assembler.position_ms
+            durations = [assembler.append_file(path) for path in all_seg_paths[idx]]
+            block = {
+                "index": idx + 1,
+                "start": start_ms,
+                "end": assembler.position_ms,
+                "text": paragraph
+            }
+            if all_seg_texts is not None:
+                block["sentences"] = subtitles.sentence_cues(
+                    paragraph, list(zip(all_seg_texts[idx], durations)), start_ms, block["end"]
+                )
+            subtitle_blocks.append(block)
+            assembler.append_silence(PARAGRAPH_PAUSE_MS)
+        has_audio = assembler.frames_written > 0
+    metrics.render_stage_seconds.observe(assembler.decode_seconds, stage="decode")
+    metrics.render_stage_seconds.observe(assembler.encode_seconds, stage="encode")
+    return subtitle_blocks, has_audio
+
+
+class RenderThrottle:
+    """
+    限制單一渲染同時進行的片段數（背景預渲染使用）
+
+    互動請求加入同一篇文章的背景渲染時呼叫 lift()，剩餘片段改為全速生成，
+    上游的總並行數仍由各服務的 AdaptiveLimiter 控制。
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.throttled = True
+        self.running = 0
+        self._condition = asyncio.Condition()
+
+    async def run(self, func, *args):
+        with metrics.queue_wait_seconds.time(queue="render_throttle"):
+            async with self._condition:
+                await self._condition.wait_for(lambda: not self.throttled or self.running < self.max_concurrency)
+                self.running += 1
+        try:
+            return await func(*args)
+        finally:
+            async with self._condition:
+                self.running -= 1
+                self._condition.notify_all()
+
+    async def lift(self):
+        async with self._condition:
+            self.throttled = False
+            self._condition.notify_all()
+
+
+async def render_news_audio(news_content, workdir, out_path, throttle=None):
+    """
+    在 workdir 中並行生成所有語音片段，再合併為單一音檔
+
+    Args:
+        throttle: 選用的 RenderThrottle；提供時片段生成與合併都以背景優先權進行
+
+    Returns:
+        (字幕區塊列表, 是否有輸出音檔)
+    """
+    # --- Step 1: Create all TTS generation tasks ---
+    # TTS 客戶端皆為原生 async，上游並行數由各服務的 AdaptiveLimiter 控制
+    tasks = []
+    all_seg_paths = [] # To maintain order for later audio combination
+    all_seg_texts = []
+    # 本次渲染的節省量：未規劃時每個原始片段各呼叫一次 TTS（並行的其他渲染不計入）
+    naive_calls = 0
+
+    with metrics.render_stage_seconds.time(stage="plan"):
+        for idx, paragraph in enumerate(news_content):
+            jobs, paragraph_naive_calls = plan_paragraph(paragraph, idx, workdir)
+            naive_calls += paragraph_naive_calls
+            all_seg_paths.append([path for path, _, _ in jobs])
+            all_seg_texts.append([args[0] for _, _, args in jobs])
+            if throttle is None:
+                tasks.extend(func(*args) for _, func, args in jobs)
+            else:
+                tasks.extend(throttle.run(func, *args) for _, func, args in jobs)
+    print(f"總共要處理 {len(tasks)} 個語音片段...（片段規劃節省 {naive_calls - len(tasks)} 次上游呼叫）")
+
+    # --- Step 2: Run all tasks concurrently (respecting the semaphore limit) ---
+    print(f"▶️ 開始並行處理 {len(tasks)} 個語音生成任務 (目前並行上限: 客語 {hakka_tts_module.hakka_tts_limiter.limit}, gTTS {gtts_limiter.limit})...")
+    with metrics.render_stage_seconds.time(stage="synthesize"):
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Check for errors during execution
+    failed_tasks = 0
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            # Log the exception from the task
+            print(f"❌ 任務 {i} 執行失敗: {result}")
+            failed_tasks += 1
+    
+    if failed_tasks > 0:
+        print(f"⚠️ {failed_tasks}/{len(tasks)} 個語音生成任務失敗。")
+    else:
+        print("✅ 所有語音生成任務已完成。")
+
+    # --- Step 3: Stream all segments into one encoder ---
+    # 每個片段只解碼一次並直接送入 ffmpeg，記憶體只保留單一片段，字幕時間由取樣數計算
+    with metrics.render_stage_seconds.time(stage="assemble"):
+        return await asyncio.to_thread(
+            request_profiler.bound(assemble_news_audio),
+            news_content, all_seg_paths, out_path, throttle is not None, all_seg_texts
+        )
+
+
+# --- 輸出到 output/ 的整篇音檔 ---
+
+OUTPUT_DIR = "output"
+
+# 目前進行中的整篇渲染（news_id → (task, throttle)），同一篇文章只渲染一次
+_output_renders = {}
+# 互動渲染完成後在背景進行的預先編碼
+_preencode_tasks = set()
+
+
+def output_names(news_content):
+    """整篇音檔與字幕檔的檔名（以標題命名）"""
+    safe_title = re.sub(r'[\/*?:"<>|]', "", news_content[0])
+    return f"{safe_title[:50]}.mp3", f"{safe_title[:50]}.json"
+
+
+def _output_url(path):
+    return "/" + urllib.parse.quote(path)
+
+
+def _sidecar_urls(mp3_path):
+    """與整篇音檔同名的 .srt / .vtt 網址"""
+    return {
+        "srt_url": _output_url(subtitles.sidecar_path(mp3_path, ".srt")),
+        "vtt_url": _output_url(subtitles.sidecar_path(mp3_path, ".vtt")),
+    }
+
+
+def load_rendered(news_content):
+    """
+    讀取已渲染完成的音檔與字幕
+
+    Returns:
+        status 為 "memory" 的結果字典，尚未渲染時返回 None
+    """
+    mp3_name, json_name = output_names(news_content)
+    mp3_path = os.path.join(OUTPUT_DIR, mp3_name)
+    json_path = os.path.join(OUTPUT_DIR, json_name)
+    if not (os.path.exists(mp3_path) and os.path.exists(json_path)):
+        return None
+    with open(json_path, "r", encoding="utf-8") as f:
+        subtitle_blocks = json.load(f)
+    if not subtitles.has_sidecars(mp3_path):
+        # 加入字幕檔之前渲染的音檔：以已保存的字幕區塊補寫（只有段落層級）
+        subtitles.write_sidecars(mp3_path, subtitle_blocks)
+    return {
+        "status": "memory",
+        "audio_url": _output_url(mp3_path),
+        **_sidecar_urls(mp3_path),
+        "subtitles": subtitle_blocks
+    }
+
+
+def interactive_renders():
+    """目前有互動請求在等待的渲染數，背景預取據此讓路"""
+    return sum(1 for _, throttle in _output_renders.values() if throttle is None or not throttle.throttled)
+
+
+async def _render_to_output(news_content, throttle):
+    mp3_name, json_name = output_names(news_content)
+    # 每個渲染使用自己的暫存目錄，並行的渲染不會互相覆蓋或清除片段檔
+    with metrics.render_stage_seconds.time(stage="total"), workspace.job_workspace("audio") as workdir:
+        subtitle_blocks, has_audio = await render_news_audio(
+            news_content, workdir, os.path.join(OUTPUT_DIR, mp3_name), throttle
+        )
+
+    mp3_path = os.path.join(OUTPUT_DIR, mp3_name)
+    if has_audio:
+        # 字幕檔先於 JSON 寫入：load_rendered 以 JSON 存在與否判斷渲染是否完成
+        subtitles.write_sidecars(mp3_path, subtitle_blocks)
+    workspace.write_json_atomic(os.path.join(OUTPUT_DIR, json_name), subtitle_blocks)
+
+    sidecar_urls = {"srt_url": None, "vtt_url": None}
+    if has_audio:
+        print(f"✅ 已輸出語音：{OUTPUT_DIR}/{mp3_name}")
+        audio_url = _output_url(mp3_path)
+        sidecar_urls = _sidecar_urls(mp3_path)
+        if audio_variants.PREENCODE_FORMATS:
+            if throttle is not None:
+                # 背景預渲染：變體編碼完成後才算就緒
+                await asyncio.to_thread(audio_variants.preencode, mp3_path, True)
+            else:
+                # 互動請求不等待預先編碼，其他格式的第一次請求若早於編碼完成會自行編碼
+                task = asyncio.ensure_future(asyncio.to_thread(audio_variants.preencode, mp3_path, True))
+                _preencode_tasks.add(task)
+                task.add_done_callback(_preencode_tasks.discard)
+    else:
+        audio_url = None
+        print("⚠️ 最終音檔為空，不進行匯出。")
+    return {
+        "status": "done",
+        "audio_url": audio_url,
+        **sidecar_urls,
+        "subtitles": subtitle_blocks
+    }
+
+
+async def render_to_output(news_content, background_concurrency=None):
+    """
+    將整篇新聞渲染到 output/，已渲染過時直接返回 "memory" 結果
+
+    同一篇文章同時只會有一個渲染；後到的請求等待同一個結果。
+    互動請求加入背景渲染時會解除其節流。
+
+    Args:
+        background_concurrency: 背景預渲染時每篇文章同時生成的片段數；None 表示互動請求
+    """
+    rendered = load_rendered(news_content)
+    if rendered is not None:
+        print("memory")
+        return rendered
+
+    key = workspace.news_id_for(news_content)
+    entry = _output_renders.get(key)
+    if entry is None:
+        throttle = RenderThrottle(background_concurrency) if background_concurrency else None
+        task = asyncio.ensure_future(_render_to_output(news_content, throttle))
+        _output_renders[key] = (task, throttle)
+        task.add_done_callback(lambda _: _output_renders.pop(key, None))
+    else:
+        task, throttle = entry
+        if background_concurrency is None and throttle is not None:
+            await throttle.lift()
+    # 等待者被取消時不影響共用的渲染
+    return await asyncio.shield(task)
+
+
+# --- HLS 串流輸出 ---
+
+class HLSRender:
+    """一篇新聞的 HLS 逐段渲染狀態"""
+
+    def __init__(self, key, news_content):
+        self.key = key
+        self.news_content = news_content
+        self.directory = os.path.join(HLS_ROOT, key)
+        self.subtitles = []
+        self.entries = []
+        self.done = False
+        self.error = None
+        self.first_segment = asyncio.Event()
+        self.task = None
+        # 整篇共用的取樣率（0 表示沿用第一個片段的取樣率）與已發布的取樣數
+        self.frame_rate = ASSEMBLY_FRAME_RATE
+        self.frames_written = 0
+
+    @property
+    def playlist_url(self):
+        return f"/{self.directory}/{PLAYLIST_NAME}"
+
+    @property
+    def subtitles_url(self):
+        return f"/{self.directory}/{SUBTITLES_NAME}"
+
+    def _write_atomic(self, name, content):
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def write_playlist(self):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{HLS_SEGMENT_SECONDS}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for filename, duration in self.entries:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(filename)
+        if self.done:
+            lines.append("#EXT-X-ENDLIST")
+        self._write_atomic(PLAYLIST_NAME, "\n".join(lines) + "\n")
+
+    def write_subtitles(self):
+        self._write_atomic(SUBTITLES_NAME, json.dumps(self.subtitles, ensure_ascii=False))
+
+    def status(self):
+        return {
+            "status": "done" if self.done else "streaming",
+            "playlist_url": self.playlist_url,
+            "subtitles_url": self.subtitles_url,
+            "subtitles": self.subtitles,
+        }
+
+    def _encode_paragraph(self, paths):
+        """
+        依序讀取段落的片段並接上段落停頓，切成 HLS 片段編碼（在執行緒中執行）
+
+        片段的 PCM 只串接一次（不用 AudioSegment 逐段相加），每個 HLS 片段以 PCMAssembler 編碼。
+
+        Returns:
+            (各語音片段長度毫秒, 新增的播放清單項目 [(檔名, 秒數), ...], 段落語音長度毫秒)
+        """
+        parts, durations = [], []
+        with metrics.render_stage_seconds.time(stage="decode"):
+            for path in paths:
+                pcm, self.frame_rate = read_segment_pcm(path, self.frame_rate)
+                if pcm is None:
+                    durations.append(0)
+                    continue
+                parts.append(pcm)
+                durations.append(round(1000 * len(pcm) / ASSEMBLY_SAMPLE_WIDTH / self.frame_rate))
+        if not self.frame_rate:
+            self.frame_rate = DEFAULT_FRAME_RATE
+        speech_frames = sum(len(part) for part in parts) // ASSEMBLY_SAMPLE_WIDTH
+        pause_frames = int(self.frame_rate * PARAGRAPH_PAUSE_MS / 1000)
+        pcm = b"".join(parts) + b"\x00" * (pause_frames * ASSEMBLY_SAMPLE_WIDTH)
+
+        entries = []
+        chunk_bytes = self.frame_rate * HLS_SEGMENT_SECONDS * ASSEMBLY_SAMPLE_WIDTH
+        for offset in range(0, len(pcm), chunk_bytes):
+            filename = f"seg_{len(self.entries) + len(entries):05d}.ts"
+            offset_seconds = (self.frames_written + offset // ASSEMBLY_SAMPLE_WIDTH) / self.frame_rate
+            with metrics.render_stage_seconds.time(stage="hls_encode"):
+                with PCMAssembler(
+                    os.path.join(self.directory, filename),
+                    format="mpegts",
+                    codec="aac",
+                    bitrate=HLS_AUDIO_BITRATE,
+                    frame_rate=self.frame_rate,
+                    output_args=["-output_ts_offset", f"{offset_seconds:.3f}"],
+                ) as assembler:
+                    assembler.append_pcm(pcm[offset:offset + chunk_bytes])
+            entries.append((filename, assembler.frames_written / self.frame_rate))
+        self.frames_written += len(pcm) // ASSEMBLY_SAMPLE_WIDTH
+        return durations, entries, round(1000 * speech_frames / self.frame_rate)
+
+    @property
+    def position_ms(self):
+        """已發布的長度（毫秒）"""
+        if not self.frame_rate:
+            return 0
+        return round(1000 * self.frames_written / self.frame_rate)
+
+    async def publish_paragraph(self, idx, paragraph, jobs):
+        """將一個段落已生成的片段編碼成 HLS 片段，並加入播放清單與字幕"""
+        start_ms = self.position_ms
+        durations, entries, speech_ms = await asyncio.to_thread(
+            request_profiler.bound(self._encode_paragraph), [path for path, _, _ in jobs]
+        )
+        self.entries.extend(entries)
+
+        end_ms = start_ms + speech_ms
+        self.subtitles.append({
+            "index": idx + 1,
+            "start": start_ms,
+            "end": end_ms,
+            "text": paragraph,
+            "sentences": subtitles.sentence_cues(
+                paragraph, [(args[0], duration) for (_, _, args), duration in zip(jobs, durations)],
+                start_ms, end_ms
+            ),
+        })
+        self.write_subtitles()
+        self.write_playlist()
+        if self.entries:
+            self.first_segment.set()
+
+    async def run(self):
+        with workspace.job_workspace("hls") as workdir:
+            await self._render(workdir)
+
+    @staticmethod
+    async def _synthesize(idx, jobs):
+        results = await asyncio.gather(*(func(*args) for _, func, args in jobs), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"❌ HLS 段落 {idx} 片段生成失敗: {result}")
+
+    async def _render(self, workdir):
+        os.makedirs(self.directory, exist_ok=True)
+        # 所有段落的片段一開始就全部送出（上游並行數由 AdaptiveLimiter 控制，先送出的先取得名額），
+        # 發布時依段落順序等待，第一個段落不必等其他段落，整體也不必逐段合成
+        plans = [plan_paragraph(paragraph, idx, workdir)[0] for idx, paragraph in enumerate(self.news_content)]
+        synthesis = [asyncio.ensure_future(self._synthesize(idx, jobs)) for idx, jobs in enumerate(plans)]
+        try:
+            for idx, (paragraph, jobs) in enumerate(zip(self.news_content, plans)):
+                with metrics.render_stage_seconds.time(stage="synthesize"):
+                    await synthesis[idx]
+                await self.publish_paragraph(idx, paragraph, jobs)
+                print(f"📡 HLS 已發布段落 {idx + 1}/{len(self.news_content)}")
+
+            self.done = True
+            self.write_playlist()
+            print(f"✅ HLS 渲染完成：{self.directory}")
+        except Exception as e:
+            self.error = e
+            print(f"❌ HLS 渲染失敗 ({self.key}): {e}")
+        finally:
+            # 失敗或被取消時不再生成剩餘段落（暫存目錄即將刪除）
+            for task in synthesis:
+                task.cancel()
+            await asyncio.gather(*synthesis, return_exceptions=True)
+            # 讓等待第一個片段的請求不會永遠卡住
+            self.first_segment.set()
+
+
+_hls_renders = {}
+
+
+async def start_hls_render(news_content):
+    """
+    啟動（或重用）一篇新聞的 HLS 渲染，等到第一個片段可播放後返回
+
+    Returns:
+        包含 playlist_url、subtitles_url 與目前字幕區塊的字典
+    """
+    key = workspace.news_id_for(news_content)
+    render = _hls_renders.get(key)
+
+    if render is None:
+        render = HLSRender(key, news_content)
+        playlist_path = os.path.join(render.directory, PLAYLIST_NAME)
+        subtitles_path = os.path.join(render.directory, SUBTITLES_NAME)
+        if os.path.exists(playlist_path) and os.path.exists(subtitles_path):
+            with open(playlist_path, "r", encoding="utf-8") as f:
+                finished = "#EXT-X-ENDLIST" in f.read()
+            if finished:
+                print("memory")
+                with open(subtitles_path, "r", encoding="utf-8") as f:
+                    render.subtitles = json.load(f)
+                result = render.status()
+                result["status"] = "memory"
+                return result
+
+        _hls_renders[key] = render
+        render.task = asyncio.create_task(render.run())
+        # 渲染結束（完成或失敗）即移出登記表：完成的渲染之後由磁碟上的播放清單提供，
+        # 失敗的渲染讓下一個請求重新開始
+        render.task.add_done_callback(lambda _: _forget_hls_render(key, render))
+
+    await render.first_segment.wait()
+    if render.error is not None:
+        raise render.error
+    return render.status()
+
+
+def _forget_hls_render(key, render):
+    if _hls_renders.get(key) is render:
+        del _hls_renders[key]
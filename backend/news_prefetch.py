@@ -0,0 +1,144 @@
+"""
+新聞背景預取與預渲染
+定期抓取新聞列表，將前 N 篇文章的語音與字幕預先渲染到 output/，
+讓 /api/audio 多數情況下直接命中已完成的檔案
+"""
+
+import asyncio
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+import news_audio
+import news_scraper
+import workspace
+
+# 載入環境變數
+load_dotenv()
+
+# 是否啟用背景預取（預設關閉；需要上游帳號的正式部署在 .env 或 docker-compose 中開啟）
+PREFETCH_ENABLED = os.getenv("NEWS_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+# 每輪預取的間隔（秒）
+PREFETCH_INTERVAL = int(os.getenv("NEWS_PREFETCH_INTERVAL", "900"))
+# 每輪預渲染的文章數（取新聞列表最前面的 N 篇）
+PREFETCH_ARTICLE_COUNT = int(os.getenv("NEWS_PREFETCH_ARTICLE_COUNT", "5"))
+# 每篇文章同時生成的語音片段數，互動請求不受此限制
+PREFETCH_MAX_CONCURRENCY = int(os.getenv("NEWS_PREFETCH_MAX_CONCURRENCY", "1"))
+# 每輪最多花費的時間（秒），超過時留待下一輪
+PREFETCH_MAX_SECONDS = int(os.getenv("NEWS_PREFETCH_MAX_SECONDS", "600"))
+# /api/news 優先從已預渲染文章中挑選的機率；其餘情況仍從全部候選中挑選，
+# 避免預取的文章數少於候選數時，使用者只會聽到固定幾篇
+PREFETCH_PREFER_READY = float(os.getenv("NEWS_PREFETCH_PREFER_READY", "0.5"))
+# 有互動渲染進行中時，每隔幾秒檢查一次是否可以繼續
+PREFETCH_YIELD_SECONDS = 5
+
+
+class NewsPrefetcher:
+    """背景預取工作"""
+
+    def __init__(self):
+        # 已預渲染完成的文章：網址 → news_id
+        self.ready = {}
+        self.last_run = None
+        self.last_error = None
+        self.rendered_count = 0
+        self._task = None
+
+    def ready_in(self, urls):
+        """返回 urls 中已預渲染完成的文章（網址 → news_id）"""
+        return {url: self.ready[url] for url in urls if url in self.ready}
+
+    def choose(self, candidates):
+        """
+        從候選文章中隨機挑選一篇，以 PREFETCH_PREFER_READY 的機率限定在已預渲染的文章中
+
+        Returns:
+            (網址, news_id)；挑中的文章尚未預渲染時 news_id 為 None
+        """
+        ready = self.ready_in(candidates)
+        if ready and random.random() < PREFETCH_PREFER_READY:
+            url = random.choice(list(ready))
+        else:
+            url = random.choice(candidates)
+        return url, ready.get(url)
+
+    def start(self):
+        if not PREFETCH_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        print(f"📰 新聞背景預取已啟動（每 {PREFETCH_INTERVAL} 秒，前 {PREFETCH_ARTICLE_COUNT} 篇）")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ 新聞背景預取失敗: {e}")
+            await asyncio.sleep(PREFETCH_INTERVAL)
+
+    async def _wait_for_idle(self):
+        """互動請求正在渲染時先讓路"""
+        while news_audio.interactive_renders() > 0:
+            await asyncio.sleep(PREFETCH_YIELD_SECONDS)
+
+    async def run_once(self):
+        """執行一輪預取：抓取列表、逐篇抓取文章並預渲染"""
+        started = time.monotonic()
+        links = await asyncio.to_thread(news_scraper.fetch_news_links)
+        targets = links[:PREFETCH_ARTICLE_COUNT]
+        ready = {}
+
+        for url in targets:
+            if time.monotonic() - started > PREFETCH_MAX_SECONDS:
+                print("⏱️ 新聞背景預取已達本輪時間上限，剩餘文章留待下一輪")
+                break
+            await self._wait_for_idle()
+            try:
+                news_content = await asyncio.to_thread(news_scraper.fetch_article, url)
+                # 不改變「最近一次抓取的文章」，未帶 news_id 的 /api/audio 仍播放使用者看到的文章
+                news_id = workspace.news_store.save(news_content, track_latest=False)
+                result = await news_audio.render_to_output(news_content, background_concurrency=PREFETCH_MAX_CONCURRENCY)
+                if result.get("audio_url"):
+                    ready[url] = news_id
+                    if result["status"] == "done":
+                        self.rendered_count += 1
+            except Exception as e:
+                print(f"⚠️ 預渲染文章失敗 {url}: {e}")
+
+        # 只保留仍在列表前段的文章
+        self.ready = {url: news_id for url, news_id in {**self.ready, **ready}.items() if url in targets}
+        self.last_run = time.time()
+        print(f"📰 新聞背景預取完成：{len(self.ready)}/{len(targets)} 篇可直接播放")
+
+    def status(self):
+        return {
+            "enabled": PREFETCH_ENABLED,
+            "running": self._task is not None,
+            "interval": PREFETCH_INTERVAL,
+            "article_count": PREFETCH_ARTICLE_COUNT,
+            "prefer_ready": PREFETCH_PREFER_READY,
+            "ready": len(self.ready),
+            "rendered_count": self.rendered_count,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
+
+
+# 全域預取實例
+news_prefetcher = NewsPrefetcher()
@@ -0,0 +1,205 @@
+"""
+ETtoday 新聞抓取
+/api/news 與背景預取共用的新聞列表與文章解析
+
+- 長駐的連線池，重複抓取時沿用 TCP/TLS 連線
+- 列表頁與文章的解析結果快取 TTL 秒；過期後以 ETag / If-Modified-Since 發送條件請求，
+  伺服器回應 304 時沿用上次的解析結果
+- 解析時以 SoupStrainer 只建立需要的節點
+- bs4 在第一次解析時才載入，不拖慢服務啟動
+"""
+
+import collections
+import functools
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# 固定使用 html.parser：lxml 會自動關閉未結束的 <p>，段落切分與改寫前的結果不同
+HTML_PARSER = "html.parser"
+
+# 載入環境變數
+load_dotenv()
+
+NEWS_LIST_URL = 'https://www.ettoday.net/news/news-list.htm'
+REQUEST_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+REQUEST_TIMEOUT = 10
+
+# 列表頁與文章解析結果的快取秒數
+NEWS_LIST_TTL = int(os.getenv("NEWS_LIST_TTL", "60"))
+NEWS_ARTICLE_TTL = int(os.getenv("NEWS_ARTICLE_TTL", "1800"))
+# 快取的文章數上限
+NEWS_ARTICLE_CACHE_SIZE = int(os.getenv("NEWS_ARTICLE_CACHE_SIZE", "100"))
+
+def _has_class(attrs, name):
+    value = attrs.get("class") or ""
+    classes = value.split() if isinstance(value, str) else value
+    return name in classes
+
+
+def _article_nodes(tag_name, attrs):
+    # 文章頁只需要標題、時間與內文；time 全部保留，維持「第一個 time 標籤」的原本語意
+    return (
+        tag_name == "time"
+        or (tag_name == "h1" and _has_class(attrs, "title"))
+        or (tag_name == "div" and _has_class(attrs, "story"))
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _strainers():
+    """(列表頁, 文章頁) 的 SoupStrainer；列表頁只需要 div.part_list_2"""
+    from bs4 import SoupStrainer
+
+    return SoupStrainer("div", class_="part_list_2"), SoupStrainer(_article_nodes)
+
+
+def parse_news_links(html):
+    """
+    解析新聞列表頁
+
+    Returns:
+        依列表順序排列的文章網址（最新的在前）
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_strainers()[0])
+    return [a['href'] for a in soup.select('div.part_list_2 a') if '/news/' in a.get('href', '') and a['href'].startswith('https://')]
+
+
+def parse_article(html):
+    """
+    解析單篇文章
+
+    Returns:
+        [標題, 時間, 段落1, 段落2, ...]
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_strainers()[1])
+
+    title = soup.find('h1', class_='title').text.strip()
+    published = soup.find('time').text.strip()
+    content_div = soup.find('div', class_='story')
+    paragraphs = content_div.find_all('p')
+
+    news_content = [title, published]
+    for p in paragraphs:
+        for strong in p.find_all('strong'):
+            strong.extract()
+        for a in p.find_all('a'):
+            a.extract()
+        text = p.get_text(strip=True)
+        if text:
+            news_content.append(text)
+    return news_content
+
+
+# 快取項目：解析結果與條件請求所需的驗證資訊
+_CacheEntry = collections.namedtuple("_CacheEntry", ["value", "etag", "last_modified", "fetched_at"])
+
+
+def _make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class CachedFetcher:
+    """
+    帶 TTL 與條件請求的頁面抓取器，快取的是解析後的結果
+
+    Args:
+        name: 監控指標中的名稱（例如 "list"、"article"）
+        session: 共用的 requests.Session
+        parse: 將 HTML 文字轉為結果的函式
+        ttl: 快取有效秒數，期間內不發送任何請求
+        max_entries: 快取項目上限，超過時淘汰最久未使用的
+    """
+
+    def __init__(self, name, session, parse, ttl, max_entries=100):
+        self.name = name
+        self.session = session
+        self.parse = parse
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    def fetch(self, url):
+        with self._lock:
+            entry = self._cache.get(url)
+            if entry is not None:
+                self._cache.move_to_end(url)
+                if time.time() - entry.fetched_at < self.ttl:
+                    self.hits += 1
+                    return entry.value
+
+        headers = dict(REQUEST_HEADERS)
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        with metrics.track_upstream("ettoday", self.name) as call:
+            res = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT, verify=False)
+            call.status = res.status_code
+        if res.status_code == 304 and entry is not None:
+            value = entry.value
+            with self._lock:
+                self.not_modified += 1
+        else:
+            res.raise_for_status()
+            value = self.parse(res.text)
+            with self._lock:
+                self.misses += 1
+
+        with self._lock:
+            self._cache[url] = _CacheEntry(
+                value,
+                res.headers.get('ETag') or (entry.etag if entry else None),
+                res.headers.get('Last-Modified') or (entry.last_modified if entry else None),
+                time.time(),
+            )
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "not_modified": self.not_modified,
+                "misses": self.misses,
+            }
+
+
+# 列表頁與文章共用同一個連線池
+session = _make_session()
+list_fetcher = CachedFetcher("list", session, parse_news_links, NEWS_LIST_TTL, max_entries=1)
+article_fetcher = CachedFetcher("article", session, parse_article, NEWS_ARTICLE_TTL, max_entries=NEWS_ARTICLE_CACHE_SIZE)
+
+
+def fetch_news_links():
+    """抓取新聞列表頁（NEWS_LIST_TTL 秒內重用上次的結果）"""
+    # 返回副本，呼叫端修改不影響快取
+    return list(list_fetcher.fetch(NEWS_LIST_URL))
+
+
+def fetch_article(news_url):
+    """抓取並解析單篇文章（NEWS_ARTICLE_TTL 秒內重用上次的結果）"""
+    return list(article_fetcher.fetch(news_url))
@@ -0,0 +1,335 @@
+"""
+單一請求的效能分析
+管理員在請求上附帶 X-Profile-Token 標頭（或 ?profile=<token>）時，只針對該請求：
+
+- 定時取樣堆疊：事件迴圈正在執行此請求的 task 時、以及執行緒池替此請求工作時
+  （執行緒的樣本以牆鐘時間計，包含等待上游回應的時間）
+- 記錄上游呼叫、排隊等待與渲染階段的時間軸（來自 metrics 的計時點）
+
+結束後將報告寫入 PROFILE_REPORT_DIR，可由 /api/profiles/{profile_id} 取回。
+未設定 PROFILE_ADMIN_TOKEN 時不安裝 middleware；未啟用分析的請求只多一次 ContextVar 讀取。
+"""
+
+import asyncio
+import collections
+import contextvars
+import functools
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+from dotenv import load_dotenv
+
+# 載入環境變數
+load_dotenv()
+
+# 啟用分析所需的管理員 token，未設定時停用此功能
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+# 堆疊取樣間隔（毫秒）
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# 報告存放目錄（不在公開的 output/ 之下）與保留份數
+PROFILE_REPORT_DIR = os.getenv("PROFILE_REPORT_DIR", "cache/profiles")
+PROFILE_KEEP_LIMIT = int(os.getenv("PROFILE_KEEP_LIMIT", "50"))
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_QUERY_PARAM = "profile"
+# 每個堆疊樣本保留的最大層數
+MAX_STACK_DEPTH = 64
+
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+def authorized(token):
+    return bool(PROFILE_ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+class RequestProfile:
+    """一個請求的堆疊樣本與時間軸"""
+
+    def __init__(self, method, path, query):
+        self.profile_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.query = query
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status_code = None
+        self.spans = []
+        self.samples = collections.Counter()
+        self.sample_count = 0
+        # 事件迴圈：只在執行此請求的 task 時取樣
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.root_task = asyncio.current_task()
+        # 目前替此請求工作的執行緒 → 巢狀層數
+        self._threads = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, kind, name, started, ended, status=None):
+        span = {
+            "kind": kind,
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 2),
+            "duration_ms": round((ended - started) * 1000, 2),
+            "thread": threading.current_thread().name,
+        }
+        if status is not None:
+            span["status"] = status
+        with self._lock:
+            self.spans.append(span)
+
+    def enter_thread(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+
+    def exit_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def _owns_loop_task(self):
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            return False
+        get_context = getattr(task, "get_context", None)
+        if get_context is None:
+            # Python 3.11 以前無法讀取 task 的 context，只計入請求本身的 task
+            return task is self.root_task
+        return get_context().get(_current) is self
+
+    def sample(self, frames):
+        with self._lock:
+            threads = list(self._threads)
+        if self._owns_loop_task():
+            threads.append(self.loop_thread)
+        for ident in threads:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.reverse()
+            with self._lock:
+                self.samples[";".join(stack)] += 1
+                self.sample_count += 1
+
+    def report(self):
+        with self._lock:
+            samples = dict(self.samples)
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        # 每個函式出現在多少樣本中（total）與位於堆疊頂端的次數（self）
+        total = collections.Counter()
+        own = collections.Counter()
+        for stack, count in samples.items():
+            functions = stack.split(";")
+            for function in set(functions):
+                total[function] += count
+            own[functions[-1]] += count
+        interval = PROFILE_SAMPLE_INTERVAL_MS
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status_code": self.status_code,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "sample_interval_ms": interval,
+            "sample_count": self.sample_count,
+            "sampled_ms": round(self.sample_count * interval, 1),
+            "top_self": [{"function": f, "samples": n} for f, n in own.most_common(30)],
+            "top_total": [{"function": f, "samples": n} for f, n in total.most_common(30)],
+            "spans": spans,
+            # flamegraph.pl / speedscope 可直接讀取的 folded stacks
+            "folded": [f"{stack} {count}" for stack, count in sorted(samples.items())],
+        }
+
+
+def record_span(kind, name, started, ended, status=None):
+    """metrics 的計時點呼叫：有進行中的分析時記錄一筆時間軸"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add_span(kind, name, started, ended, status)
+
+
+def bound(func):
+    """
+    包裝要交給其他執行緒執行的函式，執行期間該執行緒的樣本與時間軸計入目前的分析
+
+    未啟用分析時直接返回原函式
+    """
+    profile = _current.get()
+    if profile is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(profile)
+        profile.enter_thread()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.exit_thread()
+            _current.reset(token)
+    return wrapper
+
+
+class _Sampler:
+    """所有進行中分析共用的取樣執行緒，沒有分析時自動結束"""
+
+    def __init__(self):
+        self.active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile):
+        with self._lock:
+            self.active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile):
+        with self._lock:
+            self.active.discard(profile)
+
+    def _run(self):
+        interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+                profiles = list(self.active)
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+            del frames
+            time.sleep(interval)
+
+
+_sampler = _Sampler()
+
+
+def _report_path(profile_id):
+    return os.path.join(PROFILE_REPORT_DIR, f"{profile_id}.json")
+
+
+def _save(profile):
+    os.makedirs(PROFILE_REPORT_DIR, exist_ok=True)
+    path = _report_path(profile.profile_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile.report(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+    reports = sorted(
+        (entry for entry in os.scandir(PROFILE_REPORT_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in reports[:max(0, len(reports) - PROFILE_KEEP_LIMIT)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def load_report(profile_id):
+    """
+    Raises:
+        FileNotFoundError: 報告不存在（或已被清除）
+    """
+    if not profile_id.isalnum():
+        raise FileNotFoundError(profile_id)
+    with open(_report_path(profile_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_reports():
+    """最近的報告摘要（新的在前）"""
+    try:
+        entries = sorted(
+            (entry for entry in os.scandir(PROFILE_REPORT_DIR) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+    except FileNotFoundError:
+        return []
+    summaries = []
+    for entry in entries:
+        try:
+            with open(entry.path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summaries.append({key: report.get(key) for key in
+                          ("profile_id", "method", "path", "status_code", "created_at", "duration_ms", "sample_count")})
+    return summaries
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware：對 paths 中的端點，帶有正確管理員 token 的請求會被分析
+
+    回應標頭 X-Profile-Id 為報告識別碼，以 GET /api/profiles/{id} 取回
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    @staticmethod
+    def _token(scope):
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER.encode("latin-1"):
+                return value.decode("latin-1")
+        query = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        values = query.get(PROFILE_QUERY_PARAM)
+        return values[0] if values else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or not authorized(self._token(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        # 報告中不保存 token
+        query = {
+            key: values for key, values in
+            urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1")).items()
+            if key != PROFILE_QUERY_PARAM
+        }
+        profile = RequestProfile(scope["method"], scope["path"], query)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile.profile_id.encode())],
+                }
+            await send(message)
+
+        token = _current.set(profile)
+        _sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _sampler.remove(profile)
+            _current.reset(token)
+            profile.duration = time.perf_counter() - profile.started
+            try:
+                await asyncio.to_thread(_save, profile)
+                print(f"🔬 已儲存請求分析報告 {profile.profile_id}（{scope['path']}，{profile.duration:.2f}s，{profile.sample_count} 個樣本）")
+            except OSError as e:
+                print(f"⚠️ 儲存請求分析報告失敗: {e}")
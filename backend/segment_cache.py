@@ -0,0 +1,189 @@
+"""
+語音片段快取
+以 (正規化文字, 引擎, 聲音, 語速) 的雜湊作為內容位址，每個片段在磁碟上只存一份，
+/api/audio、/api/tts 與各工作目錄透過硬連結取用，避免重複呼叫上游 TTS。
+命中時更新檔案的修改時間，超過容量或數量上限時依修改時間淘汰最久未使用的片段。
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import unicodedata
+import uuid
+
+from dotenv import load_dotenv
+
+# 載入環境變數
+load_dotenv()
+
+
+def normalize_text(text):
+    """統一 Unicode 形式並壓縮空白，讓只差在空白的片段共用同一份音檔"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def _link_or_copy(src, dest):
+    """優先使用硬連結（不佔額外空間），跨檔案系統時改為複製"""
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class SegmentAudioCache:
+    """內容定址的語音片段快取"""
+
+    # 每存入這麼多個片段就檢查一次容量（服務啟動後的第一次存入也會檢查）
+    PRUNE_CHECK_INTERVAL = 100
+
+    def __init__(self, root, max_bytes=0, max_entries=0):
+        self.root = root
+        # 0 表示不限制
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._stores_since_prune = self.PRUNE_CHECK_INTERVAL
+        self._pruning = False
+
+    @staticmethod
+    def make_key(text, engine, voice, speaking_rate):
+        raw = "\x1f".join([normalize_text(text), engine, voice, str(speaking_rate)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path_for(self, key, ext):
+        return os.path.join(self.root, key[:2], f"{key}{ext}")
+
+    def fetch(self, key, out_path):
+        """
+        命中時將快取的音檔連結到 out_path
+
+        Returns:
+            是否命中
+        """
+        ext = os.path.splitext(out_path)[1]
+        cached_path = self.path_for(key, ext)
+        try:
+            if os.path.getsize(cached_path) > 0:
+                _link_or_copy(cached_path, out_path)
+                # 以修改時間記錄最近使用（atime 常因 noatime/relatime 掛載選項而不更新）
+                os.utime(cached_path)
+                with self._lock:
+                    self.hits += 1
+                return True
+        except OSError:
+            pass
+        with self._lock:
+            self.misses += 1
+        return False
+
+    def store(self, key, src_path):
+        """將剛生成的片段存入快取（已存在則略過）"""
+        ext = os.path.splitext(src_path)[1]
+        cached_path = self.path_for(key, ext)
+        if os.path.exists(cached_path):
+            return
+        try:
+            if os.path.getsize(src_path) == 0:
+                return
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            tmp_path = f"{cached_path}.{uuid.uuid4().hex[:8]}.tmp"
+            _link_or_copy(src_path, tmp_path)
+            os.replace(tmp_path, cached_path)
+        except OSError as e:
+            print(f"⚠️ 寫入語音片段快取失敗: {e}")
+            return
+        self._schedule_prune()
+
+    def _schedule_prune(self):
+        """定期在背景執行緒檢查容量，掃描目錄不占用呼叫端（可能是事件迴圈）"""
+        if not (self.max_bytes or self.max_entries):
+            return
+        with self._lock:
+            self._stores_since_prune += 1
+            if self._pruning or self._stores_since_prune < self.PRUNE_CHECK_INTERVAL:
+                return
+            self._stores_since_prune = 0
+            self._pruning = True
+        threading.Thread(target=self._prune_in_background, name="segment-cache-prune", daemon=True).start()
+
+    def _prune_in_background(self):
+        try:
+            self.prune()
+        except Exception as e:
+            print(f"⚠️ 清理語音片段快取失敗: {e}")
+        finally:
+            with self._lock:
+                self._pruning = False
+
+    def prune(self):
+        """
+        超過 max_bytes 或 max_entries 時，依修改時間刪除最久未使用的片段
+
+        Returns:
+            刪除的片段數
+        """
+        entries = []
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.root) if entry.is_dir()]
+        except FileNotFoundError:
+            return 0
+        for subdir in subdirs:
+            try:
+                for entry in os.scandir(subdir):
+                    if entry.name.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+
+        total_bytes = sum(size for _, size, _ in entries)
+        count = len(entries)
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            over_bytes = self.max_bytes and total_bytes > self.max_bytes
+            over_entries = self.max_entries and count > self.max_entries
+            if not (over_bytes or over_entries):
+                break
+            try:
+                # 已連結到工作目錄或 output/ 的檔案不受影響（硬連結）
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            count -= 1
+            removed += 1
+        if removed:
+            with self._lock:
+                self.evictions += removed
+            print(f"🧹 語音片段快取已淘汰 {removed} 個片段（剩餘 {count} 個，{total_bytes / 1024 / 1024:.1f} MB）")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# 全域語音片段快取實例
+segment_cache = SegmentAudioCache(
+    os.getenv("SEGMENT_CACHE_DIR", "cache/segments"),
+    max_bytes=int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+    max_entries=int(os.getenv("SEGMENT_CACHE_MAX_ENTRIES", "0")),
+)
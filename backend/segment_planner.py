@@ -0,0 +1,117 @@
+"""
+語音片段規劃
+在 split_smart_segments 的切分結果上決定每個片段使用的 TTS，並盡量減少上游呼叫次數：
+
+- 客語聲音可以直接念出的短英文縮寫（例如 "AI"、"5G"）保留在客語片段中，不另外送 gTTS
+- 只有標點的片段併入下一個片段
+- 相鄰且使用同一個 TTS 的片段合併，直到達到長度上限
+
+每次呼叫 TTS 的固定成本遠高於多念幾個字，因此片段越少整體延遲越低。
+"""
+
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+import hakka_tts_module
+
+# 載入環境變數
+load_dotenv()
+
+ENGINE_HAKKA = "hakka"
+ENGINE_GTTS = "gtts"
+
+# 合併後單一片段的字元數上限
+SEGMENT_MAX_CHARS = int(os.getenv("TTS_SEGMENT_MAX_CHARS", "150"))
+# 保留在客語片段中的英文縮寫長度上限（0 表示一律送 gTTS）
+HAKKA_INLINE_LATIN_MAX = int(os.getenv("HAKKA_INLINE_LATIN_MAX", "3"))
+
+_ASCII_LETTER_RE = re.compile(r'[a-zA-Z]')
+# 標點與空白（不含數字，數字是要念出來的）
+_SILENT_CHARS = " ，。'\",():!?.（）、&「」\t\r\n"
+_INLINE_LATIN_RE = re.compile(r'[A-Z][A-Z0-9]*|[0-9]+[A-Z][A-Z0-9]*')
+
+
+def _is_silent(segment):
+    return not segment.strip(_SILENT_CHARS)
+
+
+def _engine_for(segment):
+    if not _ASCII_LETTER_RE.search(segment):
+        return ENGINE_HAKKA
+    token = segment.strip(_SILENT_CHARS)
+    if len(token) <= HAKKA_INLINE_LATIN_MAX and _INLINE_LATIN_RE.fullmatch(token):
+        return ENGINE_HAKKA
+    return ENGINE_GTTS
+
+
+class _PlannerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.paragraphs = 0
+        self.naive_calls = 0
+        self.planned_calls = 0
+
+    def record(self, naive_calls, planned_calls):
+        with self._lock:
+            self.paragraphs += 1
+            self.naive_calls += naive_calls
+            self.planned_calls += planned_calls
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "paragraphs": self.paragraphs,
+                "naive_calls": self.naive_calls,
+                "planned_calls": self.planned_calls,
+                "calls_saved": self.naive_calls - self.planned_calls,
+            }
+
+
+planner_stats = _PlannerStats()
+
+
+class SegmentPlan(list):
+    """plan_segments 的結果，naive_calls 為規劃前（每個原始片段各呼叫一次 TTS）的呼叫次數"""
+
+    def __init__(self, planned, naive_calls):
+        super().__init__(planned)
+        self.naive_calls = naive_calls
+
+
+def plan_segments(text, max_chars=None):
+    """
+    規劃一段文字的 TTS 片段
+
+    Args:
+        text: 段落文字
+        max_chars: 合併後的片段長度上限，預設讀取 TTS_SEGMENT_MAX_CHARS；
+                   單一原始片段超過上限時維持原樣，不會被切開
+
+    Returns:
+        SegmentPlan：[(片段文字, ENGINE_HAKKA 或 ENGINE_GTTS), ...]，順序即播放順序
+    """
+    if max_chars is None:
+        max_chars = SEGMENT_MAX_CHARS
+    raw_segments = hakka_tts_module.split_smart_segments(text)
+
+    planned = []
+    prefix = ""
+    for segment in raw_segments:
+        if _is_silent(segment):
+            prefix += segment
+            continue
+        segment = prefix + segment
+        prefix = ""
+        engine = _engine_for(segment)
+        if planned and planned[-1][1] == engine and len(planned[-1][0]) + len(segment) <= max_chars:
+            planned[-1][0] += segment
+        else:
+            planned.append([segment, engine])
+    if prefix and planned:
+        planned[-1][0] += prefix
+
+    planner_stats.record(len(raw_segments), len(planned))
+    return SegmentPlan([(segment, engine) for segment, engine in planned], len(raw_segments))
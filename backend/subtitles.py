@@ -0,0 +1,191 @@
+"""
+句子層級的字幕時間軸與 SRT / WebVTT 輸出
+段落中的每個語音片段長度已知（合併時寫入的取樣數，或 audio_headers 從標頭讀出），
+片段內依可發音字元數線性分配時間，再依句尾標點切成句子，不需要另外解碼音檔。
+一個句子可以跨越多個片段（例如中間夾著送 gTTS 的英文），一個片段也可以包含多個句子。
+
+字幕區塊（output/<標題>.json）維持段落層級，句子放在每個區塊的 "sentences" 中；
+.srt 與 .vtt 與整篇 MP3 同名，放在同一個目錄。
+"""
+
+import os
+import re
+import tempfile
+
+from dotenv import load_dotenv
+
+import hakka_tts_module
+
+# 載入環境變數
+load_dotenv()
+
+# 單一字幕超過此字元數時再依逗號切開（0 表示不切）
+SUBTITLE_MAX_CHARS = int(os.getenv("SUBTITLE_MAX_CHARS", "40"))
+
+# 句尾標點（可接引號或括號）、後面接空白的英文句點，或換行
+_SENTENCE_RE = re.compile(r'.*?(?:[。！？!?；;…]+[」』”’）)"\']*|\.(?=\s|$)|\n|$)', re.S)
+_CLAUSE_BREAK_CHARS = "，、,："
+
+
+def _weight(ch):
+    """標點與空白不發音，不分配時間"""
+    return 1 if ch.isalnum() else 0
+
+
+def split_sentences(text):
+    """
+    將段落切成句子
+
+    Returns:
+        [(開始索引, 結束索引), ...]，已去除前後空白，不包含空句
+    """
+    spans = []
+    for match in _SENTENCE_RE.finditer(text):
+        start, end = match.start(), match.end()
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.extend(_split_long(text, start, end))
+    return spans
+
+
+def _split_long(text, start, end):
+    """過長的句子在逗號處切開，每段盡量不超過 SUBTITLE_MAX_CHARS"""
+    if not SUBTITLE_MAX_CHARS or end - start <= SUBTITLE_MAX_CHARS:
+        return [(start, end)]
+    pieces = []
+    piece_start, last_break = start, None
+    for pos in range(start, end):
+        if text[pos] in _CLAUSE_BREAK_CHARS:
+            last_break = pos + 1
+        if pos + 1 - piece_start > SUBTITLE_MAX_CHARS and last_break and last_break > piece_start:
+            pieces.append((piece_start, last_break))
+            piece_start, last_break = last_break, None
+    pieces.append((piece_start, end))
+    return [(a, b) for a, b in pieces if text[a:b].strip()]
+
+
+def _segment_spans(paragraph, segment_texts):
+    """找出每個片段在段落中的位置（片段文字依序是段落的子序列，規劃時可能略過純空白）"""
+    spans = []
+    cursor = 0
+    for text in segment_texts:
+        first = last = None
+        for ch in text:
+            pos = paragraph.find(ch, cursor)
+            if pos < 0:
+                break
+            if first is None:
+                first = pos
+            last, cursor = pos, pos + 1
+        spans.append((first, last + 1) if first is not None else None)
+    return spans
+
+
+def _boundary_times(paragraph, segments, start_ms):
+    """每個字元邊界（0..len）對應的時間點（毫秒）"""
+    times = [start_ms] * (len(paragraph) + 1)
+    spans = _segment_spans(paragraph, [text for text, _ in segments])
+    t = start_ms
+    filled = 0
+    for (_, duration), span in zip(segments, spans):
+        if span is None:
+            t += duration
+            continue
+        a, b = span
+        for k in range(filled, a + 1):
+            times[k] = t
+        weights = [_weight(ch) for ch in paragraph[a:b]]
+        total = sum(weights)
+        if not total:
+            weights, total = [1] * (b - a), b - a
+        done = 0
+        for offset, weight in enumerate(weights):
+            done += weight
+            times[a + offset + 1] = t + duration * done / total
+        filled = b + 1
+        t += duration
+    for k in range(filled, len(paragraph) + 1):
+        times[k] = t
+    return times
+
+
+def sentence_cues(paragraph, segments, start_ms, end_ms=None):
+    """
+    計算段落中每個句子的時間
+
+    Args:
+        paragraph: 段落文字
+        segments: [(片段文字, 片段長度毫秒), ...]，順序即播放順序
+        start_ms: 段落開始的時間
+        end_ms: 段落實際結束的時間（選用），句子時間不會超過此值
+
+    Returns:
+        [{"start", "end", "text"}, ...]
+    """
+    times = _boundary_times(paragraph, segments, start_ms)
+    cues = []
+    for a, b in split_sentences(paragraph):
+        start, end = round(times[a]), round(times[b])
+        if end_ms is not None:
+            start, end = min(start, end_ms), min(end, end_ms)
+        if end > start:
+            cues.append({"start": start, "end": end, "text": paragraph[a:b]})
+    return cues
+
+
+def iter_cues(subtitle_blocks):
+    """依序產生 (開始, 結束, 文字)；有句子時間時使用句子，否則使用整個段落"""
+    for block in subtitle_blocks:
+        sentences = block.get("sentences")
+        for cue in sentences if sentences else [block]:
+            if cue["end"] > cue["start"]:
+                yield cue["start"], cue["end"], " ".join(cue["text"].split())
+
+
+def to_srt(subtitle_blocks):
+    lines = []
+    for number, (start, end, text) in enumerate(iter_cues(subtitle_blocks), 1):
+        lines += [str(number), f"{hakka_tts_module.to_srt_time(start)} --> {hakka_tts_module.to_srt_time(end)}", text, ""]
+    return "\n".join(lines)
+
+
+def to_vtt(subtitle_blocks):
+    lines = ["WEBVTT", ""]
+    for start, end, text in iter_cues(subtitle_blocks):
+        # "-->" 在 WebVTT 的字幕文字中不合法
+        lines += [
+            f"{hakka_tts_module.to_srt_time(start, '.')} --> {hakka_tts_module.to_srt_time(end, '.')}",
+            text.replace("-->", "→"),
+            "",
+        ]
+    return "\n".join(lines)
+
+
+SIDECAR_FORMATS = {".srt": to_srt, ".vtt": to_vtt}
+
+
+def sidecar_path(audio_path, ext):
+    """與音檔同名的字幕檔路徑，例如 output/標題.mp3 → output/標題.srt"""
+    return os.path.splitext(audio_path)[0] + ext
+
+
+def has_sidecars(audio_path):
+    return all(os.path.exists(sidecar_path(audio_path, ext)) for ext in SIDECAR_FORMATS)
+
+
+def write_sidecars(audio_path, subtitle_blocks):
+    """寫入音檔旁的 .srt 與 .vtt（先寫暫存檔再換名）"""
+    directory = os.path.dirname(audio_path) or "."
+    for ext, render in SIDECAR_FORMATS.items():
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(render(subtitle_blocks))
+            os.replace(tmp_path, sidecar_path(audio_path, ext))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 測試直接匯入 backend/ 下的模組（與 uvicorn main:app 相同的匯入方式）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+"""
+新聞解析的黃金比對
+news_scraper（SoupStrainer）的解析結果必須與改寫前解析完整頁面的實作（benchmarks/reference_news.py）完全相同，
+包含保存的 ETtoday 頁面，以及未結束的 <p>、多餘空白、巢狀內文等容易因解析方式而不同的標記。
+"""
+
+import os
+
+import pytest
+
+import news_scraper
+from benchmarks import reference_news
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+EDGE_CASE_ARTICLES = {
+    "unclosed_paragraphs": (
+        '<html><body><h1 class="title"> 標題 </h1><time> 2025/01/01 10:00 </time>'
+        '<div class="story"><p>第一段<p>第二段<strong>粗體</strong><p>  </div></body></html>'
+    ),
+    "whitespace_and_links": (
+        '<div class="story">\n <p>\n 甲 <a href="https://example.com">連結</a> 乙\n</p>\n<p>丙</p></div>'
+        '<h1 class="title">標題</h1><time>時間</time>'
+    ),
+    "nested_story": (
+        '<h1 class="title other">標題</h1><time>第一個時間</time><time>第二個時間</time>'
+        '<div class="story extra"><div><p>內層</p></div><table><tr><td><p>表格內</p></td></tr></table></div>'
+    ),
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_news_links_match_reference():
+    html = load_fixture("news_list.html")
+    links = news_scraper.parse_news_links(html)
+    assert links
+    assert links == reference_news.parse_news_links(html)
+
+
+def test_article_matches_reference():
+    html = load_fixture("news_article.html")
+    article = news_scraper.parse_article(html)
+    assert len(article) > 2
+    assert article == reference_news.parse_article(html)
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_CASE_ARTICLES))
+def test_article_edge_cases_match_reference(name):
+    html = EDGE_CASE_ARTICLES[name]
+    assert news_scraper.parse_article(html) == reference_news.parse_article(html)
@@ -0,0 +1,106 @@
+"""
+翻譯進行中，事件迴圈仍要能即時回應其他請求
+
+以本機的慢速翻譯服務（每段約 2 秒）代替上游，同時送出 /api/translate 與
+GET /、GET /output/<檔案>，後兩者必須遠早於翻譯完成。
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+TRANSLATE_DELAY = 2.0
+# 其他請求的回應時間上限（遠小於上游延遲）
+FAST_LIMIT = 0.5
+
+
+class SlowTranslateHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/login":
+            payload = {"token": "test-token"}
+        else:
+            time.sleep(TRANSLATE_DELAY)
+            payload = {"output": f"客語：{body.get('input', '')}"}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def slow_translate_service():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowTranslateHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, slow_translate_service):
+    # output/、cache/ 等相對路徑都建立在暫存目錄中
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HAKKA_TRANS_URL_BASE", f"{slow_translate_service}/login")
+    monkeypatch.setenv("HAKKA_TRANS_URL_TRANS", f"{slow_translate_service}/translate")
+    monkeypatch.setenv("HAKKA_TRANS_USERNAME", "tester")
+    monkeypatch.setenv("HAKKA_TRANS_PASSWORD", "secret")
+
+    import hakka_trans_module
+    import main
+    monkeypatch.setattr(hakka_trans_module, "_translate_client", None)
+
+    (tmp_path / "output").mkdir(exist_ok=True)
+    (tmp_path / "output" / "sample.json").write_text('{"ok": true}', encoding="utf-8")
+    return main.app
+
+
+def test_translate_does_not_block_other_requests(app):
+    async def timed(client, method, url, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        return response, time.perf_counter() - started
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            # 每次使用不同的文字，避免翻譯記憶命中而略過上游
+            text = f"今天天氣很好 {uuid.uuid4().hex}"
+            translate = asyncio.create_task(
+                timed(client, "POST", "/api/translate", json={"text": text, "index": "nonblocking"})
+            )
+            # 等翻譯送出並開始等待上游
+            await asyncio.sleep(0.3)
+            assert not translate.done()
+
+            root, output = await asyncio.gather(
+                timed(client, "GET", "/"),
+                timed(client, "GET", "/output/sample.json"),
+            )
+            translate_still_running = not translate.done()
+            return await translate, root, output, translate_still_running
+
+    (translated, translate_seconds), (root, root_seconds), (output, output_seconds), running = asyncio.run(scenario())
+
+    assert translated.status_code == 200
+    assert translated.json()["success"] is True
+    assert translate_seconds >= TRANSLATE_DELAY
+
+    assert root.status_code == 200
+    assert output.status_code == 200
+    assert output.json() == {"ok": True}
+    assert running, "其他請求應在翻譯完成前就已回應"
+    assert root_seconds < FAST_LIMIT
+    assert output_seconds < FAST_LIMIT
@@ -0,0 +1,196 @@
+"""
+段落級翻譯記憶
+以 protect_markdown_symbols 處理後的段落文字為鍵，記錄成功的翻譯結果。
+記憶體中保留 LRU 快取，並以 SQLite 檔案作為持久層，重複的內容只需向上游翻譯一次。
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# 載入環境變數
+load_dotenv()
+
+
+class TranslationMemory:
+    """兩層（記憶體 LRU + SQLite）的翻譯記憶"""
+
+    # 每寫入這麼多筆就檢查一次磁碟容量
+    EVICT_CHECK_INTERVAL = 100
+    # 命中時只在記憶體記錄使用時間，累積這麼多筆才批次寫回 last_used
+    TOUCH_FLUSH_INTERVAL = 500
+
+    def __init__(self, db_path, max_memory_entries=2000, max_disk_entries=50000):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        # 尚未寫回資料庫的使用時間（key → 時間戳）
+        self._touched = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS translations (
+                        key TEXT PRIMARY KEY,
+                        source TEXT NOT NULL,
+                        translation TEXT NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 翻譯記憶資料庫無法開啟，僅使用記憶體快取: {e}")
+                self._conn = None
+
+    @staticmethod
+    def make_key(protected_segment):
+        return hashlib.sha256(protected_segment.encode('utf-8')).hexdigest()
+
+    def get(self, protected_segment):
+        """查詢翻譯記憶，未命中時返回 None"""
+        key = self.make_key(protected_segment)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self._touch(key)
+                return self._entries[key]
+
+            translation = None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT translation FROM translations WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        translation = row[0]
+                except sqlite3.Error as e:
+                    print(f"⚠️ 讀取翻譯記憶失敗: {e}")
+
+            if translation is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(key, translation)
+            self._touch(key)
+            return translation
+
+    def _touch(self, key):
+        """記錄使用時間；讀取路徑不逐筆寫入資料庫，累積到一定數量才批次寫回"""
+        if self._conn is None:
+            return
+        self._touched[key] = time.time()
+        if len(self._touched) >= self.TOUCH_FLUSH_INTERVAL:
+            try:
+                self._flush_touched()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 寫回翻譯記憶使用時間失敗: {e}")
+
+    def _flush_touched(self):
+        """將累積的使用時間寫入目前的交易（由呼叫端 commit）"""
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        self._conn.executemany(
+            "UPDATE translations SET last_used = ? WHERE key = ?",
+            [(last_used, key) for key, last_used in touched.items()]
+        )
+
+    def flush(self):
+        """寫回尚未保存的使用時間（服務關閉時呼叫）"""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._flush_touched()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 寫回翻譯記憶使用時間失敗: {e}")
+
+    def put(self, protected_segment, translation):
+        """記錄一筆成功的翻譯"""
+        key = self.make_key(protected_segment)
+        with self._lock:
+            self._remember(key, translation)
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO translations (key, source, translation, last_used) VALUES (?, ?, ?, ?)",
+                    (key, protected_segment, translation, time.time())
+                )
+                self._touched.pop(key, None)
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self.EVICT_CHECK_INTERVAL:
+                    self._writes_since_evict = 0
+                    # 淘汰前先寫回使用時間，最近命中的項目不會被刪除
+                    self._flush_touched()
+                    self._conn.execute(
+                        "DELETE FROM translations WHERE key IN "
+                        "(SELECT key FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,)
+                    )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 寫入翻譯記憶失敗: {e}")
+
+    def _remember(self, key, translation):
+        self._entries[key] = translation
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_memory_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._touched.clear()
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM translations")
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 清除翻譯記憶失敗: {e}")
+
+
+# 相對路徑以 backend/ 為基準，不隨工作目錄改變（例如從專案根目錄執行 benchmarks 時）
+TRANSLATION_MEMORY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.getenv("TRANSLATION_MEMORY_PATH", "cache/translation_memory.sqlite3")
+)
+
+# 全域翻譯記憶實例
+translation_memory = TranslationMemory(
+    TRANSLATION_MEMORY_PATH,
+    max_memory_entries=int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", "2000")),
+    max_disk_entries=int(os.getenv("TRANSLATION_MEMORY_MAX_DISK_ENTRIES", "50000")),
+)
@@ -0,0 +1,384 @@
+"""
+上游服務 HTTP 客戶端共用元件
+提供連線池化的 requests.Session 與帶有效期的 Bearer token 快取，
+以及對應的 aiohttp 非同步版本與 AIMD 自適應並行上限
+"""
+
+import asyncio
+import base64
+import collections
+import json
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+def _jwt_expiry(token):
+    """
+    嘗試從 JWT 的 payload 讀取 exp（Unix 秒）
+
+    Returns:
+        過期時間，無法解析時返回 None
+    """
+    parts = token.split('.')
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + '=' * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp else None
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class TokenSession:
+    """
+    具備連線池與 token 快取的上游客戶端基底類
+
+    子類別實作 _login() 並返回原始 token 字串。token 會快取到過期前
+    refresh_margin 秒才主動更新；請求遇到 401 時會重新登入並重試一次。
+    多執行緒共用同一個實例時，只有一個執行緒會實際呼叫登入端點。
+    登入與請求的延遲以 upstream / operation 為標籤記錄到監控指標。
+    """
+
+    upstream = "upstream"
+    operation = "request"
+
+    def __init__(self, token_ttl=3000, refresh_margin=60, pool_size=10, timeout=60, verify=False):
+        self.token_ttl = token_ttl
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.verify = verify
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_expiry = 0.0
+        self._lock = threading.Lock()
+
+    def _login(self):
+        raise NotImplementedError
+
+    def _token_valid(self):
+        return self._token is not None and time.time() < self._token_expiry - self.refresh_margin
+
+    def get_token(self, stale_token=None):
+        """
+        取得可用的 token，必要時重新登入
+
+        Args:
+            stale_token: 已知失效的 token（例如剛收到 401），若目前快取的仍是它則強制更新
+        """
+        token = self._token
+        if stale_token is None and self._token_valid():
+            return token
+
+        with self._lock:
+            # 等待鎖期間可能已有其他執行緒完成登入
+            if stale_token is None and self._token_valid():
+                return self._token
+            if stale_token is not None and self._token is not None and self._token != stale_token:
+                return self._token
+
+            with metrics.track_upstream(self.upstream, "login"):
+                token = self._login()
+            if not token:
+                raise ValueError("Authentication failed: No token received")
+            self._token = token
+            self._token_expiry = _jwt_expiry(token) or (time.time() + self.token_ttl)
+            print(f"🔑 取得新的上游 token ({type(self).__name__})")
+            return token
+
+    def invalidate_token(self):
+        with self._lock:
+            self._token = None
+            self._token_expiry = 0.0
+
+    def authorized_request(self, method, url, headers=None, **kwargs):
+        """
+        帶 Bearer token 發送請求，遇到 401 時重新登入並重試一次
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("verify", self.verify)
+
+        token = self.get_token()
+        request_headers = dict(headers or {})
+        request_headers["Authorization"] = "Bearer " + token
+        response = self._send(method, url, request_headers, kwargs)
+
+        if response.status_code == 401:
+            print(f"⚠️ 上游回應 401，重新登入後重試 ({type(self).__name__})")
+            token = self.get_token(stale_token=token)
+            request_headers["Authorization"] = "Bearer " + token
+            response = self._send(method, url, request_headers, kwargs)
+
+        return response
+
+    def _send(self, method, url, headers, kwargs):
+        with metrics.track_upstream(self.upstream, self.operation) as call:
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            call.status = response.status_code
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+# --- 非同步客戶端 ---
+
+class OverloadedError(ConnectionError):
+    """上游回應 429 或 5xx，表示服務忙碌，AdaptiveLimiter 會據此降低並行數"""
+
+    def __init__(self, status_code, message=None):
+        super().__init__(message or f"Upstream overloaded with status {status_code}")
+        self.status_code = status_code
+
+
+def raise_for_overload(status_code):
+    if status_code == 429 or status_code >= 500:
+        raise OverloadedError(status_code)
+
+
+# 讀完內容後的回應，欄位名稱與 requests.Response 一致
+UpstreamResponse = collections.namedtuple("UpstreamResponse", ["status_code", "content"])
+
+
+class AsyncUpstreamSession:
+    """
+    長駐的 aiohttp 連線池
+
+    ClientSession 綁定建立時的事件迴圈，因此延後到第一次請求才建立，
+    若在其他事件迴圈中使用（例如測試）會自動重建。
+    """
+
+    upstream = "upstream"
+    operation = "request"
+
+    def __init__(self, pool_size=10, timeout=60, verify=False):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.verify = verify
+        self._session = None
+        self._loop = None
+
+    def _on_new_loop(self):
+        """子類別在事件迴圈更換時重建綁定迴圈的物件"""
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=None if self.verify else False)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._loop = loop
+            self._on_new_loop()
+        return self._session
+
+    async def request(self, method, url, **kwargs):
+        """發送請求並讀完內容，返回 UpstreamResponse"""
+        async with self._get_session().request(method, url, **kwargs) as response:
+            return UpstreamResponse(response.status, await response.read())
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class AsyncTokenSession(AsyncUpstreamSession):
+    """
+    TokenSession 的非同步版本：子類別實作 async _login() 並返回原始 token 字串，
+    token 快取與 401 重試規則相同，同一時間只有一個協程會實際呼叫登入端點。
+    """
+
+    def __init__(self, token_ttl=3000, refresh_margin=60, pool_size=10, timeout=60, verify=False):
+        super().__init__(pool_size=pool_size, timeout=timeout, verify=verify)
+        self.token_ttl = token_ttl
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._token_expiry = 0.0
+        self._lock = asyncio.Lock()
+
+    def _on_new_loop(self):
+        self._lock = asyncio.Lock()
+
+    async def _login(self):
+        raise NotImplementedError
+
+    def _token_valid(self):
+        return self._token is not None and time.time() < self._token_expiry - self.refresh_margin
+
+    async def get_token(self, stale_token=None):
+        if stale_token is None and self._token_valid():
+            return self._token
+
+        self._get_session()
+        async with self._lock:
+            # 等待鎖期間可能已有其他協程完成登入
+            if stale_token is None and self._token_valid():
+                return self._token
+            if stale_token is not None and self._token is not None and self._token != stale_token:
+                return self._token
+
+            with metrics.track_upstream(self.upstream, "login"):
+                token = await self._login()
+            if not token:
+                raise ValueError("Authentication failed: No token received")
+            self._token = token
+            self._token_expiry = _jwt_expiry(token) or (time.time() + self.token_ttl)
+            print(f"🔑 取得新的上游 token ({type(self).__name__})")
+            return token
+
+    async def authorized_request(self, method, url, headers=None, **kwargs):
+        """帶 Bearer token 發送請求，遇到 401 時重新登入並重試一次"""
+        token = await self.get_token()
+        request_headers = dict(headers or {})
+        request_headers["Authorization"] = "Bearer " + token
+        response = await self._send(method, url, request_headers, kwargs)
+
+        if response.status_code == 401:
+            print(f"⚠️ 上游回應 401，重新登入後重試 ({type(self).__name__})")
+            token = await self.get_token(stale_token=token)
+            request_headers["Authorization"] = "Bearer " + token
+            response = await self._send(method, url, request_headers, kwargs)
+
+        return response
+
+    async def _send(self, method, url, headers, kwargs):
+        with metrics.track_upstream(self.upstream, self.operation) as call:
+            response = await self.request(method, url, headers=headers, **kwargs)
+            call.status = response.status_code
+        return response
+
+
+# --- 自適應並行上限 ---
+
+class AdaptiveLimiter:
+    """
+    AIMD（加法增加、乘法減少）並行上限
+
+    每次請求順利且延遲低於 latency_target 時，上限增加 1/上限（約每一輪增加 1）；
+    遇到 OverloadedError（429/5xx）、逾時或延遲過高時，上限乘以 backoff，
+    同一個 cooldown 期間內只降低一次，避免同一波失敗把上限壓到底。
+    其他例外（例如 4xx）不影響上限。
+
+    用法：
+        async with limiter.slot():
+            await client.synthesize_to_file(...)
+    """
+
+    def __init__(self, name, initial=3, min_limit=1, max_limit=16,
+                 latency_target=10.0, backoff=0.5, cooldown=2.0):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self.peak_limit = int(self._limit)
+        self.in_flight = 0
+        self.successes = 0
+        self.congestion_events = 0
+        self._last_decrease = 0.0
+        self._waiters = collections.deque()
+        LIMITERS[name] = self
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def slot(self):
+        """取得一個並行名額，離開 with 區塊時依結果調整上限"""
+        return _LimiterSlot(self)
+
+    async def _acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        # 每次等待各自建立 future，不綁定特定事件迴圈
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif not waiter.cancelled():
+                # 已分配到名額但在取得前被取消，讓給下一個
+                self.in_flight -= 1
+                self._wake()
+            raise
+
+    def _release(self, exc, latency):
+        self.in_flight -= 1
+        if isinstance(exc, (OverloadedError, asyncio.TimeoutError)):
+            self._decrease(type(exc).__name__)
+        elif exc is None:
+            if latency > self.latency_target:
+                self._decrease(f"延遲 {latency:.1f}s")
+            else:
+                self.successes += 1
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+        self._wake()
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.congestion_events += 1
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+        print(f"⚠️ {self.name} 上游壅塞（{reason}），並行上限降為 {self.limit}")
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "peak_limit": self.peak_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "successes": self.successes,
+            "congestion_events": self.congestion_events,
+        }
+
+
+class _LimiterSlot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.started = None
+
+    async def __aenter__(self):
+        with metrics.queue_wait_seconds.time(queue=self.limiter.name):
+            await self.limiter._acquire()
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.limiter._release(exc, time.monotonic() - self.started)
+        return False
+
+
+# 依名稱登記的所有限流器，供監控端點讀取
+LIMITERS = {}
+
+
+def limiter_stats():
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
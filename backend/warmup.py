@@ -0,0 +1,121 @@
+"""
+服務啟動後的背景預熱
+啟動時不再等待任何上游：應用程式先開始接受請求，預熱在背景進行，
+/readyz 在預熱結束前返回 503，讓調度器等到連線池與 token 就緒後再導入流量。
+
+預熱內容：
+- 翻譯服務與客語 TTS 登入（建立連線池並快取 token），不送出實際的翻譯或合成請求
+- 載入第一次渲染或解析才會用到的 pydub、gtts、bs4
+
+失敗或逾時的步驟只記錄在 /readyz 的內容中，不阻擋流量；實際請求時客戶端仍會自行登入。
+"""
+
+import asyncio
+import importlib
+import os
+import time
+
+from dotenv import load_dotenv
+
+import hakka_trans_module
+import hakka_tts_module
+
+# 載入環境變數
+load_dotenv()
+
+# 每個預熱步驟的時間上限（秒），逾時視為失敗，不影響服務啟動
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "30"))
+
+# 延後載入的大型套件
+DEFERRED_IMPORTS = ["pydub", "gtts", "bs4"]
+
+
+async def _warm_translate():
+    try:
+        client = hakka_trans_module.get_translate_client()
+    except ValueError:
+        return "skipped"
+    await asyncio.to_thread(client.get_token)
+    return "ok"
+
+
+async def _warm_tts():
+    try:
+        client = hakka_tts_module.get_async_tts_client()
+    except ValueError:
+        return "skipped"
+    await client.get_token()
+    return "ok"
+
+
+async def _warm_imports():
+    for name in DEFERRED_IMPORTS:
+        await asyncio.to_thread(importlib.import_module, name)
+    return "ok"
+
+
+class ServiceWarmup:
+    """背景預熱工作與各步驟的結果"""
+
+    STEPS = {
+        "translate": _warm_translate,
+        "hakka_tts": _warm_tts,
+        "imports": _warm_imports,
+    }
+
+    def __init__(self):
+        # 步驟名稱 → {"status": pending/ok/skipped/failed, "seconds", "error"}
+        self.steps = {name: {"status": "pending"} for name in self.STEPS}
+        self.started_at = None
+        self.finished_at = None
+        self._task = None
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self.started_at = time.time()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run_step(self, name, step):
+        started = time.monotonic()
+        try:
+            status = await asyncio.wait_for(step(), timeout=WARMUP_TIMEOUT)
+            self.steps[name] = {"status": status, "seconds": round(time.monotonic() - started, 3)}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = "timeout" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            self.steps[name] = {"status": "failed", "seconds": round(time.monotonic() - started, 3), "error": error}
+            print(f"⚠️ 預熱步驟失敗 ({name}): {error}")
+
+    async def _run(self):
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self.STEPS.items()))
+        self.finished_at = time.time()
+        summary = ", ".join(f"{name}={step['status']}" for name, step in self.steps.items())
+        print(f"🔥 背景預熱完成（{self.finished_at - self.started_at:.2f}s）：{summary}")
+
+    def status(self):
+        return {
+            "ready": self.done,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": self.steps,
+        }
+
+
+# 全域預熱實例
+service_warmup = ServiceWarmup()
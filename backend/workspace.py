@@ -0,0 +1,110 @@
+"""
+請求隔離的暫存空間
+每個語音／翻譯工作在自己的暫存目錄中產生中間檔，結束後自動清除；
+抓取到的新聞以文章為單位保存，不再共用單一的 news.json
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+WORKSPACE_ROOT = "temp_audio/jobs"
+NEWS_ROOT = "temp_audio/news"
+# 保留的新聞文章數上限，超過時刪除最舊的
+NEWS_KEEP_LIMIT = int(os.getenv("NEWS_KEEP_LIMIT", "200"))
+
+
+@contextlib.contextmanager
+def job_workspace(kind):
+    """
+    建立一個工作專用的暫存目錄，離開 with 區塊時連同內容一併刪除
+
+    Args:
+        kind: 工作類型，作為目錄名稱前綴方便除錯（例如 "audio"、"hls"）
+    """
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    path = tempfile.mkdtemp(prefix=f"{kind}_", dir=WORKSPACE_ROOT)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def write_json_atomic(path, data):
+    """先寫入暫存檔再換名，避免其他請求讀到寫到一半的檔案"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def news_id_for(news_content):
+    """以標題產生文章識別碼"""
+    return hashlib.md5(news_content[0].encode('utf-8')).hexdigest()[:16]
+
+
+class NewsStore:
+    """以文章為單位保存 /api/news 抓取的內容"""
+
+    def __init__(self, root):
+        self.root = root
+        self.latest_id = None
+        self._lock = threading.Lock()
+
+    def _path(self, news_id):
+        return os.path.join(self.root, f"{news_id}.json")
+
+    def save(self, news_content, track_latest=True):
+        """
+        保存文章並返回其 news_id
+
+        Args:
+            track_latest: 是否設為「最近一次抓取的文章」（未帶 news_id 的 /api/audio 使用）；
+                背景預取保存的文章不是使用者看到的文章，應設為 False
+        """
+        os.makedirs(self.root, exist_ok=True)
+        news_id = news_id_for(news_content)
+        write_json_atomic(self._path(news_id), news_content)
+        if track_latest:
+            with self._lock:
+                self.latest_id = news_id
+        self._prune()
+        return news_id
+
+    def load(self, news_id=None):
+        """
+        讀取文章內容；未指定 news_id 時使用本行程最近一次抓取的文章
+
+        Raises:
+            FileNotFoundError: 找不到對應的文章
+        """
+        news_id = news_id or self.latest_id
+        if not news_id or not all(c in "0123456789abcdef" for c in news_id):
+            raise FileNotFoundError("News not found, please call /api/news first")
+        with open(self._path(news_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _prune(self):
+        try:
+            entries = [os.path.join(self.root, name) for name in os.listdir(self.root) if name.endswith(".json")]
+            if len(entries) <= NEWS_KEEP_LIMIT:
+                return
+            entries.sort(key=os.path.getmtime)
+            for path in entries[:len(entries) - NEWS_KEEP_LIMIT]:
+                os.remove(path)
+        except OSError as e:
+            print(f"⚠️ 清理舊新聞失敗: {e}")
+
+
+# 全域新聞存放實例
+news_store = NewsStore(NEWS_ROOT)